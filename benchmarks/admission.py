@@ -0,0 +1,65 @@
+"""
+Latency of a cheap route while a full-table route is hammered, without and with admission control.
+Starts one gunicorn worker of the production profile per mode, floods /films from many clients and
+measures /user/1 from a few others at the same time. Shed requests count as errors of the flood.
+
+    $ DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/seed.py
+    $ DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/admission.py -c 32 -d 20
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+from throughput import run
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+MODES = {
+    "no admission control": {'ENABLE_ADMISSION': '0'},
+    "admission control": {'ENABLE_ADMISSION': '1'},
+}
+
+
+def start_server(port, env):
+    environment = dict(os.environ, PORT=str(port), WEB_CONCURRENCY='1', GUNICORN_ACCESSLOG='/dev/null', ENABLE_ADMIN='0', **env)
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'wsgi', '--chdir', os.path.join(ROOT, 'src'), '--config', os.path.join(ROOT, 'gunicorn.conf.py')],
+                              env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            urllib.request.urlopen('http://127.0.0.1:{}/'.format(port)).read()
+            return server
+        except Exception:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError('gunicorn did not start')
+
+
+def measure(port, concurrency, duration):
+    results = {}
+    flood = threading.Thread(target=lambda: results.update(flood=run('http://127.0.0.1:{}/films'.format(port), concurrency, duration)))
+    flood.start()
+    results['cheap'] = run('http://127.0.0.1:{}/user/1'.format(port), 2, duration)
+    flood.join()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-c', '--concurrency', type=int, default=32, help='clients flooding /films')
+    parser.add_argument('-d', '--duration', type=float, default=20)
+    parser.add_argument('-p', '--port', type=int, default=3999)
+    args = parser.parse_args()
+    for name, env in MODES.items():
+        server = start_server(args.port, env)
+        try:
+            results = measure(args.port, args.concurrency, args.duration)
+        finally:
+            server.terminate()
+            server.wait()
+        print(name)
+        print('    /films  {}'.format(results['flood']))
+        print('    /user/1 {}'.format(results['cheap']))
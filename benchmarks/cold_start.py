@@ -0,0 +1,55 @@
+"""
+Measures the time to first request of a fresh interpreter for different `create_app` profiles
+and lists the slowest imports reported by `python -X importtime`.
+
+    $ python benchmarks/cold_start.py
+"""
+import os
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+SNIPPET = """
+import time
+start = time.perf_counter()
+from app import create_app
+app = create_app({config!r})
+app.test_client().get('/user')
+print(round((time.perf_counter() - start) * 1000, 1))
+"""
+
+PROFILES = {
+    "everything": {'ENABLE_ADMIN': True, 'ENABLE_MIGRATE': True, 'ENABLE_SWAGGER': True},
+    "default web worker": {'ENABLE_ADMIN': True, 'ENABLE_MIGRATE': False, 'ENABLE_SWAGGER': False},
+    "api only": {'ENABLE_ADMIN': False, 'ENABLE_MIGRATE': False, 'ENABLE_SWAGGER': False},
+}
+
+
+def slowest_imports(stderr, limit):
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # nested imports are indented, only keep the top level ones
+        if not name[1:].startswith(' '):
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def run(config, runs=5):
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', SNIPPET.format(config=config)],
+                                cwd=SRC, capture_output=True, text=True, check=True)
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return min(timings), slowest_imports(result.stderr, 5)
+
+
+if __name__ == '__main__':
+    for name, config in PROFILES.items():
+        best, imports = run(config)
+        print('{:<20} first request after {} ms'.format(name, best))
+        for cumulative, module in imports:
+            print('    {:>8} us  {}'.format(cumulative, module))
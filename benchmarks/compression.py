@@ -0,0 +1,38 @@
+"""
+Bytes on the wire and time to last byte of the big list endpoints for every content encoding.
+
+    $ DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/seed.py
+    $ DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/compression.py /films /characters
+"""
+import sys
+import time
+
+from seed import bench_app
+
+ENCODINGS = ['identity', 'gzip', 'br', 'zstd']
+
+
+def measure(client, path, encoding, runs=5):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        response = client.get(path, headers={'Accept-Encoding': encoding})
+        size = len(response.get_data())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return size, response.headers.get('Content-Encoding', 'identity'), best
+
+
+if __name__ == '__main__':
+    paths = sys.argv[1:] or ['/films', '/characters']
+    profiles = (
+        ('pretty, uncompressed', {'ENABLE_COMPRESSION': False, 'JSON_COMPACT': False, 'JSON_SORT_KEYS': True}, ['identity']),
+        ('compact, negotiated', {}, ENCODINGS),
+    )
+    for label, config, encodings in profiles:
+        client = bench_app(config).test_client()
+        print(label)
+        for path in paths:
+            for encoding in encodings:
+                size, used, elapsed = measure(client, path, encoding)
+                print('    {:<14} {:<9} {:>10} bytes {:>9.1f} ms'.format(path, used, size, elapsed * 1000))
@@ -0,0 +1,216 @@
+"""
+Runs the same workload against every backend the Pipfile ships a driver for, and reports per route
+the throughput, the latency, the queries per request and the plan of each SELECT. It flags filtered
+full scans, sorts without an index, N+1 query counts, and routes much slower than on the best
+backend. Each target is seeded from scratch with benchmarks/seed.py. A target whose driver is not
+installed or whose server does not answer is skipped.
+
+    $ python benchmarks/dialects.py -c 4 -d 3
+    $ python benchmarks/dialects.py --postgresql postgresql://postgres@localhost/bench --mysql mysql://root@localhost/bench
+    $ python benchmarks/dialects.py --targets sqlite-wal,postgresql --json matrix.json
+"""
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from seed import bench_app, seed
+from models import db, Starships_Films
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+
+N_PLUS_ONE = 10
+SLOWER_THAN_BEST = 2.0
+
+# existing starship/film pairs of the seeded target
+LINKS = []
+
+
+def favorite_toggle(client, rnd, user_id):
+    # add a favorite and take it back, the write path of the favorites
+    character_id = rnd.randint(1, 1000)
+    added = client.post('/user/{}/favorite_characters'.format(user_id), json={'character_id': character_id})
+    removed = client.delete('/user/{}/favorite_characters/{}'.format(user_id, character_id))
+    return max(added.status_code, removed.status_code)
+
+
+ROUTES = {
+    'GET /films': lambda client, rnd, user_id: client.get('/films').status_code,
+    'GET /characters': lambda client, rnd, user_id: client.get('/characters').status_code,
+    'GET /films_characters': lambda client, rnd, user_id: client.get('/films_characters').status_code,
+    'GET /favorite_species': lambda client, rnd, user_id: client.get('/favorite_species').status_code,
+    'GET /films/<id>': lambda client, rnd, user_id: client.get('/films/{}'.format(rnd.randint(1, 9))).status_code,
+    'GET /user/<id>': lambda client, rnd, user_id: client.get('/user/{}'.format(rnd.randint(1, 200))).status_code,
+    'GET /user/<id>/favorites': lambda client, rnd, user_id: client.get('/user/{}/favorites'.format(rnd.randint(1, 200))).status_code,
+    # the duplicate check of the link tables, the pair exists so nothing is written
+    'POST /starships_films (duplicate)': lambda client, rnd, user_id: client.post('/starships_films', json=rnd.choice(LINKS)).status_code,
+    'POST+DELETE favorite': favorite_toggle,
+}
+
+
+def explain(connection, statement, parameters):
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+        plan = [row[-1] for row in rows]
+        flags = ['full scan in a filtered query: ' + line for line in plan if line.startswith('SCAN') and 'INDEX' not in line and ' WHERE ' in statement]
+        flags += ['sort without an index: ' + line for line in plan if 'TEMP B-TREE' in line]
+    elif dialect == 'postgresql':
+        plan = [row[0] for row in connection.exec_driver_sql('EXPLAIN ' + statement, parameters).all()]
+        flags = ['full scan in a filtered query: ' + plan[index].strip() for index, line in enumerate(plan) if 'Filter:' in line and index and 'Seq Scan' in plan[index - 1]]
+        flags += ['sort: ' + line.strip() for line in plan if line.strip().startswith('->  Sort') or line.startswith('Sort')]
+    elif dialect in ('mysql', 'mariadb'):
+        result = connection.exec_driver_sql('EXPLAIN ' + statement, parameters)
+        rows = [dict(zip(result.keys(), row)) for row in result.all()]
+        plan = ['{table}: type={type} key={key} rows={rows} {Extra}'.format(**row) for row in rows]
+        flags = ['full scan in a filtered query: ' + line for row, line in zip(rows, plan) if row['type'] == 'ALL' and ' WHERE ' in statement]
+        flags += ['sort or temporary table: ' + line for row, line in zip(rows, plan) if row['Extra'] and ('filesort' in row['Extra'] or 'temporary' in row['Extra'])]
+    else:
+        plan, flags = [], []
+    return plan, flags
+
+
+def capture(app, route):
+    """Runs the route once and returns its statements with their plans."""
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            statements.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        ROUTES[route](app.test_client(), random.Random(0), 1)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    queries, flags, seen = [], [], set()
+    with engine.connect() as connection:
+        for statement, parameters in statements:
+            if statement in seen or not statement.lstrip().upper().startswith('SELECT'):
+                continue
+            seen.add(statement)
+            plan, statement_flags = explain(connection, statement, parameters)
+            queries.append({'sql': ' '.join(statement.split()), 'plan': plan})
+            flags.extend(statement_flags)
+    if len(statements) > N_PLUS_ONE:
+        flags.append('{} queries per request'.format(len(statements)))
+    return {'queries': len(statements), 'statements': queries, 'flags': flags}
+
+
+def load(app, route, concurrency, duration):
+    latencies, errors = [], []
+
+    def client(index):
+        test_client = app.test_client()
+        rnd = random.Random(index)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                status = ROUTES[route](test_client, rnd, index + 1)
+            except Exception:
+                status = 599
+            if status >= 500:
+                errors.append(status)
+            else:
+                latencies.append(time.perf_counter() - start)
+
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    count = len(latencies)
+    return {
+        'rps': round(len(latencies) / duration, 1),
+        'errors': len(errors),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2) if latencies else None,
+        # nearest rank
+        'p99_ms': round(latencies[min(count - 1, math.ceil(count * 0.99) - 1)] * 1000, 2) if latencies else None,
+    }
+
+
+def prepare(name, url):
+    app = bench_app({'SQLALCHEMY_DATABASE_URI': url})
+    with app.app_context():
+        db.session.execute(text('SELECT 1'))
+        seed()
+        if name.startswith('sqlite'):
+            # the journal mode is stored in the database file
+            db.session.execute(text('PRAGMA journal_mode={}'.format('WAL' if name == 'sqlite-wal' else 'DELETE')))
+        LINKS[:] = [{'starship_id': link.starship_id, 'film_id': link.film_id} for link in Starships_Films.query.all()]
+        db.session.remove()
+    return app
+
+
+def run_target(name, url, concurrency, duration):
+    app = prepare(name, url)
+    results = {}
+    for route in ROUTES:
+        load(app, route, 1, min(duration, 0.5))
+        results[route] = {**load(app, route, concurrency, duration), **capture(app, route)}
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+    return results
+
+
+def flag_slow(matrix):
+    for route in ROUTES:
+        latencies = {name: results[route]['p50_ms'] for name, results in matrix.items() if results[route]['p50_ms']}
+        if not latencies:
+            continue
+        best_name = min(latencies, key=latencies.get)
+        for name, latency in latencies.items():
+            if latency > latencies[best_name] * SLOWER_THAN_BEST:
+                matrix[name][route]['flags'].append('p50 {:.1f}x the one on {}'.format(latency / latencies[best_name], best_name))
+
+
+def report(matrix):
+    for name, results in matrix.items():
+        print('\n== {}'.format(name))
+        print('{:<34} {:>8} {:>9} {:>9} {:>8} {:>7}'.format('route', 'rps', 'p50 ms', 'p99 ms', 'queries', 'errors'))
+        for route, result in results.items():
+            print('{:<34} {:>8} {:>9} {:>9} {:>8} {:>7}'.format(route, result['rps'], result['p50_ms'], result['p99_ms'], result['queries'], result['errors']))
+            for flag in result['flags']:
+                print('    ! ' + flag)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-c', '--concurrency', type=int, default=4)
+    parser.add_argument('-d', '--duration', type=float, default=3, help='seconds per route')
+    parser.add_argument('--sqlite', default='/tmp/bench_dialects.db', help='database file of the sqlite targets')
+    parser.add_argument('--postgresql', default=os.getenv('BENCH_POSTGRESQL_URL', 'postgresql://postgres@localhost/bench'))
+    parser.add_argument('--mysql', default=os.getenv('BENCH_MYSQL_URL', 'mysql://root@localhost/bench'))
+    parser.add_argument('--targets', default='sqlite-file,sqlite-wal,postgresql,mysql')
+    parser.add_argument('--json', help='also write the matrix with the plans to this file')
+    args = parser.parse_args()
+    urls = {
+        'sqlite-file': 'sqlite:///' + args.sqlite,
+        'sqlite-wal': 'sqlite:///' + args.sqlite,
+        'postgresql': args.postgresql,
+        'mysql': args.mysql,
+    }
+    matrix = {}
+    for name in args.targets.split(','):
+        try:
+            matrix[name] = run_target(name, urls[name], args.concurrency, args.duration)
+        except (ImportError, OperationalError) as error:
+            # no driver or no server
+            print('== {} skipped: {}'.format(name, str(error).splitlines()[0]))
+    flag_slow(matrix)
+    report(matrix)
+    if args.json:
+        with open(args.json, 'w') as matrix_file:
+            json.dump(matrix, matrix_file, indent=2)
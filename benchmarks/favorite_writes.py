@@ -0,0 +1,68 @@
+"""
+Favorite write throughput with one commit per request versus group commit (ack after the batch
+commit, and ack when queued). Concurrent clients add favorite characters to their own users through
+the app in this process. Every mode inserts new rows, re-seed to start over.
+
+    $ DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/seed.py
+    $ DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/favorite_writes.py -c 16 -d 10
+    $ DATABASE_URL=postgresql://localhost/bench python benchmarks/favorite_writes.py -c 16 -d 10
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from seed import bench_app
+from models import db, User, Characters, Favorites
+from sqlalchemy import select
+
+MODES = {
+    "commit per request": {'ENABLE_GROUP_COMMIT': False},
+    "group commit": {'ENABLE_GROUP_COMMIT': True, 'GROUP_COMMIT_ACK': 'commit'},
+    "group commit, async ack": {'ENABLE_GROUP_COMMIT': True, 'GROUP_COMMIT_ACK': 'queue'},
+}
+
+
+def client(app, user_id, character_ids, deadline, counts, errors):
+    test_client = app.test_client()
+    for character_id in character_ids:
+        if time.perf_counter() >= deadline:
+            break
+        response = test_client.post('/user/{}/favorite_characters'.format(user_id), json={'character_id': character_id})
+        if response.status_code in (200, 202):
+            counts.append(1)
+        else:
+            errors.append(response.status_code)
+
+
+def run(config, concurrency, duration):
+    app = bench_app(config)
+    with app.app_context():
+        users = [user.id for user in User.query.order_by(User.id).limit(concurrency)]
+        characters = [character.id for character in Characters.query.order_by(Characters.id)]
+        # characters the users do not have yet, so every request inserts a row
+        owned = set(db.session.execute(select(Favorites.user_id, Favorites.entity_id).where(Favorites.entity_type == 'characters', Favorites.user_id.in_(users))).all())
+        favorites = {user_id: [character_id for character_id in characters if (user_id, character_id) not in owned] for user_id in users}
+    counts, errors = [], []
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=client, args=(app, user_id, favorites[user_id], deadline, counts, errors)) for user_id in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer = app.extensions.get('group_commit')
+    if writer is not None:
+        writer.drain()
+    return {"writes/s": round(len(counts) / duration, 1), "errors": len(errors)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-c', '--concurrency', type=int, default=16)
+    parser.add_argument('-d', '--duration', type=float, default=10)
+    args = parser.parse_args()
+    for name, config in MODES.items():
+        print('{:<26} {}'.format(name, run(config, args.concurrency, args.duration)))
@@ -0,0 +1,64 @@
+"""
+Python CPU per lookup of the hot statements, legacy Model.query versus Session.get and the cached
+lambda statements of src/lookups.py. The identity map is cleared before every lookup so each one
+runs its SELECT. Run it against a seeded database:
+
+    $ DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/lookups.py -n 5000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from seed import bench_app
+from lookups import find_favorite, find_link
+from models import db, User, Favorites, Favorite_Films, Starships_Films
+from sqlalchemy import select
+
+
+def measure(lookup, keys):
+    session = db.session
+    start = time.process_time()
+    for key in keys:
+        session.expunge_all()
+        lookup(*key)
+    return (time.process_time() - start) / len(keys) * 1e6
+
+
+def cases(n):
+    rnd = random.Random(42)
+    users = db.session.execute(select(User.id)).scalars().all()
+    favorites = db.session.execute(select(Favorites.user_id, Favorites.entity_id).where(Favorites.entity_type == 'films')).all()
+    links = db.session.execute(select(Starships_Films.starship_id, Starships_Films.film_id)).all()
+    user_keys = [(rnd.choice(users),) for _ in range(n)]
+    favorite_keys = [tuple(rnd.choice(favorites)) for _ in range(n)]
+    link_keys = [tuple(rnd.choice(links)) for _ in range(n)]
+    return [
+        ('User by id', user_keys,
+         lambda user_id: User.query.get(user_id),
+         lambda user_id: db.session.get(User, user_id)),
+        ('favorite of a user', favorite_keys,
+         lambda user_id, film_id: db.session.query(Favorite_Films).filter_by(user_id=user_id, film_id=film_id).first(),
+         lambda user_id, film_id: find_favorite(db.session, Favorite_Films, user_id, film_id)),
+        ('link row', link_keys,
+         lambda starship_id, film_id: Starships_Films.query.filter_by(starship_id=starship_id, film_id=film_id).first(),
+         lambda starship_id, film_id: find_link(Starships_Films, starship_id=starship_id, film_id=film_id)),
+    ]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', type=int, default=5000, help='lookups per case')
+    args = parser.parse_args()
+    app = bench_app()
+    with app.app_context():
+        print('{:<20} {:>12} {:>12} {:>8}'.format('lookup', 'legacy us', 'cached us', 'saved'))
+        for name, keys, legacy, cached in cases(args.n):
+            # warm up both paths so the statement caches are filled
+            measure(legacy, keys[:200])
+            measure(cached, keys[:200])
+            before, after = measure(legacy, keys), measure(cached, keys)
+            print('{:<20} {:>12.1f} {:>12.1f} {:>7.0f}%'.format(name, before, after, (before - after) / before * 100))
@@ -0,0 +1,56 @@
+"""
+Fills a database with a synthetic catalog so the benchmarks have something to chew on.
+
+    $ DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/seed.py --planets 200 --characters 5000
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from app import create_app
+from models import db, User, Starships, Planets, Films, Characters, Species, Favorite_Starships, Favorite_Planets, Favorite_Films, Favorite_Characters, Favorite_Species, Starships_Films, Starships_Characters, Planets_Films, Films_Characters, Films_Species
+
+
+def bench_app(config=None):
+    defaults = {'ENABLE_ADMIN': False, 'ENABLE_MIGRATE': False}
+    defaults.update(config or {})
+    return create_app(defaults)
+
+
+def seed(films=9, planets=60, species=40, starships=40, characters=1000, users=200, favorites=20, links=10, random_seed=42):
+    rnd = random.Random(random_seed)
+    db.drop_all()
+    db.create_all()
+    db.session.add_all([Films(id=i, title='Film {}'.format(i), episode=i, director='Director {}'.format(i % 3)) for i in range(1, films + 1)])
+    db.session.add_all([Planets(id=i, name='Planet {}'.format(i), rotation_period=str(rnd.randint(10, 40)), climate=rnd.choice(['arid', 'temperate', 'frozen'])) for i in range(1, planets + 1)])
+    db.session.add_all([Species(id=i, name='Species {}'.format(i), classification=rnd.choice(['mammal', 'reptile', 'droid']), planet_id=rnd.randint(1, planets)) for i in range(1, species + 1)])
+    db.session.add_all([Starships(id=i, name='Starship {}'.format(i), model='Model {}'.format(i)) for i in range(1, starships + 1)])
+    db.session.add_all([Characters(id=i, name='Character {}'.format(i), planet_id=rnd.randint(1, planets), species_id=rnd.randint(1, species)) for i in range(1, characters + 1)])
+    db.session.add_all([User(id=i, name='user{}'.format(i), age=rnd.randint(12, 80), email='user{}@example.com'.format(i)) for i in range(1, users + 1)])
+    db.session.flush()
+
+    def pairs(count_a, count_b, total):
+        return {(rnd.randint(1, count_a), rnd.randint(1, count_b)) for _ in range(total)}
+
+    db.session.add_all([Films_Characters(film_id=a, character_id=b) for a, b in pairs(films, characters, characters * 2)])
+    db.session.add_all([Films_Species(film_id=a, species_id=b) for a, b in pairs(films, species, films * links)])
+    db.session.add_all([Planets_Films(planet_id=a, film_id=b) for a, b in pairs(planets, films, films * links)])
+    db.session.add_all([Starships_Films(starship_id=a, film_id=b) for a, b in pairs(starships, films, films * links)])
+    db.session.add_all([Starships_Characters(starship_id=a, character_id=b) for a, b in pairs(starships, characters, characters // 2)])
+    for model, column, count in ((Favorite_Films, 'film_id', films), (Favorite_Planets, 'planet_id', planets), (Favorite_Species, 'species_id', species), (Favorite_Starships, 'starship_id', starships), (Favorite_Characters, 'character_id', characters)):
+        db.session.add_all([model(user_id=a, **{column: b}) for a, b in pairs(users, count, users * favorites // 5)])
+    db.session.commit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    for name, default in (('films', 9), ('planets', 60), ('species', 40), ('starships', 40), ('characters', 1000), ('users', 200), ('favorites', 20)):
+        parser.add_argument('--' + name, type=int, default=default)
+    args = parser.parse_args()
+    app = bench_app()
+    with app.app_context():
+        seed(**vars(args))
+        print('seeded', app.config['SQLALCHEMY_DATABASE_URI'])
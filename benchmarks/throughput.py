@@ -0,0 +1,53 @@
+"""
+Small load generator to compare server profiles, only uses the standard library.
+
+    $ gunicorn wsgi --chdir ./src/                                # default profile
+    $ gunicorn wsgi --chdir ./src/ --config gunicorn.conf.py      # production profile
+    $ python benchmarks/throughput.py http://localhost:3000/films -c 32 -d 20
+"""
+import argparse
+import math
+import statistics
+import threading
+import time
+import urllib.request
+
+
+def worker(url, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url) as response:
+                response.read()
+            latencies.append(time.perf_counter() - start)
+        except Exception:
+            errors.append(1)
+
+
+def run(url, concurrency, duration):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=worker, args=(url, deadline, latencies, errors)) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    count = len(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / duration, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2) if latencies else None,
+        # nearest rank
+        "p99_ms": round(latencies[min(count - 1, math.ceil(count * 0.99) - 1)] * 1000, 2) if latencies else None,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('url')
+    parser.add_argument('-c', '--concurrency', type=int, default=16)
+    parser.add_argument('-d', '--duration', type=float, default=10)
+    args = parser.parse_args()
+    print(run(args.url, args.concurrency, args.duration))
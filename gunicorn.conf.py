@@ -0,0 +1,46 @@
+# Production profile for gunicorn, picked up by `gunicorn wsgi --chdir ./src/ --config gunicorn.conf.py` from the project root.
+# Every value can be overridden from the environment so Render/Heroku plans with different sizes can tune it.
+# Read more about the settings here: https://docs.gunicorn.org/en/stable/settings.html
+import gc
+import multiprocessing
+import os
+
+bind = '0.0.0.0:{}'.format(os.environ.get('PORT', 3000))
+
+# workers: (2 x cores) + 1 is the gunicorn recommendation for mostly I/O bound apps like this one
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# import app, admin and models once in the master and share the pages with the workers (copy-on-write)
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+# recycle workers after a number of requests, the jitter avoids all of them restarting at the same time
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+accesslog = os.environ.get('GUNICORN_ACCESSLOG', '-')
+
+
+def when_ready(server):
+    # everything imported by the preloaded app goes to the permanent generation, so the garbage
+    # collector of the workers does not touch (and copy) those pages after the fork
+    if preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    # connections opened by the master while preloading can not be shared between processes,
+    # every worker starts with its own empty pool
+    if preload_app:
+        from wsgi import application as app
+        from models import db
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+        if 'shard_router' in app.extensions:
+            app.extensions['shard_router'].dispose()
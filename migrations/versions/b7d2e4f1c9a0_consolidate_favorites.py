@@ -0,0 +1,76 @@
+"""consolidate the five favorite tables into favorites
+
+Revision ID: b7d2e4f1c9a0
+Revises: f2b8d4c6a0e3
+Create Date: 2026-10-19 16:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e4f1c9a0'
+down_revision = 'f2b8d4c6a0e3'
+branch_labels = None
+depends_on = None
+
+# old table -> (entity_type, column of the entity)
+OLD_TABLES = {
+    'favorite_starships': ('starships', 'starship_id'),
+    'favorite_planets': ('planets', 'planet_id'),
+    'favorite_films': ('films', 'film_id'),
+    'favorite_characters': ('characters', 'character_id'),
+    'favorite_species': ('species', 'species_id'),
+}
+
+
+def upgrade():
+    existing = sa.inspect(op.get_bind()).get_table_names()
+    op.create_table('favorites',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('entity_type', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_favorites_user_entity', 'favorites', ['user_id', 'entity_type', 'entity_id'], unique=True, postgresql_include=['id'])
+    op.create_index('ix_favorites_entity', 'favorites', ['entity_type', 'entity_id'])
+
+    for table, (entity_type, column) in OLD_TABLES.items():
+        if table not in existing:
+            continue
+        # the old tables allowed duplicates, the unique index keeps the first one
+        op.execute(
+            "INSERT INTO favorites (user_id, entity_type, entity_id) "
+            "SELECT user_id, '{entity_type}', {column} FROM {table} "
+            "WHERE user_id IS NOT NULL AND {column} IS NOT NULL "
+            "GROUP BY user_id, {column} ORDER BY MIN(id)".format(entity_type=entity_type, column=column, table=table)
+        )
+        op.drop_table(table)
+        # read-only views with the old names and columns for reports and raw SQL
+        op.execute(
+            "CREATE VIEW {table} AS SELECT id, entity_id AS {column}, user_id FROM favorites "
+            "WHERE entity_type = '{entity_type}'".format(entity_type=entity_type, column=column, table=table)
+        )
+
+
+def downgrade():
+    for table, (entity_type, column) in OLD_TABLES.items():
+        op.execute('DROP VIEW IF EXISTS {}'.format(table))
+        op.create_table(table,
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column(column, sa.Integer(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint([column], ['{}.id'.format(entity_type)], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.execute(
+            "INSERT INTO {table} ({column}, user_id) SELECT entity_id, user_id FROM favorites "
+            "WHERE entity_type = '{entity_type}' ORDER BY id".format(entity_type=entity_type, column=column, table=table)
+        )
+    op.drop_index('ix_favorites_entity', table_name='favorites')
+    op.drop_index('ix_favorites_user_entity', table_name='favorites')
+    op.drop_table('favorites')
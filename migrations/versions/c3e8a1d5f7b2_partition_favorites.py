@@ -0,0 +1,100 @@
+"""hash partition favorites by user_id on postgresql
+
+Revision ID: c3e8a1d5f7b2
+Revises: b7d2e4f1c9a0
+Create Date: 2026-10-19 17:20:00.000000
+
+"""
+import os
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e8a1d5f7b2'
+down_revision = 'b7d2e4f1c9a0'
+branch_labels = None
+depends_on = None
+
+# number of partitions, changing it later means running this migration again (downgrade + upgrade)
+PARTITIONS = int(os.environ.get('FAVORITES_PARTITIONS', 8))
+
+VIEWS = {
+    'favorite_starships': ('starships', 'starship_id'),
+    'favorite_planets': ('planets', 'planet_id'),
+    'favorite_films': ('films', 'film_id'),
+    'favorite_characters': ('characters', 'character_id'),
+    'favorite_species': ('species', 'species_id'),
+}
+
+
+def drop_views():
+    for table in VIEWS:
+        op.execute('DROP VIEW IF EXISTS {}'.format(table))
+
+
+def create_views():
+    for table, (entity_type, column) in VIEWS.items():
+        op.execute(
+            "CREATE VIEW {table} AS SELECT id, entity_id AS {column}, user_id FROM favorites "
+            "WHERE entity_type = '{entity_type}'".format(entity_type=entity_type, column=column, table=table)
+        )
+
+
+def replace_favorites(create):
+    # the views depend on the table and the id sequence is owned by it, both are detached while the
+    # rows are copied into the new table
+    drop_views()
+    op.execute('ALTER SEQUENCE favorites_id_seq OWNED BY NONE')
+    op.execute('ALTER TABLE favorites RENAME TO favorites_old')
+    op.execute('DROP INDEX ix_favorites_user_entity')
+    op.execute('DROP INDEX ix_favorites_entity')
+    op.execute('ALTER TABLE favorites_old DROP CONSTRAINT favorites_pkey')
+    create()
+    op.execute('CREATE UNIQUE INDEX ix_favorites_user_entity ON favorites (user_id, entity_type, entity_id) INCLUDE (id)')
+    op.execute('CREATE INDEX ix_favorites_entity ON favorites (entity_type, entity_id)')
+    op.execute('INSERT INTO favorites (id, user_id, entity_type, entity_id) SELECT id, user_id, entity_type, entity_id FROM favorites_old')
+    op.execute('DROP TABLE favorites_old')
+    op.execute('ALTER SEQUENCE favorites_id_seq OWNED BY favorites.id')
+    create_views()
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    def create():
+        # the primary key of a partitioned table has to contain the partition key
+        op.execute(
+            "CREATE TABLE favorites ("
+            "id INTEGER NOT NULL DEFAULT nextval('favorites_id_seq'), "
+            "user_id INTEGER NOT NULL REFERENCES \"user\" (id), "
+            "entity_type VARCHAR(20) NOT NULL, "
+            "entity_id INTEGER NOT NULL, "
+            "PRIMARY KEY (id, user_id)"
+            ") PARTITION BY HASH (user_id)"
+        )
+        for remainder in range(PARTITIONS):
+            op.execute(
+                'CREATE TABLE favorites_p{remainder} PARTITION OF favorites '
+                'FOR VALUES WITH (MODULUS {modulus}, REMAINDER {remainder})'.format(modulus=PARTITIONS, remainder=remainder)
+            )
+
+    replace_favorites(create)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    def create():
+        op.execute(
+            "CREATE TABLE favorites ("
+            "id INTEGER NOT NULL DEFAULT nextval('favorites_id_seq'), "
+            "user_id INTEGER NOT NULL REFERENCES \"user\" (id), "
+            "entity_type VARCHAR(20) NOT NULL, "
+            "entity_id INTEGER NOT NULL, "
+            "PRIMARY KEY (id)"
+            ")"
+        )
+
+    replace_favorites(create)
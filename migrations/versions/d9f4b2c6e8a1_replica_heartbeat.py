@@ -0,0 +1,30 @@
+"""replica heartbeat table
+
+Revision ID: d9f4b2c6e8a1
+Revises: c3e8a1d5f7b2
+Create Date: 2026-10-19 17:50:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9f4b2c6e8a1'
+down_revision = 'c3e8a1d5f7b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = sa.inspect(op.get_bind()).get_table_names()
+    if 'replica_heartbeat' not in existing:
+        op.create_table('replica_heartbeat',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('beat_at', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('replica_heartbeat')
@@ -0,0 +1,30 @@
+"""catalog version stamp
+
+Revision ID: e1a7c3b5d9f2
+Revises: a5cffa318ac2
+Create Date: 2026-10-19 16:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1a7c3b5d9f2'
+down_revision = 'a5cffa318ac2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    catalog_version = op.create_table('catalog_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # the only row, seeded here so concurrent first writes only ever update it
+    op.bulk_insert(catalog_version, [{'id': 1, 'version': 0}])
+
+
+def downgrade():
+    op.drop_table('catalog_version')
@@ -0,0 +1,37 @@
+"""change log
+
+Revision ID: f2b8d4c6a0e3
+Revises: e1a7c3b5d9f2
+Create Date: 2026-10-19 16:25:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b8d4c6a0e3'
+down_revision = 'e1a7c3b5d9f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('change_log',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('table_name', sa.String(length=50), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('operation', sa.String(length=10), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sqlite_autoincrement=True
+    )
+    op.create_index(op.f('ix_change_log_table_name'), 'change_log', ['table_name'], unique=False)
+    op.create_index(op.f('ix_change_log_user_id'), 'change_log', ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_change_log_user_id'), table_name='change_log')
+    op.drop_index(op.f('ix_change_log_table_name'), table_name='change_log')
+    op.drop_table('change_log')
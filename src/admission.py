@@ -0,0 +1,231 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import request, jsonify
+from metrics import register_metrics
+
+# full table reads with nested relations, they get a bounded share of the threads of the worker
+EXPENSIVE_ROUTES = (
+    '/starships', '/planets', '/films', '/characters', '/species', '/user',
+    '/favorite_starships', '/favorite_planets', '/favorite_films', '/favorite_characters', '/favorite_species',
+    '/starships_films', '/starships_characters', '/planets_films', '/films_characters', '/films_species',
+    '/query', '/batch',
+)
+
+class Rejected(Exception):
+    def __init__(self, status, reason, retry_after):
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+class Limiter:
+    """
+    At most `concurrency` requests at once. Up to `queue_size` more wait for a slot, each for at most
+    `timeout` seconds, the rest are rejected right away instead of tying up a thread.
+    """
+
+    def __init__(self, concurrency, queue_size=0, timeout=0.0):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = {'queue_full': 0, 'queue_timeout': 0}
+        self.wait_seconds = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            if self.active < self.concurrency and not self.waiting:
+                self.active += 1
+                self.admitted += 1
+                return
+            if self.waiting >= self.queue_size:
+                self.rejected['queue_full'] += 1
+                raise Rejected(503, 'queue_full', max(self.timeout, 1))
+            self.waiting += 1
+            start = time.monotonic()
+            try:
+                while self.active >= self.concurrency:
+                    remaining = start + self.timeout - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected['queue_timeout'] += 1
+                        raise Rejected(503, 'queue_timeout', max(self.timeout, 1))
+                    self.condition.wait(remaining)
+                self.active += 1
+                self.admitted += 1
+                self.wait_seconds += time.monotonic() - start
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+class TokenBucket:
+    __slots__ = ('tokens', 'updated_at')
+
+    def __init__(self, burst):
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+class ClientLimits:
+    """
+    Per client: a token bucket of `rate` tokens per second holding up to `burst`, every request takes
+    `cost` tokens, and at most `concurrency` requests in flight. Only the `max_clients` most recent
+    clients are remembered.
+    """
+
+    def __init__(self, rate=0.0, burst=20, concurrency=0, max_clients=10000):
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()
+        self.in_flight = {}
+        self.rejected = {'rate': 0, 'client_concurrency': 0}
+        self.lock = threading.Lock()
+
+    def acquire(self, client, cost, in_flight=True):
+        with self.lock:
+            if self.rate:
+                bucket = self.buckets.pop(client, None) or TokenBucket(self.burst)
+                self.buckets[client] = bucket
+                if len(self.buckets) > self.max_clients:
+                    self.buckets.popitem(last=False)
+                now = time.monotonic()
+                bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated_at) * self.rate)
+                bucket.updated_at = now
+                if bucket.tokens < cost:
+                    self.rejected['rate'] += 1
+                    raise Rejected(429, 'rate', (cost - bucket.tokens) / self.rate)
+                bucket.tokens -= cost
+            if self.concurrency and in_flight:
+                if self.in_flight.get(client, 0) >= self.concurrency:
+                    self.rejected['client_concurrency'] += 1
+                    raise Rejected(429, 'client_concurrency', 1)
+                self.in_flight[client] = self.in_flight.get(client, 0) + 1
+
+    def release(self, client):
+        if not self.concurrency:
+            return
+        with self.lock:
+            self.in_flight[client] -= 1
+            if not self.in_flight[client]:
+                del self.in_flight[client]
+
+class Admission:
+    def __init__(self, expensive_routes, expensive, routes, clients, expensive_cost=1, trusted_proxies=0):
+        self.expensive_routes = set(expensive_routes)
+        self.expensive = expensive
+        self.routes = routes
+        self.clients = clients
+        self.expensive_cost = expensive_cost
+        self.trusted_proxies = trusted_proxies
+
+    def limiters(self, rule):
+        limiters = []
+        if rule in self.routes:
+            limiters.append(self.routes[rule])
+        if rule in self.expensive_routes:
+            limiters.append(self.expensive)
+        return limiters
+
+    def client(self):
+        # each trusted proxy appends the address it got the request from, what the client sent is on the left
+        if self.trusted_proxies:
+            forwarded = [address.strip() for address in request.headers.get('X-Forwarded-For', '').split(',')]
+            if len(forwarded) >= self.trusted_proxies and forwarded[-self.trusted_proxies]:
+                return forwarded[-self.trusted_proxies]
+        return request.remote_addr
+
+    def admit(self):
+        # the pre-renderer fetches the catalog through the app, its renders must never be shed
+        if request.url_rule is None or request.method == 'OPTIONS' or request.url_rule.rule == '/metrics' or request.environ.get('prerender.skip'):
+            return None
+        limiters = self.limiters(request.url_rule.rule)
+        cost = self.expensive_cost if self.expensive in limiters else 1
+        parent = request.environ.get('batch.parent')
+        if parent is None:
+            client = self.client()
+        else:
+            # a /batch sub-request pays its tokens but runs in the slots of the batch, taking them again
+            # would wait for the batch itself
+            client = parent.get('admission.client', self.client())
+            limiters = [limiter for limiter in limiters if limiter not in parent.get('admission.limiters', ())]
+        acquired = []
+        try:
+            self.clients.acquire(client, cost, in_flight=parent is None)
+            if parent is None:
+                # in the environ of the request, the /batch sub-requests share the g of the outer one
+                request.environ['admission.client'] = client
+            for limiter in limiters:
+                limiter.acquire()
+                acquired.append(limiter)
+        except Rejected as rejected:
+            for limiter in acquired:
+                limiter.release()
+            if 'admission.client' in request.environ:
+                self.clients.release(request.environ.pop('admission.client'))
+            response = jsonify({'msg': 'Too many requests' if rejected.status == 429 else 'Server busy, try again later', 'reason': rejected.reason})
+            response.status_code = rejected.status
+            response.headers['Retry-After'] = str(max(1, math.ceil(rejected.retry_after)))
+            return response
+        request.environ['admission.limiters'] = acquired
+        return None
+
+    def release(self, exception=None):
+        for limiter in request.environ.pop('admission.limiters', ()):
+            limiter.release()
+        if 'admission.client' in request.environ:
+            self.clients.release(request.environ.pop('admission.client'))
+
+    def collect(self):
+        named = [('expensive', self.expensive)] + sorted(self.routes.items())
+        return [
+            ('admission_active_requests', 'gauge', 'Requests holding a slot of the limiter.', [({'limiter': name}, limiter.active) for name, limiter in named]),
+            ('admission_queued_requests', 'gauge', 'Requests waiting for a slot of the limiter.', [({'limiter': name}, limiter.waiting) for name, limiter in named]),
+            ('admission_admitted_total', 'counter', 'Requests admitted by the limiter.', [({'limiter': name}, limiter.admitted) for name, limiter in named]),
+            ('admission_queue_wait_seconds_total', 'counter', 'Time spent waiting for a slot of the limiter.', [({'limiter': name}, round(limiter.wait_seconds, 6)) for name, limiter in named]),
+            ('admission_rejected_total', 'counter', 'Requests shed with a 429 or a 503.',
+                [({'limiter': name, 'reason': reason}, count) for name, limiter in named for reason, count in limiter.rejected.items()]
+                + [({'limiter': 'client', 'reason': reason}, count) for reason, count in self.clients.rejected.items()]),
+            ('admission_tracked_clients', 'gauge', 'Clients with a token bucket in this worker.', [({}, len(self.clients.buckets))]),
+        ]
+
+def parse_route_limits(value):
+    # "/films=1,/user/<int:user_id>=4" -> {'/films': 1, '/user/<int:user_id>': 4}
+    limits = {}
+    for item in value.split(','):
+        if item.strip():
+            rule, limit = item.rsplit('=', 1)
+            limits[rule.strip()] = int(limit)
+    return limits
+
+def init_admission(app):
+    app.config.setdefault('ADMISSION_EXPENSIVE_ROUTES', ','.join(EXPENSIVE_ROUTES))
+    app.config.setdefault('ADMISSION_EXPENSIVE_CONCURRENCY', 1)
+    app.config.setdefault('ADMISSION_EXPENSIVE_QUEUE', 1)
+    app.config.setdefault('ADMISSION_QUEUE_TIMEOUT', 0.5)
+    app.config.setdefault('ADMISSION_EXPENSIVE_COST', 5)
+    app.config.setdefault('ADMISSION_ROUTE_LIMITS', '')
+    app.config.setdefault('ADMISSION_CLIENT_RATE', 0.0)
+    app.config.setdefault('ADMISSION_CLIENT_BURST', 20)
+    app.config.setdefault('ADMISSION_CLIENT_CONCURRENCY', 0)
+    app.config.setdefault('ADMISSION_TRUSTED_PROXIES', 0)
+    timeout = app.config['ADMISSION_QUEUE_TIMEOUT']
+    admission = Admission(
+        [rule.strip() for rule in app.config['ADMISSION_EXPENSIVE_ROUTES'].split(',') if rule.strip()],
+        Limiter(app.config['ADMISSION_EXPENSIVE_CONCURRENCY'], app.config['ADMISSION_EXPENSIVE_QUEUE'], timeout),
+        {rule: Limiter(limit) for rule, limit in parse_route_limits(app.config['ADMISSION_ROUTE_LIMITS']).items()},
+        ClientLimits(app.config['ADMISSION_CLIENT_RATE'], app.config['ADMISSION_CLIENT_BURST'], app.config['ADMISSION_CLIENT_CONCURRENCY']),
+        app.config['ADMISSION_EXPENSIVE_COST'],
+        app.config['ADMISSION_TRUSTED_PROXIES'],
+    )
+    app.extensions['admission'] = admission
+    app.before_request(admission.admit)
+    app.teardown_request(admission.release)
+    register_metrics(app, admission.collect)
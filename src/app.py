@@ -2,45 +2,336 @@
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
 """
 import os
-from flask import Flask, request, jsonify, url_for
-from flask_migrate import Migrate
-from flask_swagger import swagger
+import json
+from flask import Flask, Blueprint, request, jsonify, url_for, current_app
 from flask_cors import CORS
-from utils import APIException, generate_sitemap
-from admin import setup_admin
+from normalized import serialize_normalized, serialize_by_ids
+from batch import execute_batch
+from query import execute_query
+from singleflight import single_flight
+from changelog import read_changes
+from stats import AGGREGATES
+from lookups import find_favorite, find_link
+from profiling import collapsed, speedscope
+from favorites import FAVORITE_TYPES, save_favorite, serialize_favorites, user_favorites, favorites_session, list_favorites, delete_favorites
+from snapshot import get_catalog, catalog_exists
+from utils import APIException, generate_sitemap, get_route_index, build_route_index, env_flag, parse_ids
 from models import db, User, Starships, Planets, Films, Characters, Species, Favorite_Starships, Favorite_Planets, Favorite_Films, Favorite_Characters, Favorite_Species, Starships_Films, Starships_Characters, Planets_Films, Films_Characters, Films_Species
 #from models import Person
 
-app = Flask(__name__)
-app.url_map.strict_slashes = False
+api = Blueprint('api', __name__)
 
-db_url = os.getenv("DATABASE_URL")
-if db_url is not None:
-    app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace("postgres://", "postgresql://")
-else:
-    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+def create_app(config=None):
+    app = Flask(__name__)
+    app.url_map.strict_slashes = False
 
-MIGRATE = Migrate(app, db)
-db.init_app(app)
-CORS(app)
-setup_admin(app)
+    db_url = os.getenv("DATABASE_URL")
+    if db_url is not None:
+        app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace("postgres://", "postgresql://")
+    else:
+        app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    # optional subsystems, they are only imported when enabled so a cold start does not pay for them
+    app.config['ENABLE_ADMIN'] = env_flag('ENABLE_ADMIN', True)
+    app.config['ENABLE_MIGRATE'] = env_flag('ENABLE_MIGRATE', True)
+    app.config['ENABLE_SWAGGER'] = env_flag('ENABLE_SWAGGER', False)
+    app.config['ENABLE_COMPRESSION'] = env_flag('ENABLE_COMPRESSION', True)
+    app.config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESS_MIN_SIZE', 500))
+    app.config['COMPRESS_LEVEL'] = int(os.getenv('COMPRESS_LEVEL', 6))
+    app.config['JSON_COMPACT'] = env_flag('JSON_COMPACT', True)
+    app.config['JSON_SORT_KEYS'] = env_flag('JSON_SORT_KEYS', False)
+    app.config['ENABLE_CATALOG_SNAPSHOT'] = env_flag('ENABLE_CATALOG_SNAPSHOT', False)
+    app.config['CATALOG_SNAPSHOT_CHECK_INTERVAL'] = float(os.getenv('CATALOG_SNAPSHOT_CHECK_INTERVAL', 1.0))
+    app.config['BATCH_MAX_REQUESTS'] = int(os.getenv('BATCH_MAX_REQUESTS', 50))
+    app.config['QUERY_MAX_DEPTH'] = int(os.getenv('QUERY_MAX_DEPTH', 4))
+    app.config['QUERY_MAX_SELECTIONS'] = int(os.getenv('QUERY_MAX_SELECTIONS', 20))
+    app.config['QUERY_MAX_ROWS'] = int(os.getenv('QUERY_MAX_ROWS', 10000))
+    app.config['ENABLE_SINGLE_FLIGHT'] = env_flag('ENABLE_SINGLE_FLIGHT', False)
+    app.config['SINGLE_FLIGHT_TTL'] = float(os.getenv('SINGLE_FLIGHT_TTL', 2.0))
+    app.config['SINGLE_FLIGHT_STALE_TTL'] = float(os.getenv('SINGLE_FLIGHT_STALE_TTL', 30.0))
+    app.config['SINGLE_FLIGHT_BACKEND'] = os.getenv('SINGLE_FLIGHT_BACKEND')
+    app.config['SINGLE_FLIGHT_DIR'] = os.getenv('SINGLE_FLIGHT_DIR', '/tmp/singleflight')
+    app.config['ENABLE_CHANGE_LOG'] = env_flag('ENABLE_CHANGE_LOG', False)
+    app.config['CHANGE_LOG_POLL_INTERVAL'] = float(os.getenv('CHANGE_LOG_POLL_INTERVAL', 1.0))
+    app.config['CHANGE_LOG_RETENTION_DAYS'] = int(os.getenv('CHANGE_LOG_RETENTION_DAYS', 30))
+    app.config['CHANGE_LOG_SAFETY_WINDOW'] = float(os.getenv('CHANGE_LOG_SAFETY_WINDOW', 10.0))
+    app.config['ENABLE_PUSH'] = env_flag('ENABLE_PUSH', False)
+    app.config['PUSH_BACKEND'] = os.getenv('PUSH_BACKEND', 'local')
+    app.config['PUSH_BUFFER_SIZE'] = int(os.getenv('PUSH_BUFFER_SIZE', 100))
+    app.config['PUSH_MAX_SUBSCRIBERS'] = int(os.getenv('PUSH_MAX_SUBSCRIBERS')) if os.getenv('PUSH_MAX_SUBSCRIBERS') else None
+    app.config['PUSH_HEARTBEAT'] = float(os.getenv('PUSH_HEARTBEAT', 15.0))
+    app.config['PUSH_MAX_AGE'] = float(os.getenv('PUSH_MAX_AGE', 300.0))
+    app.config['PUSH_POLL_INTERVAL'] = float(os.getenv('PUSH_POLL_INTERVAL', 0.5))
+    app.config['FAVORITES_SHARDS'] = os.getenv('FAVORITES_SHARDS', '')
+    app.config['DATABASE_REPLICA_URLS'] = os.getenv('DATABASE_REPLICA_URLS', '')
+    app.config['REPLICA_MAX_LAG'] = float(os.getenv('REPLICA_MAX_LAG', 5.0))
+    app.config['REPLICA_CHECK_INTERVAL'] = float(os.getenv('REPLICA_CHECK_INTERVAL', 1.0))
+    app.config['ENABLE_RECOMMENDATIONS'] = env_flag('ENABLE_RECOMMENDATIONS', False)
+    app.config['RECOMMENDATIONS_TOP_K'] = int(os.getenv('RECOMMENDATIONS_TOP_K', 10))
+    app.config['RECOMMENDATIONS_REBUILD_INTERVAL'] = float(os.getenv('RECOMMENDATIONS_REBUILD_INTERVAL', 600))
+    app.config['ENABLE_STATS'] = env_flag('ENABLE_STATS', False)
+    app.config['STATS_MAX_AGE'] = float(os.getenv('STATS_MAX_AGE', 60.0))
+    app.config['ENABLE_EXPORT'] = env_flag('ENABLE_EXPORT', False)
+    app.config['EXPORT_DIR'] = os.getenv('EXPORT_DIR', '/tmp/exports')
+    app.config['EXPORT_BATCH_SIZE'] = int(os.getenv('EXPORT_BATCH_SIZE', 10000))
+    app.config['ENABLE_PRERENDER'] = env_flag('ENABLE_PRERENDER', False)
+    app.config['PRERENDER_DIR'] = os.getenv('PRERENDER_DIR', '/tmp/prerender')
+    app.config['PRERENDER_CHECK_INTERVAL'] = float(os.getenv('PRERENDER_CHECK_INTERVAL', 1.0))
+    app.config['PRERENDER_ACCEL_PREFIX'] = os.getenv('PRERENDER_ACCEL_PREFIX', '')
+    app.config['DATABASE_PREPARE_THRESHOLD'] = os.getenv('DATABASE_PREPARE_THRESHOLD')
+    app.config['ENABLE_GROUP_COMMIT'] = env_flag('ENABLE_GROUP_COMMIT', False)
+    app.config['GROUP_COMMIT_MAX_SIZE'] = int(os.getenv('GROUP_COMMIT_MAX_SIZE', 100))
+    app.config['GROUP_COMMIT_MAX_WAIT'] = float(os.getenv('GROUP_COMMIT_MAX_WAIT', 0.005))
+    app.config['GROUP_COMMIT_ACK'] = os.getenv('GROUP_COMMIT_ACK', 'commit')
+    app.config['GROUP_COMMIT_TIMEOUT'] = float(os.getenv('GROUP_COMMIT_TIMEOUT', 10.0))
+    app.config['ENABLE_ADMISSION'] = env_flag('ENABLE_ADMISSION', False)
+    app.config['ADMISSION_EXPENSIVE_CONCURRENCY'] = int(os.getenv('ADMISSION_EXPENSIVE_CONCURRENCY', 1))
+    app.config['ADMISSION_EXPENSIVE_QUEUE'] = int(os.getenv('ADMISSION_EXPENSIVE_QUEUE', 1))
+    app.config['ADMISSION_QUEUE_TIMEOUT'] = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 0.5))
+    app.config['ADMISSION_EXPENSIVE_COST'] = float(os.getenv('ADMISSION_EXPENSIVE_COST', 5))
+    app.config['ADMISSION_ROUTE_LIMITS'] = os.getenv('ADMISSION_ROUTE_LIMITS', '')
+    app.config['ADMISSION_CLIENT_RATE'] = float(os.getenv('ADMISSION_CLIENT_RATE', 0.0))
+    app.config['ADMISSION_CLIENT_BURST'] = float(os.getenv('ADMISSION_CLIENT_BURST', 20))
+    app.config['ADMISSION_CLIENT_CONCURRENCY'] = int(os.getenv('ADMISSION_CLIENT_CONCURRENCY', 0))
+    app.config['ADMISSION_TRUSTED_PROXIES'] = int(os.getenv('ADMISSION_TRUSTED_PROXIES', 0))
+    if os.getenv('ADMISSION_EXPENSIVE_ROUTES') is not None:
+        app.config['ADMISSION_EXPENSIVE_ROUTES'] = os.getenv('ADMISSION_EXPENSIVE_ROUTES')
+    app.config['ENABLE_PROFILING'] = env_flag('ENABLE_PROFILING', False)
+    app.config['PROFILING_TOKEN'] = os.getenv('PROFILING_TOKEN', '')
+    app.config['PROFILING_INTERVAL'] = float(os.getenv('PROFILING_INTERVAL', 0.001))
+    app.config['PROFILING_SAMPLE_INTERVAL'] = float(os.getenv('PROFILING_SAMPLE_INTERVAL', 0.05))
+    app.config['PROFILING_FLUSH_INTERVAL'] = float(os.getenv('PROFILING_FLUSH_INTERVAL', 10.0))
+    app.config['PROFILING_DIR'] = os.getenv('PROFILING_DIR', '/tmp/profiles')
+    app.config['ENABLE_MEMORY_DIAGNOSTICS'] = env_flag('ENABLE_MEMORY_DIAGNOSTICS', False)
+    app.config['MEMORY_TRACE_RATE'] = float(os.getenv('MEMORY_TRACE_RATE', 0.01))
+    app.config['MEMORY_TRACE_FRAMES'] = int(os.getenv('MEMORY_TRACE_FRAMES', 1))
+    app.config['MEMORY_TOP_SITES'] = int(os.getenv('MEMORY_TOP_SITES', 20))
+    app.config['MEMORY_REQUEST_BUDGET_MB'] = float(os.getenv('MEMORY_REQUEST_BUDGET_MB', 0))
+    app.config['MEMORY_MAX_RSS_MB'] = float(os.getenv('MEMORY_MAX_RSS_MB', 0))
+    app.config['MEMORY_DIR'] = os.getenv('MEMORY_DIR', '/tmp/memory')
+    app.config['MEMORY_FLUSH_INTERVAL'] = float(os.getenv('MEMORY_FLUSH_INTERVAL', 10.0))
+    if config is not None:
+        app.config.update(config)
+
+    # jsonify without indentation nor key sorting, even with debug turned on
+    app.json.compact = app.config['JSON_COMPACT']
+    app.json.sort_keys = app.config['JSON_SORT_KEYS']
+
+    if app.config['DATABASE_PREPARE_THRESHOLD'] is not None and not app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql+psycopg://'):
+        # psycopg2, the driver of the Pipfile, has no server-side prepared statements
+        app.logger.warning('DATABASE_PREPARE_THRESHOLD is ignored, it needs a postgresql+psycopg:// URL (psycopg 3 and SQLAlchemy 2)')
+    elif app.config['DATABASE_PREPARE_THRESHOLD'] is not None:
+        # psycopg 3 prepares a statement on the server once a connection ran it this many times, "off" never does (pgbouncer)
+        threshold = app.config['DATABASE_PREPARE_THRESHOLD']
+        connect_args = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {}).setdefault('connect_args', {})
+        connect_args['prepare_threshold'] = None if str(threshold).lower() == 'off' else int(threshold)
+
+    if app.config['DATABASE_REPLICA_URLS']:
+        from replicas import replica_binds
+        app.config['SQLALCHEMY_BINDS'] = {**app.config.get('SQLALCHEMY_BINDS', {}), **replica_binds(app.config['DATABASE_REPLICA_URLS'])}
+
+    db.init_app(app)
+    CORS(app)
+    app.register_blueprint(api)
+
+    # first, so a profiled request goes through every other hook like any request
+    if app.config['ENABLE_PROFILING']:
+        from profiling import init_profiling
+        init_profiling(app)
+
+    # also first, its teardown runs last and sees what the whole request left behind
+    if app.config['ENABLE_MEMORY_DIAGNOSTICS']:
+        from memory import init_memory
+        init_memory(app)
+
+    if app.config['ENABLE_COMPRESSION']:
+        from compression import init_compression
+        init_compression(app)
+
+    if app.config['ENABLE_CATALOG_SNAPSHOT']:
+        from snapshot import init_catalog_snapshot
+        init_catalog_snapshot(app)
+
+    if app.config['ENABLE_SINGLE_FLIGHT']:
+        from singleflight import init_single_flight
+        init_single_flight(app)
+
+    if app.config['ENABLE_CHANGE_LOG']:
+        from changelog import init_change_log
+        init_change_log(app)
+
+    if app.config['ENABLE_PUSH']:
+        from push import init_push
+        init_push(app)
+
+    if app.config['DATABASE_REPLICA_URLS']:
+        from replicas import init_replicas
+        init_replicas(app, db)
+
+    if app.config['FAVORITES_SHARDS']:
+        from favorites import init_favorite_shards
+        init_favorite_shards(app)
+
+    if app.config['ENABLE_RECOMMENDATIONS']:
+        from recommendations import init_recommendations
+        init_recommendations(app)
+
+    if app.config['ENABLE_STATS']:
+        from stats import init_stats
+        init_stats(app)
+
+    if app.config['ENABLE_EXPORT']:
+        from export import init_export
+        init_export(app)
+
+    if app.config['ENABLE_PRERENDER']:
+        from prerender import init_prerender
+        init_prerender(app)
+
+    if app.config['ENABLE_GROUP_COMMIT']:
+        from groupcommit import init_group_commit
+        init_group_commit(app)
+
+    # after the pre-renderer, a catalog page served from disk costs nothing and is never shed
+    if app.config['ENABLE_ADMISSION']:
+        from admission import init_admission
+        init_admission(app)
+
+    if app.config['ENABLE_MIGRATE']:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    if app.config['ENABLE_ADMIN']:
+        from admin import setup_admin
+        setup_admin(app)
+    if app.config['ENABLE_SWAGGER']:
+        from flask_swagger import swagger
+
+        @app.route('/swagger')
+        def swagger_spec():
+            return jsonify(swagger(app))
+
+    # build the sitemap and the route index now that every blueprint and view is registered
+    with app.test_request_context():
+        app.extensions['route_index'] = build_route_index(app)
+
+    return app
 
 # Handle/serialize errors like a JSON object
-@app.errorhandler(APIException)
+@api.app_errorhandler(APIException)
 def handle_invalid_usage(error):
     return jsonify(error.to_dict()), error.status_code
 
 # generate sitemap with all your endpoints
-@app.route('/')
+@api.route('/')
 def sitemap():
-    return generate_sitemap(app)
+    return generate_sitemap(current_app)
+
+# same index in a machine readable format, with the methods and parameters of every endpoint
+@api.route('/routes', methods=['GET'])
+def handle_routes():
+    return jsonify(get_route_index(current_app)['routes']), 200
+
+
+# ejecutar varias llamadas a la API en una sola petición: {"requests": [{"method": "GET", "path": "/films/1"}, ...], "parallel": false}
+@api.route('/batch', methods=['POST'])
+def handle_batch():
+    body = request.get_json(silent=True)
+    if body is None:
+        return jsonify({'msg': 'Body cannot be empty'}), 400
+    results = execute_batch(current_app._get_current_object(), body.get('requests'), parallel=bool(body.get('parallel')), limit=current_app.config['BATCH_MAX_REQUESTS'])
+    return jsonify({'responses': results}), 200
+
+# consultar el grafo de modelos eligiendo campos y relaciones: {"films": {"fields": ["title"], "characters": {"planet": {}}}}
+@api.route('/query', methods=['POST'])
+def handle_query():
+    body = request.get_json(silent=True)
+    if body is None:
+        return jsonify({'msg': 'Body cannot be empty'}), 400
+    config = current_app.config
+    result = execute_query(body, max_depth=config['QUERY_MAX_DEPTH'], max_selections=config['QUERY_MAX_SELECTIONS'], max_rows=config['QUERY_MAX_ROWS'])
+    return jsonify(result), 200
+
+# (get) cambios desde el cursor del cliente para sincronizar su copia local: /changes?since=120&types=films,favorite_films&user_id=1
+@api.route('/changes', methods=['GET'])
+def handle_changes():
+    if not current_app.config['ENABLE_CHANGE_LOG']:
+        return jsonify({'msg': 'The change log is disabled'}), 404
+    since = request.args.get('since', 0, type=int)
+    types = [name for name in request.args.get('types', '').split(',') if name]
+    user_id = request.args.get('user_id', type=int)
+    limit = min(request.args.get('limit', 500, type=int), 5000)
+    return jsonify(read_changes(since, types, user_id, limit)), 200
+
+# (get) agregados del catálogo y de los favoritos en formato columnar: /stats, /stats?names=characters_per_planet,species_per_film
+@api.route('/stats', methods=['GET'])
+def handle_stats():
+    stats = current_app.extensions.get('stats')
+    if stats is None:
+        return jsonify({'msg': 'Stats are disabled'}), 404
+    names = [name for name in request.args.get('names', '').split(',') if name] or list(AGGREGATES)
+    unknown = [name for name in names if name not in AGGREGATES]
+    if unknown:
+        return jsonify({'msg': 'Unknown stats: {}'.format(', '.join(unknown))}), 400
+    return jsonify({name: stats.get(name) for name in names}), 200
+
+# (get) exportación de una tabla entera en parquet o arrow para analítica: /export/films.parquet, /export/favorites.arrow
+@api.route('/export/<table>.<any(parquet, arrow):format>', methods=['GET'])
+def handle_export(table, format):
+    exporter = current_app.extensions.get('export')
+    if exporter is None:
+        return jsonify({'msg': 'Exports are disabled'}), 404
+    if table not in exporter.tables:
+        return jsonify({'msg': 'Unknown table {}'.format(table)}), 404
+    return exporter.send(exporter.tables[table], format)
+
+# (get) muestras de perfilado de todos los workers agregadas por ruta: /profile/samples?route=/films&format=speedscope
+# (delete) borra las muestras para empezar de cero
+@api.route('/profile/samples', methods=['GET', 'DELETE'])
+def handle_profile_samples():
+    profiler = current_app.extensions.get('profiler')
+    if profiler is None or profiler.sampler is None:
+        return jsonify({'msg': 'Continuous profiling is disabled'}), 404
+    if not profiler.authorized():
+        return jsonify({'msg': 'Invalid profile token'}), 403
+    if request.method == 'DELETE':
+        profiler.sampler.reset()
+        return jsonify({'msg': 'Profile samples removed'}), 200
+    profiles = profiler.sampler.merged(request.args.get('route'))
+    if request.args.get('format', 'speedscope') == 'collapsed':
+        return profiler.send(collapsed(profiles), 'text/plain', 'samples.folded')
+    return profiler.send(json.dumps(speedscope(profiles, 'samples')), 'application/json', 'samples.speedscope.json')
+
+# (get) memoria de cada worker: rss, crecimiento y mapa de identidad por ruta, picos de tracemalloc y sitios de asignación
+@api.route('/memory', methods=['GET'])
+def handle_memory():
+    monitor = current_app.extensions.get('memory')
+    if monitor is None:
+        return jsonify({'msg': 'Memory diagnostics are disabled'}), 404
+    if not monitor.authorized():
+        return jsonify({'msg': 'Invalid profile token'}), 403
+    return jsonify({'workers': monitor.workers()}), 200
+
+# (get) canal de eventos (server-sent events) con los cambios de favoritos y catálogo: /stream?types=favorite_films,films&user_id=1
+@api.route('/stream', methods=['GET'])
+def handle_stream():
+    channel = current_app.extensions.get('push')
+    if channel is None:
+        return jsonify({'msg': 'The push channel is disabled'}), 404
+    types = [name for name in request.args.get('types', '').split(',') if name]
+    user_id = request.args.get('user_id', type=int)
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    last_event_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    response = channel.open(types, user_id, last_event_id)
+    if response is None:
+        return jsonify({'msg': 'Too many open streams, try again later'}), 503, {'Retry-After': '5'}
+    return response
 
 
 # endpoints de tablas únicas ########################################################################################################################################################################
 # ENDPOINTS DE USER
 # (post) agregar nuevos usuarios y (get) obtener todos los usuarios agregados ------------------------------------------------------------------------------------------------------------------------
-@app.route('/user', methods=['POST', 'GET'])
+@api.route('/user', methods=['POST', 'GET'])
 def handle_allusers():
     if request.method == 'POST':
         body = request.get_json(silent=True)
@@ -60,14 +351,16 @@ def handle_allusers():
         db.session.commit()
         return jsonify({'msg': 'User successfully added'}), 200
     if request.method == 'GET':
+        if 'ids' in request.args:
+            return jsonify(serialize_by_ids(User, parse_ids(request.args['ids'])))
         users = User.query.all()
         users_serialized = list(map(lambda x: x.serialize(), users))
         return jsonify(users_serialized)
 
 # (get) obtener la información de un usuario en concreto y (put) modificar datos de un usuario en concreto ------------------------------------------------------------------------------------------------------
-@app.route('/user/<int:user_id>', methods=['GET', 'PUT'])
+@api.route('/user/<int:user_id>', methods=['GET', 'PUT'])
 def handle_user(user_id):
-    user = User.query.get(user_id)
+    user = db.session.get(User, user_id)
     if user is None:
         return jsonify({'msg': 'User do not exist'}), 400
     if request.method == 'GET':
@@ -86,35 +379,35 @@ def handle_user(user_id):
         return jsonify({'msg': 'Updated user with ID {}'.format(user_id)}), 200
 
 # (get) para obtener los favoritos de todas las secciones de un usuario en concreto -------------------------------------------------------------------------------------------------------------------------------
-@app.route('/user/<int:user_id>/favorites', methods=['GET'])
+@api.route('/user/<int:user_id>/favorites', methods=['GET'])
 def handle_user_all_favorites(user_id):
-    user = User.query.get(user_id)
+    user = db.session.get(User, user_id)
     if user is None:
         return jsonify({'msg': 'User do not exist'}), 400
-    user_favorite_starships = Favorite_Starships.query.filter_by(user_id = user_id).all()
-    user_favorite_starships_serialized = list(map(lambda x: x.serialize(), user_favorite_starships))
-    user_favorite_planets = Favorite_Planets.query.filter_by(user_id = user_id).all()
-    user_favorite_planets_serialized = list(map(lambda x: x.serialize(), user_favorite_planets))
-    user_favorite_films = Favorite_Films.query.filter_by(user_id = user_id).all()
-    user_favorite_films_serialized = list(map(lambda x: x.serialize(), user_favorite_films))
-    user_favorite_characters = Favorite_Characters.query.filter_by(user_id = user_id).all()
-    user_favorite_characters_serialized = list(map(lambda x: x.serialize(), user_favorite_characters))
-    user_favorite_species = Favorite_Species.query.filter_by(user_id = user_id).all()
-    user_favorite_species_serialized = list(map(lambda x: x.serialize(), user_favorite_species))
-
-    favorites = {
-        "favorite_starships": user_favorite_starships_serialized,
-        "favorite_planets": user_favorite_planets_serialized,
-        "favorite_films": user_favorite_films_serialized,
-        "favorite_characters": user_favorite_characters_serialized,
-        "favorite_species": user_favorite_species_serialized
-    }
-
+    favorites = user_favorites(user_id)
     return jsonify(favorites), 200
 
+# (get) recomendaciones para un usuario a partir de sus favoritos ("quien marcó lo mismo que tú también marcó...") -----------------------------------------------------------------------------------------------------
+@api.route('/user/<int:user_id>/recommendations', methods=['GET'])
+def handle_user_recommendations(user_id):
+    recommender = current_app.extensions.get('recommendations')
+    if recommender is None:
+        return jsonify({'msg': 'Recommendations are disabled'}), 404
+    return jsonify(recommender.for_user(user_id)), 200
+
+# (get) entidades que también marcaron como favoritas los usuarios que marcaron esta: /recommendations/films/1 --------------------------------------------------------------------------------------------------------
+@api.route('/recommendations/<entity>/<int:entity_id>', methods=['GET'])
+def handle_recommendations(entity, entity_id):
+    recommender = current_app.extensions.get('recommendations')
+    if recommender is None:
+        return jsonify({'msg': 'Recommendations are disabled'}), 404
+    if entity not in FAVORITE_TYPES:
+        return jsonify({'msg': 'Unknown entity {}'.format(entity)}), 400
+    return jsonify(recommender.for_item(entity, entity_id)), 200
+
 # ENDPOINTS DE STARSHIPS
 # (post) agregar nuevos starships y (get) obtener todos los starships agregados ---------------------------------------------------------------------------------------------------------------------------------------
-@app.route('/starships', methods=['POST', 'GET'])
+@api.route('/starships', methods=['POST', 'GET'])
 def handle_allstarships():
     if request.method == 'POST':
         body = request.get_json(silent=True)
@@ -130,23 +423,35 @@ def handle_allstarships():
         db.session.add(starships)
         db.session.commit()
         return jsonify({'msg': 'Starship successfully added'}), 200
+    if request.method == 'GET' and 'ids' in request.args:
+        return jsonify(serialize_by_ids(Starships, parse_ids(request.args['ids'])))
     if request.method == 'GET':
-        starships = Starships.query.all()
-        starships_with_related_films = []
-        for starship in starships:
-            related_films = [film.film_data.serialize() for film in starship.related_films]
-            related_characters = [character.character_data.serialize() for character in starship.related_characters]
-            starships_with_related_films.append({
-                "starship_data": starship.serialize(),
-                "related_films": related_films,
-                "related_characters": related_characters
-            })
-        return jsonify(starships_with_related_films)
+        catalog = get_catalog()
+        if catalog is not None and request.args.get('format') != 'normalized':
+            return jsonify(catalog.list_starships())
+        if request.args.get('format') == 'normalized':
+            return jsonify(serialize_normalized(Starships, Starships.query.all()))
+        def build_starships_with_related_films():
+            starships = Starships.query.all()
+            starships_with_related_films = []
+            for starship in starships:
+                related_films = [film.film_data.serialize() for film in starship.related_films]
+                related_characters = [character.character_data.serialize() for character in starship.related_characters]
+                starships_with_related_films.append({
+                    "starship_data": starship.serialize(),
+                    "related_films": related_films,
+                    "related_characters": related_characters
+                })
+            return starships_with_related_films
+        return jsonify(single_flight('starships', build_starships_with_related_films))
 
 # (get) obtener la información de un starship en concreto y (put) modificar datos de un starship en concreto -----------------------------------------------------------------------------------------------------------------
-@app.route('/starships/<int:starships_id>', methods=['GET', 'PUT'])
+@api.route('/starships/<int:starships_id>', methods=['GET', 'PUT'])
 def handle_starship(starships_id):
-    starship = Starships.query.get(starships_id)
+    catalog = get_catalog() if request.method == 'GET' else None
+    if catalog is not None and catalog.serialize_starship(starships_id) is not None:
+        return jsonify(catalog.serialize_starship(starships_id)), 200
+    starship = db.session.get(Starships, starships_id)
     if starship is None:
         return jsonify({'msg': 'Starships do not exist'}), 400
     if request.method == 'GET':
@@ -164,7 +469,7 @@ def handle_starship(starships_id):
 
 # ENDPOINTS DE PLANETS
 # (post) agregar nuevos planets y (get) obtener todos los planets agregados --------------------------------------------------------------------------------------------------------------------------------------------------------
-@app.route('/planets', methods=['POST', 'GET'])
+@api.route('/planets', methods=['POST', 'GET'])
 def handle_allplanets():
     if request.method == 'POST':
         body = request.get_json(silent=True)
@@ -183,21 +488,33 @@ def handle_allplanets():
         db.session.add(planets)
         db.session.commit()
         return jsonify({'msg': 'Planet successfully added'}), 200
+    if request.method == 'GET' and 'ids' in request.args:
+        return jsonify(serialize_by_ids(Planets, parse_ids(request.args['ids'])))
     if request.method == 'GET':
-        planets = Planets.query.all()
-        planets_with_related_films = []
-        for planet in planets:
-            related_films = [film.film_data.serialize() for film in planet.related_films]
-            planets_with_related_films.append({
-                "planet_data": planet.serialize(),
-                "related_films": related_films
-            })
-        return jsonify(planets_with_related_films)
+        catalog = get_catalog()
+        if catalog is not None and request.args.get('format') != 'normalized':
+            return jsonify(catalog.list_planets())
+        if request.args.get('format') == 'normalized':
+            return jsonify(serialize_normalized(Planets, Planets.query.all()))
+        def build_planets_with_related_films():
+            planets = Planets.query.all()
+            planets_with_related_films = []
+            for planet in planets:
+                related_films = [film.film_data.serialize() for film in planet.related_films]
+                planets_with_related_films.append({
+                    "planet_data": planet.serialize(),
+                    "related_films": related_films
+                })
+            return planets_with_related_films
+        return jsonify(single_flight('planets', build_planets_with_related_films))
 
 # (get) obtener la información de un planeta en concreto y (put) modificar datos de un planeta en concreto ------------------------------------------------------------------------------------------------------------------------------------
-@app.route('/planets/<int:planets_id>', methods=['GET', 'PUT'])
+@api.route('/planets/<int:planets_id>', methods=['GET', 'PUT'])
 def handle_planet(planets_id):
-    planets = Planets.query.get(planets_id)
+    catalog = get_catalog() if request.method == 'GET' else None
+    if catalog is not None and catalog.serialize_planet(planets_id) is not None:
+        return jsonify(catalog.serialize_planet(planets_id)), 200
+    planets = db.session.get(Planets, planets_id)
     if planets is None:
         return jsonify({'msg': 'planets do not exist'}), 400
     if request.method == 'GET':
@@ -217,7 +534,7 @@ def handle_planet(planets_id):
 
 # ENDPOINTS DE FILMS
 # (post) agregar nuevos films y (get) obtener todos los films agregados -----------------------------------------------------------------------------------------------------------------------------------------------------------------------------
-@app.route('/films', methods=['POST', 'GET'])
+@api.route('/films', methods=['POST', 'GET'])
 def handle_newfilm():
     if request.method == 'POST':
         body = request.get_json(silent=True)
@@ -236,27 +553,39 @@ def handle_newfilm():
         db.session.add(film)
         db.session.commit()
         return jsonify({'msg': 'Film successfully added'}), 200
+    if request.method == 'GET' and 'ids' in request.args:
+        return jsonify(serialize_by_ids(Films, parse_ids(request.args['ids'])))
     if request.method == 'GET':
-        films = Films.query.all()
-        films_with_related = []
-        for film in films:
-            related_starships = [starship.starship_data.serialize() for starship in film.related_starships]
-            related_films = [planet.planet_data.serialize() for planet in film.related_planets]
-            related_characters = [character.character_data.serialize() for character in film.related_characters]
-            related_species = [species.species_data.serialize() for species in film.related_species]
-            films_with_related.append({
-                "film_data": film.serialize(),
-                "related_starships": related_starships,
-                "related_planets": related_films,
-                "related_characters": related_characters, 
-                "related_species": related_species
-            })
-        return jsonify(films_with_related)
+        catalog = get_catalog()
+        if catalog is not None and request.args.get('format') != 'normalized':
+            return jsonify(catalog.list_films())
+        if request.args.get('format') == 'normalized':
+            return jsonify(serialize_normalized(Films, Films.query.all()))
+        def build_films_with_related():
+            films = Films.query.all()
+            films_with_related = []
+            for film in films:
+                related_starships = [starship.starship_data.serialize() for starship in film.related_starships]
+                related_films = [planet.planet_data.serialize() for planet in film.related_planets]
+                related_characters = [character.character_data.serialize() for character in film.related_characters]
+                related_species = [species.species_data.serialize() for species in film.related_species]
+                films_with_related.append({
+                    "film_data": film.serialize(),
+                    "related_starships": related_starships,
+                    "related_planets": related_films,
+                    "related_characters": related_characters, 
+                    "related_species": related_species
+                })
+            return films_with_related
+        return jsonify(single_flight('films', build_films_with_related))
 
 # (get) obtener la información de un film en concreto y (put) modificar datos de un film en concreto ---------------------------------------------------------------------------------------------------------------------------------------------------
-@app.route('/films/<int:films_id>', methods=['GET', 'PUT'])
+@api.route('/films/<int:films_id>', methods=['GET', 'PUT'])
 def handle_film(films_id):
-    film = Films.query.get(films_id)
+    catalog = get_catalog() if request.method == 'GET' else None
+    if catalog is not None and catalog.serialize_film(films_id) is not None:
+        return jsonify(catalog.serialize_film(films_id)), 200
+    film = db.session.get(Films, films_id)
     if request.method == 'GET':
         return jsonify(film.serialize())
     if request.method == 'PUT': 
@@ -274,7 +603,7 @@ def handle_film(films_id):
 
 # ENDPOINTS DE CHARACTERS
 # (post) agregar nuevos characters y (get) obtener todos los characters agregados -------------------------------------------------------------------------------------------------------------------------------------------------------------------------
-@app.route('/characters', methods=['POST', 'GET'])
+@api.route('/characters', methods=['POST', 'GET'])
 def handle_allcharacters():
     if request.method == 'POST':
         body = request.get_json(silent=True)
@@ -294,23 +623,35 @@ def handle_allcharacters():
         db.session.commit()
         return jsonify({'msg': 'Character successfully added'}), 200
     
+    if request.method == 'GET' and 'ids' in request.args:
+        return jsonify(serialize_by_ids(Characters, parse_ids(request.args['ids'])))
     if request.method == 'GET':
-        characters = Characters.query.all()
-        characters_with_related = []
-        for character in characters:
-            related_starships = [starship.starship_data.serialize() for starship in character.related_starships]
-            related_films = [film.film_data.serialize() for film in character.related_films]
-            characters_with_related.append({
-                "character_data": character.serialize(),
-                "related_starships": related_starships,
-                "related films": related_films
-            })
-        return jsonify(characters_with_related)
+        catalog = get_catalog()
+        if catalog is not None and request.args.get('format') != 'normalized':
+            return jsonify(catalog.list_characters())
+        if request.args.get('format') == 'normalized':
+            return jsonify(serialize_normalized(Characters, Characters.query.all()))
+        def build_characters_with_related():
+            characters = Characters.query.all()
+            characters_with_related = []
+            for character in characters:
+                related_starships = [starship.starship_data.serialize() for starship in character.related_starships]
+                related_films = [film.film_data.serialize() for film in character.related_films]
+                characters_with_related.append({
+                    "character_data": character.serialize(),
+                    "related_starships": related_starships,
+                    "related films": related_films
+                })
+            return characters_with_related
+        return jsonify(single_flight('characters', build_characters_with_related))
 
 # (get) obtener la información de un character en concreto y (put) modificar datos de un character en concreto ---------------------------------------------------------------------------------------------------------------------------------------------------
-@app.route('/characters/<int:characters_id>', methods=['GET', 'PUT'])
+@api.route('/characters/<int:characters_id>', methods=['GET', 'PUT'])
 def handle_character(characters_id):
-    character = Characters.query.get(characters_id)
+    catalog = get_catalog() if request.method == 'GET' else None
+    if catalog is not None and catalog.serialize_character(characters_id) is not None:
+        return jsonify(catalog.serialize_character(characters_id)), 200
+    character = db.session.get(Characters, characters_id)
     if request.method == 'GET':
         return jsonify(character.serialize())
     if request.method == 'PUT':
@@ -324,7 +665,7 @@ def handle_character(characters_id):
 
 # ENPOINTS DE SPECIES
 # (post) agregar nuevos species y (get) obtener todos los species agregados --------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
-@app.route('/species', methods=['POST', 'GET'])
+@api.route('/species', methods=['POST', 'GET'])
 def handle_allspecies():
     if request.method == 'POST':
         body = request.get_json(silent=True)
@@ -343,21 +684,33 @@ def handle_allspecies():
         db.session.add(species)
         db.session.commit()
         return jsonify({'msg': 'Species successfully added'}), 200
+    if request.method == 'GET' and 'ids' in request.args:
+        return jsonify(serialize_by_ids(Species, parse_ids(request.args['ids'])))
     if request.method == 'GET':
-        species = Species.query.all()
-        species_with_related = []
-        for species in species:
-            related_films = [film.film_data.serialize() for film in species.related_films]
-            species_with_related.append({
-                "species_data": species.serialize(),
-                "related films": related_films
-            })
-        return jsonify(species_with_related)
+        catalog = get_catalog()
+        if catalog is not None and request.args.get('format') != 'normalized':
+            return jsonify(catalog.list_species())
+        if request.args.get('format') == 'normalized':
+            return jsonify(serialize_normalized(Species, Species.query.all()))
+        def build_species_with_related():
+            species = Species.query.all()
+            species_with_related = []
+            for species in species:
+                related_films = [film.film_data.serialize() for film in species.related_films]
+                species_with_related.append({
+                    "species_data": species.serialize(),
+                    "related films": related_films
+                })
+            return species_with_related
+        return jsonify(single_flight('species', build_species_with_related))
 
 # (get) obtener la información de un species en concreto y (put) modificar datos de un species en concreto --------------------------------------------------------------------------------------------------------------------------------------------------------
-@app.route('/species/<int:species_id>', methods=['GET', 'PUT'])
+@api.route('/species/<int:species_id>', methods=['GET', 'PUT'])
 def handle_species(species_id):
-    species = Species.query.get(species_id)
+    catalog = get_catalog() if request.method == 'GET' else None
+    if catalog is not None and catalog.serialize_species(species_id) is not None:
+        return jsonify(catalog.serialize_species(species_id)), 200
+    species = db.session.get(Species, species_id)
     if request.method == 'GET':
         return jsonify(species.serialize()), 200
     if request.method == 'PUT':
@@ -373,306 +726,308 @@ def handle_species(species_id):
 
 # endspoints de las tablas de favoritos ##########################################################################################################################################################################################
 # ENDPOINTS DE FAVORITES STARSHIPS
-# admin endpoint // (get) ver todas las starships favoritas con sus usuarios correspondientes
-@app.route('/favorite_starships', methods=['GET'])
+# admin endpoint // (get) ver todas las starships favoritas con sus usuarios correspondientes (paginado con ?limit=&offset=)
+@api.route('/favorite_starships', methods=['GET'])
 def handle_allfavoritestarships():    
-    all_favorite_starships = Favorite_Starships.query.all()
-    all_favorite_starships_serialized = list(map(lambda x: x.serialize(), all_favorite_starships))
+    all_favorite_starships = list_favorites(Favorite_Starships, limit=request.args.get('limit', type=int), offset=request.args.get('offset', 0, type=int))
+    all_favorite_starships_serialized = serialize_favorites(all_favorite_starships)
     return jsonify(all_favorite_starships_serialized), 200
 
 # admin endpoint // (get) para ver todas las veces que una starship en concreta fue agregada a favoritos y (delete) eliminar de favoritos todas las instancias que contengan una starship en concreta -------------------------------------------------------------------------------
-@app.route('/favorite_starships/<int:starship_id>', methods=['GET', 'DELETE'])
+@api.route('/favorite_starships/<int:starship_id>', methods=['GET', 'DELETE'])
 def handle_favoritestarship(starship_id):
-    favorite_starships = Favorite_Starships.query.filter_by(starship_id = starship_id)
+    favorite_starships = list_favorites(Favorite_Starships, starship_id)
     if favorite_starships is None: 
         return jsonify({'msg': 'The starship with ID {} does not exist'.format(starship_id)})
     if request.method == 'GET':
-        favorite_starships_serialized = list(map(lambda x: x.serialize(), favorite_starships))
+        favorite_starships_serialized = serialize_favorites(favorite_starships)
         return jsonify(favorite_starships_serialized), 200
     
     if request.method == 'DELETE':
-        for fav in favorite_starships:
-            db.session.delete(fav)
-        db.session.commit()
+        delete_favorites(favorite_starships)
         return jsonify({'msg': 'Favorite Starships with ID {} succefully deleted'.format(starship_id)})
 
 # (post) agregar starship a un usuario en concreto y (get) ver las starships favoritas de un usuario en concreto ---------------------------------------------------------------------------------------------------------------------------------------------------------------------
-@app.route('/user/<int:user_id>/favorite_starships', methods=['GET', 'POST'])
+@api.route('/user/<int:user_id>/favorite_starships', methods=['GET', 'POST'])
 def handle_userfavoritestarships(user_id):
+    session = favorites_session(user_id)
     if request.method == 'POST':
         body = request.get_json(silent=True)
         if body is None:
             return jsonify({'msg': 'Body cannot be empty'}), 400
         if 'starship_id' not in body:
             return jsonify({'msg': 'Specify starship_id'}), 400
-        if not (Starships.query.get(body['starship_id']) and User.query.get(user_id)):
+        if not (catalog_exists(Starships, body['starship_id']) and db.session.get(User, user_id)):
             return jsonify({'msg': 'Invalid starship_id o user_id'}), 400
-        if (Favorite_Starships.query.filter_by(user_id = user_id, starship_id = body['starship_id']).first()):
+        if (find_favorite(session, Favorite_Starships, user_id, body['starship_id'])):
             return jsonify({'msg': 'Starship already in favorites of the user with ID {}'.format(user_id)})
         user_favorite_starship = Favorite_Starships()
         user_favorite_starship.starship_id = body['starship_id']
         user_favorite_starship.user_id = user_id
-        db.session.add(user_favorite_starship)
-        db.session.commit()
+        if not save_favorite(session, user_favorite_starship):
+            return jsonify({'msg': 'Favorite starship queued'}), 202
         return jsonify({'msg': 'Favorite starship successfully added'}), 200
     if request.method == 'GET':
-        user_favorite_starship = Favorite_Starships.query.filter_by(user_id = user_id)
-        user_favorite_starship_serialized = list(map(lambda x: x.serialize(), user_favorite_starship))
+        user_favorite_starship = session.query(Favorite_Starships).filter_by(user_id = user_id)
+        user_favorite_starship_serialized = serialize_favorites(user_favorite_starship)
         return jsonify(user_favorite_starship_serialized), 200
 
 # (get) para ver individualmente el starship concreto de un user concreto y (delete) para eliminar un starship concreto de los favoritos de un user concreto --------------------------------------------------------------------------------------------------------------------------------
-@app.route('/user/<int:user_id>/favorite_starships/<int:starship_id>', methods=['GET', 'DELETE'])
+@api.route('/user/<int:user_id>/favorite_starships/<int:starship_id>', methods=['GET', 'DELETE'])
 def handle_userfavoritestarship(user_id, starship_id):
-    user_favorite_starship = Favorite_Starships.query.filter_by(starship_id = starship_id, user_id = user_id).first()
+    session = favorites_session(user_id)
+    user_favorite_starship = find_favorite(session, Favorite_Starships, user_id, starship_id)
     if not user_favorite_starship:
         return jsonify({'msg': 'Invalid user_id or starship_id'}), 400
     if request.method == 'GET':
-        user_favorite_starship_serialized = user_favorite_starship.serialize()
+        user_favorite_starship_serialized = serialize_favorites([user_favorite_starship])[0]
         return jsonify(user_favorite_starship_serialized), 200
     if request.method == 'DELETE':
-        db.session.delete(user_favorite_starship)
-        db.session.commit()
+        if not save_favorite(session, user_favorite_starship, delete=True):
+            return jsonify({'msg': 'Favorite starship queued for deletion'}), 202
         return jsonify({'msg': 'Favorite starship with ID {} deleted from favorites of user with ID {}'.format(starship_id, user_id)}), 200
 
 #ENPOINTS DE FAVORITE_PLANETS
-# admin endpoint // (get) ver todos los planets favoritos con sus usuarios correspondientes
-@app.route('/favorite_planets', methods=['GET'])
+# admin endpoint // (get) ver todos los planets favoritos con sus usuarios correspondientes (paginado con ?limit=&offset=)
+@api.route('/favorite_planets', methods=['GET'])
 def handle_allfavoriteplanets():
-    all_favorite_planets = Favorite_Planets.query.all()
-    all_favorite_planets_serialized = list(map(lambda x: x.serialize(), all_favorite_planets))
+    all_favorite_planets = list_favorites(Favorite_Planets, limit=request.args.get('limit', type=int), offset=request.args.get('offset', 0, type=int))
+    all_favorite_planets_serialized = serialize_favorites(all_favorite_planets)
     return jsonify(all_favorite_planets_serialized), 200
 
 # admin endpoint // (get) para ver todas las veces que un planet en concreto fue agregado a favoritos y (delete) eliminar de favoritos todas las instancias que contengan un planet en concreto --------------------------------------------------------------------------------------------------------------------------------
-@app.route('/favorite_planets/<int:planet_id>', methods=['GET', 'DELETE'])
+@api.route('/favorite_planets/<int:planet_id>', methods=['GET', 'DELETE'])
 def handle_favoriteplanets(planet_id):
-    favorite_planets = Favorite_Planets.query.filter_by(planet_id = planet_id)
+    favorite_planets = list_favorites(Favorite_Planets, planet_id)
     if favorite_planets is None:
         return jsonify({'msg': 'The planet with ID {} does not exist'.format(planet_id)}), 400
     if request.method == 'GET':
-        favorite_planets_serialized = list(map(lambda x: x.serialize(), favorite_planets))
+        favorite_planets_serialized = serialize_favorites(favorite_planets)
         return jsonify(favorite_planets_serialized), 200
     if request.method == 'DELETE':
-        for fav in favorite_planets:
-            db.session.delete(fav)
-        db.session.commit()
+        delete_favorites(favorite_planets)
         return jsonify({'msg': 'Favorite Planets with ID {} successfully delete'.format(planet_id)}), 200
 
 # (post) agregar planets a un usuario en concreto y (get) ver los planets favoritos de un usuario en concreto --------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
-@app.route('/user/<int:user_id>/favorite_planets', methods=['GET', 'POST'])
+@api.route('/user/<int:user_id>/favorite_planets', methods=['GET', 'POST'])
 def handle_userfavoriteplanets(user_id):
+    session = favorites_session(user_id)
     if request.method == 'POST':
         body = request.get_json(silent=True)
         if body is None:
             return jsonify({'msg': 'Body cannot be empy'}), 400
         if 'planet_id' not in body:
             return jsonify({'msg': 'Specify planet_id'}), 400
-        if not (Planets.query.get(body['planet_id']) and User.query.get(user_id)):
+        if not (catalog_exists(Planets, body['planet_id']) and db.session.get(User, user_id)):
             return jsonify({'msg': 'Invalid planet_id or user_id'}), 400
-        if (Favorite_Planets.query.filter_by(user_id = user_id, planet_id = body['planet_id']).first()):
+        if (find_favorite(session, Favorite_Planets, user_id, body['planet_id'])):
             return jsonify({'msg': 'Planet already in favorites of the user with ID {}'.format(user_id)})
         user_favorite_planet = Favorite_Planets()
         user_favorite_planet.planet_id = body['planet_id']
         user_favorite_planet.user_id = user_id
-        db.session.add(user_favorite_planet)
-        db.session.commit()
+        if not save_favorite(session, user_favorite_planet):
+            return jsonify({'msg': 'Favorite planet queued'}), 202
         return jsonify({'msg': 'Favorite planet successfully added'}), 200
     if request.method == 'GET':
-        user_favorite_planet = Favorite_Planets.query.filter_by(user_id = user_id)
-        user_favorite_planet_serialized = list(map(lambda x: x.serialize(), user_favorite_planet))
+        user_favorite_planet = session.query(Favorite_Planets).filter_by(user_id = user_id)
+        user_favorite_planet_serialized = serialize_favorites(user_favorite_planet)
         return jsonify(user_favorite_planet_serialized), 200
 
 # (get) para ver individualmente el planet concreto de un user concreto y (delete) para eliminar un planet concreto de los favoritos de un user concreto ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
-@app.route('/user/<int:user_id>/favorite_planets/<int:planet_id>', methods=['GET', 'DELETE'])
+@api.route('/user/<int:user_id>/favorite_planets/<int:planet_id>', methods=['GET', 'DELETE'])
 def handle_userfavoriteplanet(user_id, planet_id):
-    user_favorite_planet = Favorite_Planets.query.filter_by(user_id = user_id, planet_id = planet_id).first()
+    session = favorites_session(user_id)
+    user_favorite_planet = find_favorite(session, Favorite_Planets, user_id, planet_id)
     if not user_favorite_planet:
         return jsonify({'msg': 'Invalid user_id or planet_id'})
     if request.method == 'GET':
-        user_favorite_planet_serialized = user_favorite_planet.serialize()
+        user_favorite_planet_serialized = serialize_favorites([user_favorite_planet])[0]
         return jsonify(user_favorite_planet_serialized), 200
     if request.method == 'DELETE':
-        db.session.delete(user_favorite_planet)
-        db.session.commit()
+        if not save_favorite(session, user_favorite_planet, delete=True):
+            return jsonify({'msg': 'Favorite planet queued for deletion'}), 202
         return jsonify({'msg': 'Favorite planet with ID {} deleted from favorites of user with ID {}'.format(planet_id, user_id)}), 200 
 
 # ENDPOINTS DE FAVORITE_FILMS
-# admin endpoint // (get) ver todos los films favoritos con sus usuarios correspondientes
-@app.route('/favorite_films', methods=['GET'])
+# admin endpoint // (get) ver todos los films favoritos con sus usuarios correspondientes (paginado con ?limit=&offset=)
+@api.route('/favorite_films', methods=['GET'])
 def handle_allfavoritefilms():
-    all_favorite_films = Favorite_Films.query.all()
-    all_favorite_films_serialized = list(map(lambda x: x.serialize(), all_favorite_films))
+    all_favorite_films = list_favorites(Favorite_Films, limit=request.args.get('limit', type=int), offset=request.args.get('offset', 0, type=int))
+    all_favorite_films_serialized = serialize_favorites(all_favorite_films)
     return jsonify(all_favorite_films_serialized), 200
 
 # admin endpoint // (get) para ver todas las veces que un film en concreto fue agregado a favoritos y (delete) eliminar de favoritos todas las instancias que contengan un film en concreto --------------------------------------------------------------------------------------------------------------------------------
-@app.route('/favorite_films/<int:film_id>', methods=['GET', 'DELETE'])
+@api.route('/favorite_films/<int:film_id>', methods=['GET', 'DELETE'])
 def handle_favoritefilm(film_id):
-    favorite_film = Favorite_Films.query.filter_by(film_id = film_id)
+    favorite_film = list_favorites(Favorite_Films, film_id)
     if favorite_film is None:
         return jsonify({'msg': 'The film with ID {} does not exist'.format(film_id)}), 400
     if request.method == 'GET':
-        favorite_film_serialized = list(map(lambda x: x.serialize(), favorite_film))
+        favorite_film_serialized = serialize_favorites(favorite_film)
         return jsonify(favorite_film_serialized), 200
     if request.method == 'DELETE':
-        for fav in favorite_film:
-            db.session.delete(fav)
-        db.session.commit()
+        delete_favorites(favorite_film)
         return jsonify({'msg': 'Favorite Films with ID {} successfully deleted'.format(film_id)})
     
 # (post) agregar films a un usuario en concreto y (get) ver los films favoritos de un usuario en concreto ------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
-@app.route('/user/<int:user_id>/favorite_films', methods=['POST', 'GET'])
+@api.route('/user/<int:user_id>/favorite_films', methods=['POST', 'GET'])
 def handle_userfavoritefilms(user_id):
+    session = favorites_session(user_id)
     if request.method == 'POST':
         body = request.get_json(silent=True)
         if body is None:
             return jsonify({'msg': 'Body cannot be empty'}), 400
         if 'film_id' not in body:
             return jsonify({'msg': 'Specify film_id'}), 400
-        if not (Films.query.get(body['film_id']) and User.query.get(user_id)):
+        if not (catalog_exists(Films, body['film_id']) and db.session.get(User, user_id)):
             return jsonify({'msg': 'Invalid film_id or user_id'}), 400
-        if (Favorite_Films.query.filter_by(user_id = user_id, film_id = body['film_id']).first()):
+        if (find_favorite(session, Favorite_Films, user_id, body['film_id'])):
             return jsonify({'msg': 'Film already in favorites of the user with ID {}'.format(user_id)})
         user_favorite_film = Favorite_Films()
         user_favorite_film.film_id = body['film_id']
         user_favorite_film.user_id = user_id
-        db.session.add(user_favorite_film)
-        db.session.commit()
+        if not save_favorite(session, user_favorite_film):
+            return jsonify({'msg': 'Favorite film queued'}), 202
         return jsonify({'msg': 'Favorite film successfully added'}), 200
     if request.method == 'GET':
-        user_favorite_film = Favorite_Films.query.filter_by(user_id = user_id) 
-        user_favorite_film_serialized = list(map(lambda x: x.serialize(), user_favorite_film))
+        user_favorite_film = session.query(Favorite_Films).filter_by(user_id = user_id) 
+        user_favorite_film_serialized = serialize_favorites(user_favorite_film)
         return jsonify(user_favorite_film_serialized), 200
     
 # (get) para ver individualmente el film concreto de un user concreto y (delete) para eliminar un film concreto de los favoritos de un user concreto -----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
-@app.route('/user/<int:user_id>/favorite_films/<int:film_id>', methods=['GET', 'DELETE'])
+@api.route('/user/<int:user_id>/favorite_films/<int:film_id>', methods=['GET', 'DELETE'])
 def handle_userfavoritefilm(user_id, film_id): 
-    user_favorite_film = Favorite_Films.query.filter_by(user_id = user_id, film_id = film_id).first()
-    user_favorite_film_serialized = user_favorite_film.serialize()
+    session = favorites_session(user_id)
+    user_favorite_film = find_favorite(session, Favorite_Films, user_id, film_id)
+    if not user_favorite_film:
+        return jsonify({'msg': 'Invalid user_id or film_id'}), 400
     if request.method == 'GET':
+        user_favorite_film_serialized = serialize_favorites([user_favorite_film])[0]
         return jsonify(user_favorite_film_serialized), 200
     if request.method == 'DELETE':
-        db.session.delete(user_favorite_film)
-        db.session.commit()
+        if not save_favorite(session, user_favorite_film, delete=True):
+            return jsonify({'msg': 'Favorite film queued for deletion'}), 202
         return ({'msg': 'Favorite film with ID {} deleted from favorites of user with ID {}'.format(film_id, user_id)})
 
 # ENDPOINTS DE FAVORITE_CHARACTERS
-# admin endpoint // (get) ver todos los characters favoritos con sus usuarios correspondientes
-@app.route('/favorite_characters', methods=['GET'])
+# admin endpoint // (get) ver todos los characters favoritos con sus usuarios correspondientes (paginado con ?limit=&offset=)
+@api.route('/favorite_characters', methods=['GET'])
 def handle_allfavoritecharacters():
-    all_favorite_characters = Favorite_Characters.query.all()
-    all_favorite_characters_serialized = list(map(lambda x: x.serialize(), all_favorite_characters))
+    all_favorite_characters = list_favorites(Favorite_Characters, limit=request.args.get('limit', type=int), offset=request.args.get('offset', 0, type=int))
+    all_favorite_characters_serialized = serialize_favorites(all_favorite_characters)
     return jsonify(all_favorite_characters_serialized), 200
 
 # admin endpoint // (get) para ver todas las veces que un character en concreto fue agregado a favoritos y (delete) eliminar de favoritos todas las instancias que contengan un character en concreto --------------------------------------------------------------------------------------------------------------------------------
-@app.route('/favorite_characters/<int:character_id>', methods=['GET', 'DELETE'])
+@api.route('/favorite_characters/<int:character_id>', methods=['GET', 'DELETE'])
 def handle_favoritecharacter(character_id):
-    favorite_characters = Favorite_Characters.query.filter_by(character_id = character_id)
+    favorite_characters = list_favorites(Favorite_Characters, character_id)
     if request.method == 'GET':
-        favorite_characters_serialized = list(map(lambda x: x.serialize(), favorite_characters))
+        favorite_characters_serialized = serialize_favorites(favorite_characters)
         return jsonify(favorite_characters_serialized), 200
     if request.method == 'DELETE':
-        for fav in favorite_characters:
-            db.session.delete(fav)
-        db.session.commit()
+        delete_favorites(favorite_characters)
         return jsonify({'msg': 'Favorite character with ID {} successfully deleted'.format(character_id)}), 200
     
 # (post) agregar characters a un usuario en concreto y (get) ver los characters favoritos de un usuario en concreto -------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
-@app.route('/user/<int:user_id>/favorite_characters', methods=['POST', 'GET'])
+@api.route('/user/<int:user_id>/favorite_characters', methods=['POST', 'GET'])
 def handle_userfavoritecharacters(user_id):
+    session = favorites_session(user_id)
     if request.method == 'POST':
         body = request.get_json(silent=True)
         if body is None:
             return jsonify({'msg': 'Body cannot be empty'}), 400
         if 'character_id' not in body:
             return jsonify({'msg': 'Specify character_id'}), 400
-        if not (Characters.query.get(body['character_id']) and User.query.get(user_id)):
+        if not (catalog_exists(Characters, body['character_id']) and db.session.get(User, user_id)):
             return ({'msg': 'Invalid character_id or user_id'}), 400
-        if (Favorite_Characters.query.filter_by(user_id = user_id, character_id = body['character_id']).first()):
+        if (find_favorite(session, Favorite_Characters, user_id, body['character_id'])):
             return jsonify({'msg': 'Character already in favorites of the user with ID {}'.format(user_id)})
         user_favorite_character = Favorite_Characters()
         user_favorite_character.character_id = body['character_id']
         user_favorite_character.user_id = user_id
-        db.session.add(user_favorite_character)
-        db.session.commit()
+        if not save_favorite(session, user_favorite_character):
+            return jsonify({'msg': 'Favorite character queued'}), 202
         return ({'msg': 'Favorite character successfully added'}), 200
     if request.method == 'GET':
-        user_favorite_characters = Favorite_Characters.query.filter_by(user_id = user_id)
-        user_favorite_characters_serialized = list(map(lambda x: x.serialize(), user_favorite_characters))
+        user_favorite_characters = session.query(Favorite_Characters).filter_by(user_id = user_id)
+        user_favorite_characters_serialized = serialize_favorites(user_favorite_characters)
         return jsonify(user_favorite_characters_serialized)
 
 # (get) para ver individualmente el character concreto de un user concreto y (delete) para eliminar un character concreto de los favoritos de un user concreto --------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
-@app.route('/user/<int:user_id>/favorite_characters/<int:character_id>', methods=['GET', 'DELETE'])
+@api.route('/user/<int:user_id>/favorite_characters/<int:character_id>', methods=['GET', 'DELETE'])
 def handle_userfavoritecharacter(user_id, character_id):
-    user_favorite_character = Favorite_Characters.query.filter_by(user_id = user_id, character_id = character_id).first()
+    session = favorites_session(user_id)
+    user_favorite_character = find_favorite(session, Favorite_Characters, user_id, character_id)
     if not user_favorite_character:
         return ({'msg': 'Invalid user_id or character_id'}), 400
     if request.method == 'GET':
-        return jsonify(user_favorite_character.serialize()), 200
+        return jsonify(serialize_favorites([user_favorite_character])[0]), 200
     if request.method == 'DELETE':
-        db.session.delete(user_favorite_character)
-        db.session.commit()
+        if not save_favorite(session, user_favorite_character, delete=True):
+            return jsonify({'msg': 'Favorite character queued for deletion'}), 202
         return ({'msg': 'Favorite character with ID {} deleted from favorites of user with ID {}'.format(character_id, user_id)})
 
 # ENDPOINTS DE FAVORITE_SPECIES
-# admin endpoint // (get) ver todos las species favoritas con sus usuarios correspondientes ------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
-@app.route('/favorite_species', methods=['GET'])
+# admin endpoint // (get) ver todos las species favoritas con sus usuarios correspondientes (paginado con ?limit=&offset=) ------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+@api.route('/favorite_species', methods=['GET'])
 def handle_all_favorite_species():
-    all_favorite_species = Favorite_Species.query.all()
-    all_favorite_species_serialized = list(map(lambda x: x.serialize(), all_favorite_species))
+    all_favorite_species = list_favorites(Favorite_Species, limit=request.args.get('limit', type=int), offset=request.args.get('offset', 0, type=int))
+    all_favorite_species_serialized = serialize_favorites(all_favorite_species)
     return jsonify(all_favorite_species_serialized), 200
 
 # admin endpoint // (get) para ver todas las veces que una species en concreto fue agregada a favoritos y (delete) eliminar de favoritos todas las instancias que contengan una species en concreto --------------------------------------------------------------------------------------------------------------------------------------------------------
-@app.route('/favorite_species/<int:species_id>', methods=['GET', 'DELETE'])
+@api.route('/favorite_species/<int:species_id>', methods=['GET', 'DELETE'])
 def handle_favorite_species_group(species_id):
-    favorite_species = Favorite_Species.query.filter_by(species_id = species_id)
+    favorite_species = list_favorites(Favorite_Species, species_id)
     if favorite_species is None:
         return jsonify({'msg': 'Favorite species with ID {} does not exist'.format(species_id)}), 400
     if request.method == 'GET':
-        favorite_species_serialized = list(map(lambda x: x.serialize(), favorite_species))
+        favorite_species_serialized = serialize_favorites(favorite_species)
         return jsonify(favorite_species_serialized), 200
     if request.method == 'DELETE':
-        for fav in favorite_species:
-            db.session.delete(fav)
-        db.session.commit()
+        delete_favorites(favorite_species)
         return jsonify({'msg': 'Favorite species with ID {} successfully deleted'.format(species_id)}), 200
 
 # (post) agregar species a un usuario en concreto y (get) ver las species favoritos de un usuario en concreto -------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
-@app.route('/user/<int:user_id>/favorite_species', methods=['POST', 'GET'])
+@api.route('/user/<int:user_id>/favorite_species', methods=['POST', 'GET'])
 def handle_user_all_favorite_species(user_id):
+    session = favorites_session(user_id)
     if request.method == 'POST':
         body = request.get_json(silent=True)
         if body is None:
             return jsonify({'msg': 'Body cannot be empty'}), 400
         if 'species_id' not in body:
             return jsonify({'msg': 'Specify species_id'}), 400
-        if (Favorite_Species.query.filter_by(user_id = user_id, species_id = body['species_id']).first()):
+        if (find_favorite(session, Favorite_Species, user_id, body['species_id'])):
             return jsonify({'msg': 'Species already in favorites of the user with ID {}'.format(user_id)})
         user_favorite_species = Favorite_Species()
         user_favorite_species.species_id = body['species_id']
         user_favorite_species.user_id = user_id
-        db.session.add(user_favorite_species)
-        db.session.commit()
+        if not save_favorite(session, user_favorite_species):
+            return jsonify({'msg': 'Favorite species queued'}), 202
         return jsonify({'msg': 'Favorite species successfully added'}), 200
     if request.method == 'GET':
-        user_favorite_species = Favorite_Species.query.filter_by(user_id = user_id)
-        user_favorite_species_serialized = list(map(lambda x: x.serialize(), user_favorite_species))
+        user_favorite_species = session.query(Favorite_Species).filter_by(user_id = user_id)
+        user_favorite_species_serialized = serialize_favorites(user_favorite_species)
         return jsonify(user_favorite_species_serialized), 200
 
 # (get) para ver individualmente las species concretas de un user concreto y (delete) para eliminar una species concreta de los favoritos de un user concreto -------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
-@app.route('/user/<int:user_id>/favorite_species/<int:species_id>', methods=['GET', 'DELETE'])
+@api.route('/user/<int:user_id>/favorite_species/<int:species_id>', methods=['GET', 'DELETE'])
 def handle_user_one_favorite_species(user_id, species_id):
-    user_one_favorite_species = Favorite_Species.query.filter_by(user_id = user_id, species_id = species_id).first()
+    session = favorites_session(user_id)
+    user_one_favorite_species = find_favorite(session, Favorite_Species, user_id, species_id)
     if request.method == 'GET':
-        return jsonify(user_one_favorite_species.serialize()), 200
+        return jsonify(serialize_favorites([user_one_favorite_species])[0]), 200
     if request.method == 'DELETE':
-        db.session.delete(user_one_favorite_species)
-        db.session.commit()
+        if not save_favorite(session, user_one_favorite_species, delete=True):
+            return jsonify({'msg': 'Favorite species queued for deletion'}), 202
         return jsonify({'msg': 'Favorite species with ID {} deleted from favorites of user with ID {}'.format(species_id, user_id)})
 
 
 # endpoints de associated tables (many to many) #####################################################################################################################################################################
 # ENPOINTS DE STARSHIPS_FILMS
 # (get) para obtener todas las relaciones entre starships y films y (post) para agregar una nueva relación entre starships y films -------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
-@app.route('/starships_films', methods=['GET', 'POST'])
+@api.route('/starships_films', methods=['GET', 'POST'])
 def handle_all_starships_films():
     if request.method == 'GET':
         all_starships_films = Starships_Films.query.all()
@@ -686,9 +1041,9 @@ def handle_all_starships_films():
             return jsonify({'msg': 'Specify starship_id'}), 400
         if 'film_id' not in body:
             return jsonify({'msg': 'Specify film_id'})
-        if (Starships_Films.query.filter_by(starship_id = body['starship_id'], film_id = body['film_id']).first()):
+        if (find_link(Starships_Films, starship_id=body['starship_id'], film_id=body['film_id'])):
             return jsonify({'msg': 'Relationship already exists'}), 400
-        if not (Starships.query.filter_by(id = body['starship_id']).first() and Films.query.filter_by(id = body['film_id']).first()):
+        if not (catalog_exists(Starships, body['starship_id']) and catalog_exists(Films, body['film_id'])):
             return jsonify({'msg': 'Invalid starship_id or film_id'})
         new_starship_film = Starships_Films()
         new_starship_film.starship_id = body['starship_id']
@@ -698,9 +1053,9 @@ def handle_all_starships_films():
         return jsonify({'msg': 'Relationship successfully added'}), 200
 
 # (get) para obtener una relación starship/film específica y (delete) para eliminar una relación starship/film específica
-@app.route('/starships_films/<int:relationship_id>', methods=['GET', 'PUT', 'DELETE'])
+@api.route('/starships_films/<int:relationship_id>', methods=['GET', 'PUT', 'DELETE'])
 def handle_one_starship_film(relationship_id):
-    one_starship_film = Starships_Films.query.filter_by(id = relationship_id).first()
+    one_starship_film = db.session.get(Starships_Films, relationship_id)
     if one_starship_film is None:
         return jsonify({'msg': 'Invalid relationship id'})
     if request.method == 'GET':
@@ -710,11 +1065,11 @@ def handle_one_starship_film(relationship_id):
         if body is None: 
             return jsonify({'msg': 'Body cannot be empty'}), 400
         if 'starship_id' in body:
-            if not (Starships.query.filter_by(id = body['starship_id']).first()):
+            if not (catalog_exists(Starships, body['starship_id'])):
                 return jsonify({'msg': 'Invalid starship_id'})
             one_starship_film.starship_id = body['starship_id']
         if 'film_id' in body: 
-            if not (Films.query.filter_by(id = body['film_id']).first()):
+            if not (catalog_exists(Films, body['film_id'])):
                 return jsonify({'msg': 'Invalid film_id'})
             one_starship_film.film_id = body['film_id']
         db.session.commit()
@@ -726,7 +1081,7 @@ def handle_one_starship_film(relationship_id):
     
 # ENPOINTS DE STARSHIPS_CHARACTERS
 # (get) para obtener todas las relaciones entre starships y characters y (post) para agregar una nueva relación entre starships y characters -------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
-@app.route('/starships_characters', methods=['GET', 'POST'])
+@api.route('/starships_characters', methods=['GET', 'POST'])
 def handle_all_starships_characters():
     if request.method == 'GET':
         all_starships_characters = Starships_Characters.query.all()
@@ -740,9 +1095,9 @@ def handle_all_starships_characters():
             return jsonify({'msg': 'Specify starship_id'}), 400
         if 'character_id' not in body:
             return jsonify({'msg': 'Specify character_id'})
-        if (Starships_Characters.query.filter_by(starship_id = body['starship_id'], character_id = body['character_id']).first()):
+        if (find_link(Starships_Characters, starship_id=body['starship_id'], character_id=body['character_id'])):
             return jsonify({'msg': 'Relationship already exists'}), 400
-        if not (Starships.query.filter_by(id = body['starship_id']).first() and Characters.query.filter_by(id = body['character_id']).first()):
+        if not (catalog_exists(Starships, body['starship_id']) and catalog_exists(Characters, body['character_id'])):
             return jsonify({'msg': 'Invalid starship_id or character_id'})
         new_starship_character = Starships_Characters()
         new_starship_character.starship_id = body['starship_id']
@@ -752,9 +1107,9 @@ def handle_all_starships_characters():
         return jsonify({'msg': 'Relationship successfully added'}), 200
 
 # (get) para obtener una relación starship/character específica y (delete) para eliminar una relación starship/character específica
-@app.route('/starships_characters/<int:relationship_id>', methods=['GET', 'PUT', 'DELETE'])
+@api.route('/starships_characters/<int:relationship_id>', methods=['GET', 'PUT', 'DELETE'])
 def handle_one_starship_character(relationship_id):
-    one_starship_character = Starships_Characters.query.filter_by(id = relationship_id).first()
+    one_starship_character = db.session.get(Starships_Characters, relationship_id)
     if one_starship_character is None:
         return jsonify({'msg': 'Invalid relationship id'})
     if request.method == 'GET':
@@ -764,11 +1119,11 @@ def handle_one_starship_character(relationship_id):
         if body is None: 
             return jsonify({'msg': 'Body cannot be empty'}), 400
         if 'starship_id' in body:
-            if not (Starships.query.filter_by(id = body['starship_id']).first()):
+            if not (catalog_exists(Starships, body['starship_id'])):
                 return jsonify({'msg': 'Invalid starship_id'})
             one_starship_character.starship_id = body['starship_id']
         if 'character_id' in body:
-            if not (Characters.query.filter_by(id = body['character_id']).first()):
+            if not (catalog_exists(Characters, body['character_id'])):
                 return jsonify({'msg': 'Invalid character_id'}) 
             one_starship_character.character_id = body['character_id']
         db.session.commit()
@@ -780,7 +1135,7 @@ def handle_one_starship_character(relationship_id):
 
 # ENPOINTS DE PLANETS_FILMS
 # (get) para obtener todas las relaciones entre planets y films y (post) para agregar una nueva relación entre planets y films -------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
-@app.route('/planets_films', methods=['GET', 'POST'])
+@api.route('/planets_films', methods=['GET', 'POST'])
 def handle_all_planets_films():
     if request.method == 'GET':
         all_planets_films = Planets_Films.query.all()
@@ -794,9 +1149,9 @@ def handle_all_planets_films():
             return jsonify({'msg': 'Specify planet_id'}), 400
         if 'film_id' not in body:
             return jsonify({'msg': 'Specify film_id'})
-        if (Planets_Films.query.filter_by(planet_id = body['planet_id'], film_id = body['film_id']).first()):
+        if (find_link(Planets_Films, planet_id=body['planet_id'], film_id=body['film_id'])):
             return jsonify({'msg': 'Relationship already exists'}), 400
-        if not (Planets.query.filter_by(id = body['planet_id']).first() and Films.query.filter_by(id = body['film_id']).first()):
+        if not (catalog_exists(Planets, body['planet_id']) and catalog_exists(Films, body['film_id'])):
             return jsonify({'msg': 'Invalid planet_id or film_id'})
         new_planet_film = Planets_Films()
         new_planet_film.planet_id = body['planet_id']
@@ -806,9 +1161,9 @@ def handle_all_planets_films():
         return jsonify({'msg': 'Relationship successfully added'}), 200
 
 # (get) para obtener una relación planet/film específica y (delete) para eliminar una relación planet/film específica
-@app.route('/planets_films/<int:relationship_id>', methods=['GET', 'PUT', 'DELETE'])
+@api.route('/planets_films/<int:relationship_id>', methods=['GET', 'PUT', 'DELETE'])
 def handle_one_planet_film(relationship_id):
-    one_planet_film = Planets_Films.query.filter_by(id = relationship_id).first()
+    one_planet_film = db.session.get(Planets_Films, relationship_id)
     if one_planet_film is None:
         return jsonify({'msg': 'Invalid relationship id'})
     if request.method == 'GET':
@@ -818,11 +1173,11 @@ def handle_one_planet_film(relationship_id):
         if body is None: 
             return jsonify({'msg': 'Body cannot be empty'}), 400
         if 'planet_id' in body:
-            if not (Planets.query.filter_by(id = body['planet_id']).first()):
+            if not (catalog_exists(Planets, body['planet_id'])):
                 return jsonify({'msg': 'Invalid planet_id'})
             one_planet_film.planet_id = body['planet_id']
         if 'film_id' in body:
-            if not (Films.query.filter_by(id = body['film_id']).first()):
+            if not (catalog_exists(Films, body['film_id'])):
                 return jsonify({'msg': 'Invalid film_id'})
             one_planet_film.film_id = body['film_id']
         db.session.commit()
@@ -834,7 +1189,7 @@ def handle_one_planet_film(relationship_id):
     
 # ENPOINTS DE FILMS_CHARACTERS
 # (get) para obtener todas las relaciones entre films y characters y (post) para agregar una nueva relación entre films y characters -------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
-@app.route('/films_characters', methods=['GET', 'POST'])
+@api.route('/films_characters', methods=['GET', 'POST'])
 def handle_all_films_characters():
     if request.method == 'GET':
         all_films_characters = Films_Characters.query.all()
@@ -848,9 +1203,9 @@ def handle_all_films_characters():
             return jsonify({'msg': 'Specify film_id'}), 400
         if 'character_id' not in body:
             return jsonify({'msg': 'Specify character_id'})
-        if (Films_Characters.query.filter_by(film_id = body['film_id'], character_id = body['character_id']).first()):
+        if (find_link(Films_Characters, film_id=body['film_id'], character_id=body['character_id'])):
             return jsonify({'msg': 'Relationship already exists'}), 400
-        if not (Films.query.filter_by(id = body['film_id']).first() and Characters.query.filter_by(id = body['character_id']).first()):
+        if not (catalog_exists(Films, body['film_id']) and catalog_exists(Characters, body['character_id'])):
             return jsonify({'msg': 'Invalid film_id or character_id'})
         new_film_character = Films_Characters()
         new_film_character.film_id = body['film_id']
@@ -860,9 +1215,9 @@ def handle_all_films_characters():
         return jsonify({'msg': 'Relationship successfully added'}), 200
 
 # (get) para obtener una relación film/character específica y (delete) para eliminar una relación film/character específica
-@app.route('/films_characters/<int:relationship_id>', methods=['GET', 'PUT', 'DELETE'])
+@api.route('/films_characters/<int:relationship_id>', methods=['GET', 'PUT', 'DELETE'])
 def handle_one_film_character(relationship_id):
-    one_film_character = Films_Characters.query.filter_by(id = relationship_id).first()
+    one_film_character = db.session.get(Films_Characters, relationship_id)
     if one_film_character is None:
         return jsonify({'msg': 'Invalid relationship id'}), 400
     if request.method == 'GET':
@@ -872,11 +1227,11 @@ def handle_one_film_character(relationship_id):
         if body is None: 
             return jsonify({'msg': 'Body cannot be empty'}), 400
         if 'film_id' in body:
-            if not (Films.query.filter_by(id = body['film_id']).first()):
+            if not (catalog_exists(Films, body['film_id'])):
                 return jsonify({'msg': 'Invalid film_id'}), 400
             one_film_character.film_id = body['film_id']
         if 'character_id' in body:
-            if not (Characters.query.filter_by(id = body['character_id']).first()):
+            if not (catalog_exists(Characters, body['character_id'])):
                 return jsonify({'msg': 'Invalid character_id'}), 400
             one_film_character.character_id = body['character_id']
         db.session.commit()
@@ -888,7 +1243,7 @@ def handle_one_film_character(relationship_id):
 
 # ENPOINTS DE FILMS_SPECIES
 # (get) para obtener todas las relaciones entre films y species y (post) para agregar una nueva relación entre films y species -------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
-@app.route('/films_species', methods=['GET', 'POST'])
+@api.route('/films_species', methods=['GET', 'POST'])
 def handle_all_films_species():
     if request.method == 'GET':
         all_films_species = Films_Species.query.all()
@@ -902,9 +1257,9 @@ def handle_all_films_species():
             return jsonify({'msg': 'Specify film_id'}), 400
         if 'species_id' not in body:
             return jsonify({'msg': 'Specify species_id'}), 400
-        if (Films_Species.query.filter_by(film_id = body['film_id'], species_id = body['species_id']).first()):
+        if (find_link(Films_Species, film_id=body['film_id'], species_id=body['species_id'])):
             return jsonify({'msg': 'Relationship already exists'}), 400
-        if not (Films.query.filter_by(id = body['film_id']).first() and Species.query.filter_by(id = body['species_id']).first()):
+        if not (catalog_exists(Films, body['film_id']) and catalog_exists(Species, body['species_id'])):
             return jsonify({'msg': 'Invalid film_id or species_id'}), 400
         new_film_species = Films_Species()
         new_film_species.film_id = body['film_id']
@@ -914,9 +1269,9 @@ def handle_all_films_species():
         return jsonify({'msg': 'Relationship successfully added'}), 200
 
 # (get) para obtener una relación film/species específica y (delete) para eliminar una relación film/species específica
-@app.route('/films_species/<int:relationship_id>', methods=['GET', 'PUT', 'DELETE'])
+@api.route('/films_species/<int:relationship_id>', methods=['GET', 'PUT', 'DELETE'])
 def handle_one_film_species(relationship_id):
-    one_film_species = Films_Species.query.filter_by(id = relationship_id).first()
+    one_film_species = db.session.get(Films_Species, relationship_id)
     if one_film_species is None:
         return jsonify({'msg': 'Invalid relationship id'}), 400
     if request.method == 'GET':
@@ -926,11 +1281,11 @@ def handle_one_film_species(relationship_id):
         if body is None: 
             return jsonify({'msg': 'Body cannot be empty'}), 400
         if 'film_id' in body:
-            if not (Films.query.filter_by(id = body['film_id']).first()):
+            if not (catalog_exists(Films, body['film_id'])):
                 return jsonify({'msg': 'Invalid film_id'}), 400
             one_film_species.film_id = body['film_id']
         if 'species_id' in body:
-            if not (Species.query.filter_by(id = body['species_id']).first()):
+            if not (catalog_exists(Species, body['species_id'])):
                 return jsonify({'msg': 'Invalid species_id'}), 400
             one_film_species.species_id = body['species_id']
         db.session.commit()
@@ -943,5 +1298,5 @@ def handle_one_film_species(relationship_id):
 # this only runs if `$ python src/app.py` is executed
 if __name__ == '__main__':
     PORT = int(os.environ.get('PORT', 3000))
-    app.run(host='0.0.0.0', port=PORT, debug=False)
+    create_app().run(host='0.0.0.0', port=PORT, debug=False)
 
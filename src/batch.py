@@ -0,0 +1,103 @@
+from concurrent.futures import ThreadPoolExecutor
+from flask import request
+from werkzeug.exceptions import HTTPException
+from models import db, User, Starships, Planets, Films, Characters, Species
+from normalized import serialize_by_ids
+from utils import APIException
+
+# detail endpoints that can be answered for many sub-requests with a single IN query: endpoint -> (model, url argument)
+COALESCABLE = {
+    'api.handle_user': (User, 'user_id'),
+    'api.handle_starship': (Starships, 'starships_id'),
+    'api.handle_planet': (Planets, 'planets_id'),
+    'api.handle_film': (Films, 'films_id'),
+    'api.handle_character': (Characters, 'characters_id'),
+    'api.handle_species': (Species, 'species_id'),
+}
+
+def validate(items, limit):
+    if not isinstance(items, list) or len(items) == 0:
+        raise APIException('Specify a list of requests', status_code=400)
+    if len(items) > limit:
+        raise APIException('A maximum of {} requests can be batched'.format(limit), status_code=400)
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get('path'), str) or not item['path'].startswith('/'):
+            raise APIException('Every request needs a path starting with /', status_code=400)
+        if item['path'].split('?')[0].rstrip('/') == '/batch':
+            raise APIException('Batches can not be nested', status_code=400)
+
+def to_result(response):
+    body = response.get_json(silent=True)
+    if body is None:
+        body = response.get_data(as_text=True)
+    return {"status": response.status_code, "body": body}
+
+def dispatch(app, item, parent):
+    # runs the before_request hooks (admission, profiling, ...) and the view like a normal request but
+    # skipping the after_request hooks (compression, ...), inside the current app context so every
+    # sub-request shares the same database session; `batch.parent` is the environ of the /batch request
+    with app.test_request_context(item['path'], method=item.get('method', 'GET').upper(), json=item.get('body'), environ_overrides={'batch.parent': parent}):
+        try:
+            try:
+                response = app.preprocess_request()
+                if response is None:
+                    response = app.dispatch_request()
+                response = app.make_response(response)
+            except Exception as error:
+                # errorhandlers of the app (APIException, 404, 405, ...), re-raises what nobody handles
+                response = app.make_response(app.handle_user_exception(error))
+        except Exception:
+            app.logger.exception('Batched request to %s failed', item['path'])
+            db.session.rollback()
+            return {"status": 500, "body": {'msg': 'Internal server error'}}
+        return to_result(response)
+
+def dispatch_in_new_context(app, item, parent):
+    with app.app_context():
+        return dispatch(app, item, parent)
+
+def coalesce(app, items, results):
+    # GET /<table>/<id> sub-requests are grouped by table and resolved with one query per table
+    adapter = app.url_map.bind('localhost')
+    groups = {}
+    for index, item in enumerate(items):
+        if item.get('method', 'GET').upper() != 'GET' or '?' in item['path']:
+            continue
+        try:
+            endpoint, arguments = adapter.match(item['path'], method='GET')
+        except HTTPException:
+            continue
+        if endpoint in COALESCABLE:
+            model, argument = COALESCABLE[endpoint]
+            groups.setdefault(model, []).append((index, arguments[argument]))
+    for model, entries in groups.items():
+        if len(entries) < 2:
+            continue
+        found = serialize_by_ids(model, [entity_id for _, entity_id in entries])
+        by_id = {entity['id']: entity for entity in found['data']}
+        for index, entity_id in entries:
+            # missing ids go through the handler so they get its usual error response
+            if entity_id in by_id:
+                results[index] = {"status": 200, "body": by_id[entity_id]}
+
+def execute_batch(app, items, parallel=False, limit=50):
+    validate(items, limit)
+    parent = request.environ
+    results = [None] * len(items)
+    reads_only = all(item.get('method', 'GET').upper() == 'GET' for item in items)
+    if not reads_only:
+        # writes are executed in order, a later GET has to see what an earlier POST/PUT did
+        for index, item in enumerate(items):
+            results[index] = dispatch(app, item, parent)
+        return results
+    coalesce(app, items, results)
+    pending = [index for index, result in enumerate(results) if result is None]
+    if parallel and len(pending) > 1:
+        # each thread gets its own app context (and database session), only safe for reads
+        with ThreadPoolExecutor(max_workers=min(len(pending), 8)) as executor:
+            for index, result in zip(pending, executor.map(lambda index: dispatch_in_new_context(app, items[index], parent), pending)):
+                results[index] = result
+    else:
+        for index in pending:
+            results[index] = dispatch(app, items[index], parent)
+    return results
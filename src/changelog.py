@@ -0,0 +1,169 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import event, func, insert, select, delete
+from events import notify, listen, changed_rows, change_type, table_of, expand_types, owner_of, IGNORED_TABLES
+from favorites import favorites_session
+from models import db, Change_Log, Favorites
+from shards import ShardSession
+from normalized import chunks
+
+def record_changes(session, flush_context):
+    # after_flush: the new rows already have their ids and the entries go in the same transaction
+    entries = [{
+        "table_name": change_type(obj),
+        "entity_id": obj.id,
+        "operation": operation,
+        "user_id": owner_of(obj)
+    } for operation, obj in changed_rows(session) if obj.__tablename__ not in IGNORED_TABLES]
+    if not entries:
+        return
+    if isinstance(session, ShardSession):
+        # the change log is in the main database, the entries of a shard are written once the shard committed
+        session.info.setdefault('change_log_entries', []).extend(entries)
+    else:
+        session.execute(insert(Change_Log.__table__), entries)
+
+def record_shard_changes(session):
+    entries = session.info.pop('change_log_entries', None)
+    if entries:
+        with db.engine.begin() as connection:
+            connection.execute(insert(Change_Log.__table__), entries)
+
+def forget_shard_changes(session):
+    session.info.pop('change_log_entries', None)
+
+def load_rows(type_name, ids, session):
+    # plain column values, a client applying the change needs the row not a nested serialization
+    table = db.metadata.tables[table_of(type_name)]
+    rows = {}
+    for chunk in chunks(ids):
+        for row in session.execute(select(table).where(table.c.id.in_(chunk))).mappings():
+            rows[row['id']] = dict(row)
+    return rows
+
+def settled_before():
+    # the clock of the database, the one that filled created_at
+    now = db.session.execute(select(func.now())).scalar()
+    return now.replace(tzinfo=None) - timedelta(seconds=current_app.config['CHANGE_LOG_SAFETY_WINDOW'])
+
+def settled_cursor(entries, since, settled_at):
+    # ids are taken in order but a transaction can commit after one that took a higher id (postgresql, mysql),
+    # the cursor only moves past entries older than the safety window so the next read still finds such an id
+    cursor = since
+    for entry in entries:
+        if entry.created_at <= settled_at:
+            cursor = entry.id
+    return cursor
+
+def read_changes(since, types=None, user_id=None, limit=500):
+    """
+    Changes after the `since` cursor, inserts and updates carry the current row (updates are upserts),
+    deletes only the id. `reset` tells the client that entries it did not see were compacted away.
+    The returned cursor stays behind the entries of the last seconds, which are read again by the next
+    call: a client gets them twice and applies them twice.
+    """
+    settled_at = settled_before()
+    horizon = db.session.execute(select(func.max(Change_Log.entity_id)).where(Change_Log.operation == 'compact')).scalar() or 0
+    statement = select(Change_Log).where(Change_Log.id > since, Change_Log.operation != 'compact').order_by(Change_Log.id).limit(limit + 1)
+    if types:
+        statement = statement.where(Change_Log.table_name.in_(expand_types(types)))
+    if user_id is not None:
+        statement = statement.where(Change_Log.user_id == user_id)
+    entries = db.session.execute(statement).scalars().all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    # the favorites are read from the shard of their user, their ids are only unique within a shard
+    sessions, keys, wanted = {}, {}, {}
+    for entry in entries:
+        if entry.operation != 'delete':
+            session = favorites_session(entry.user_id) if table_of(entry.table_name) == Favorites.__tablename__ else db.session
+            sessions[id(session)] = session
+            keys[entry.id] = (entry.table_name, id(session))
+            wanted.setdefault(keys[entry.id], set()).add(entry.entity_id)
+    rows = {key: load_rows(key[0], ids, sessions[key[1]]) for key, ids in wanted.items()}
+
+    changes = []
+    for entry in entries:
+        change = entry.serialize()
+        if entry.operation != 'delete':
+            change['data'] = rows[keys[entry.id]].get(entry.entity_id)
+        changes.append(change)
+    cursor = settled_cursor(entries, since, settled_at)
+    if has_more and cursor == since:
+        # a full page of recent entries, moving on is better than reading the same page again
+        cursor = entries[-1].id
+    return {
+        "changes": changes,
+        "cursor": cursor,
+        "has_more": has_more,
+        "reset": since < horizon
+    }
+
+def compact_change_log(retention_days):
+    # keeps only the latest entry of every row and nothing older than the retention, a 'compact' entry
+    # remembers up to which cursor entries were expired so the clients behind it know they must resync
+    # through a derived table, mysql does not delete from a table its subquery reads (error 1093)
+    latest = select(func.max(Change_Log.id).label('id')).group_by(Change_Log.table_name, Change_Log.entity_id).subquery()
+    superseded = db.session.execute(delete(Change_Log).where(Change_Log.id.not_in(select(latest.c.id))).execution_options(synchronize_session=False)).rowcount
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    horizon = db.session.execute(select(func.max(Change_Log.id)).where(Change_Log.created_at < cutoff)).scalar()
+    expired = 0
+    if horizon is not None:
+        expired = db.session.execute(delete(Change_Log).where(Change_Log.id <= horizon).execution_options(synchronize_session=False)).rowcount
+        db.session.execute(insert(Change_Log.__table__), [{"table_name": Change_Log.__tablename__, "entity_id": horizon, "operation": 'compact'}])
+    db.session.commit()
+    return superseded, expired
+
+class ChangeFeed:
+    """
+    Follows the change log from every worker, the tables written by the other workers are passed to the
+    commit listeners (cache invalidation) at most once every `poll_interval` seconds.
+    """
+
+    def __init__(self, poll_interval):
+        self.poll_interval = poll_interval
+        self.cursor = None
+        # entries after the cursor already reported, the window behind the cursor is read again
+        self.seen = set()
+        self.polled_at = 0
+        self.lock = threading.Lock()
+
+    def poll(self):
+        if time.monotonic() - self.polled_at < self.poll_interval or not self.lock.acquire(blocking=False):
+            return
+        try:
+            if self.cursor is None:
+                self.cursor = db.session.execute(select(func.max(Change_Log.id))).scalar() or 0
+            else:
+                settled_at = settled_before()
+                statement = select(Change_Log.id, Change_Log.table_name, Change_Log.created_at).where(Change_Log.id > self.cursor).order_by(Change_Log.id)
+                rows = db.session.execute(statement).all()
+                tables = {table_of(row.table_name) for row in rows if row.id not in self.seen}
+                self.cursor = settled_cursor(rows, self.cursor, settled_at)
+                self.seen = {row.id for row in rows if row.id > self.cursor}
+                if tables:
+                    notify(tables)
+            self.polled_at = time.monotonic()
+        finally:
+            self.lock.release()
+
+def init_change_log(app):
+    app.config.setdefault('CHANGE_LOG_POLL_INTERVAL', 1.0)
+    app.config.setdefault('CHANGE_LOG_RETENTION_DAYS', 30)
+    app.config.setdefault('CHANGE_LOG_SAFETY_WINDOW', 10.0)
+    if not event.contains(db.session, 'after_flush', record_changes):
+        listen('after_flush', record_changes)
+        event.listen(ShardSession, 'after_commit', record_shard_changes)
+        event.listen(ShardSession, 'after_rollback', forget_shard_changes)
+    feed = ChangeFeed(app.config['CHANGE_LOG_POLL_INTERVAL'])
+    app.extensions['change_feed'] = feed
+    app.before_request(feed.poll)
+
+    @app.cli.command('compact-changes')
+    def compact_changes():
+        """Drops superseded and expired entries of the change log."""
+        superseded, expired = compact_change_log(current_app.config['CHANGE_LOG_RETENTION_DAYS'])
+        print('Removed {} superseded and {} expired changes'.format(superseded, expired))
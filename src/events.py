@@ -0,0 +1,99 @@
+from sqlalchemy import event
+from models import db, Change_Log, Catalog_Version, Favorites
+from shards import ShardSession
+
+# bookkeeping tables of the change log itself, their writes are not changes of the data
+IGNORED_TABLES = {Change_Log.__tablename__, Catalog_Version.__tablename__}
+
+# callbacks called with the set of table names written by every committed transaction,
+# and with the tables written by other workers when the change log reports them
+commit_listeners = []
+# callbacks called with the rows written by every committed transaction of this worker
+row_listeners = []
+
+def track_writes(session, flush_context, instances):
+    tables = session.info.setdefault('changed_tables', set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        tables.add(obj.__tablename__)
+
+def changed_rows(session):
+    # (operation, object) of every row written by a flush, updates that did not change a column are skipped
+    for operation, objects in (('insert', session.new), ('update', session.dirty), ('delete', session.deleted)):
+        for obj in objects:
+            if operation == 'update' and not session.is_modified(obj):
+                continue
+            yield operation, obj
+
+def change_type(obj):
+    # the favorites keep the type of their old per type table: favorite_films, favorite_species...
+    if obj.__tablename__ == Favorites.__tablename__:
+        return 'favorite_' + obj.entity_type
+    return obj.__tablename__
+
+def table_of(type_name):
+    return Favorites.__tablename__ if type_name.startswith('favorite_') else type_name
+
+def expand_types(types):
+    # "favorites" stands for the favorites of every type
+    expanded = set()
+    for type_name in types:
+        if type_name == Favorites.__tablename__:
+            expanded.update('favorite_' + entity_type for entity_type in Favorites.__mapper__.polymorphic_map)
+        else:
+            expanded.add(type_name)
+    return expanded
+
+def owner_of(obj):
+    # the user a row belongs to, for the favorites and the user itself
+    return obj.id if obj.__tablename__ == 'user' else getattr(obj, 'user_id', None)
+
+def notify(tables):
+    for listener in commit_listeners:
+        listener(tables)
+
+def notify_commit(session):
+    tables = session.info.pop('changed_tables', None)
+    if tables:
+        notify(tables)
+
+def forget_writes(session):
+    session.info.pop('changed_tables', None)
+
+def collect_rows(session, flush_context):
+    # the values are copied at flush time, after the commit the objects are expired (or gone)
+    rows = session.info.setdefault('changed_rows', [])
+    for operation, obj in changed_rows(session):
+        if obj.__tablename__ in IGNORED_TABLES:
+            continue
+        data = {name: getattr(obj, name) for name in obj.__table__.columns.keys()}
+        rows.append({"type": change_type(obj), "id": obj.id, "op": operation, "user_id": owner_of(obj), "data": data})
+
+def notify_rows(session):
+    rows = session.info.pop('changed_rows', None)
+    if rows:
+        for listener in row_listeners:
+            listener(rows)
+
+def forget_rows(session):
+    session.info.pop('changed_rows', None)
+
+def listen(name, listener):
+    # with FAVORITES_SHARDS the favorites are written by the sessions of the shards, not by db.session
+    for target in (db.session, ShardSession):
+        event.listen(target, name, listener)
+
+def on_row_commit(listener):
+    if listener in row_listeners:
+        return
+    if not row_listeners:
+        listen('after_flush', collect_rows)
+        listen('after_commit', notify_rows)
+        listen('after_rollback', forget_rows)
+    row_listeners.append(listener)
+
+def on_commit(listener):
+    if not commit_listeners:
+        listen('before_flush', track_writes)
+        listen('after_commit', notify_commit)
+        listen('after_rollback', forget_writes)
+    commit_listeners.append(listener)
@@ -0,0 +1,142 @@
+import contextlib
+import datetime
+import glob
+import hashlib
+import os
+import threading
+from flask import current_app, send_file
+from sqlalchemy import select, func
+from events import expand_types
+from favorites import favorites_sessions
+from models import db, User, Favorites, Change_Log, Starships, Planets, Films, Characters, Species, Starships_Films, Starships_Characters, Planets_Films, Films_Characters, Films_Species
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+FORMATS = {'parquet': 'application/vnd.apache.parquet', 'arrow': 'application/vnd.apache.arrow.file'}
+
+# the tables the API serves, not the bookkeeping ones (change_log, catalog_version, replica_heartbeat)
+EXPORT_MODELS = (User, Favorites, Starships, Planets, Films, Characters, Species, Starships_Films, Starships_Characters, Planets_Films, Films_Characters, Films_Species)
+
+def export_tables():
+    return {model.__tablename__: model.__table__ for model in EXPORT_MODELS}
+
+def arrow_type(column):
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return pa.string()
+    return {
+        bool: pa.bool_(),
+        int: pa.int64(),
+        float: pa.float64(),
+        str: pa.string(),
+        datetime.datetime: pa.timestamp('us'),
+        datetime.date: pa.date32(),
+    }.get(python_type, pa.string())
+
+def arrow_schema(table):
+    return pa.schema([pa.field(column.name, arrow_type(column), nullable=column.nullable and not column.primary_key) for column in table.columns])
+
+def table_sessions(table):
+    return favorites_sessions() if table is Favorites.__table__ else [db.session]
+
+def record_batches(table, batch_size=10000):
+    """
+    Yields the rows of the table as Arrow record batches of up to `batch_size` rows. The rows are
+    streamed with a server side cursor where the driver has one, so only one batch is in memory.
+    """
+    schema = arrow_schema(table)
+    statement = select(table).order_by(*table.primary_key.columns)
+    for session in table_sessions(table):
+        result = session.connection().execution_options(stream_results=True, yield_per=batch_size).execute(statement)
+        for rows in result.partitions(batch_size):
+            columns = list(zip(*rows))
+            yield pa.RecordBatch.from_arrays([pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema)
+
+def table_version(table, batch_size=10000):
+    """
+    The last change log entry of the table. Without the change log, a hash of every row: an update
+    keeps the row count and the ids, only the content tells it apart.
+    """
+    if current_app.config.get('ENABLE_CHANGE_LOG'):
+        version = db.session.execute(select(func.max(Change_Log.id)).where(Change_Log.table_name.in_(expand_types([table.name])))).scalar()
+        return 'c{}'.format(version or 0)
+    digest = hashlib.blake2b(digest_size=12)
+    statement = select(table).order_by(*table.primary_key.columns)
+    for session in table_sessions(table):
+        result = session.connection().execution_options(stream_results=True, yield_per=batch_size).execute(statement)
+        for rows in result.partitions(batch_size):
+            digest.update(repr([tuple(row) for row in rows]).encode('utf-8'))
+    return 'h' + digest.hexdigest()
+
+def write_export(table, format, path, batch_size=10000):
+    # written next to the final path and renamed, a reader never sees a partial file
+    partial = '{}.{}.partial'.format(path, os.getpid())
+    schema = arrow_schema(table)
+    if format == 'parquet':
+        with pq.ParquetWriter(partial, schema, compression='zstd') as writer:
+            for batch in record_batches(table, batch_size):
+                writer.write_batch(batch)
+    else:
+        with pa.OSFile(partial, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+            for batch in record_batches(table, batch_size):
+                writer.write_batch(batch)
+    os.replace(partial, path)
+
+class Exporter:
+    """
+    Keeps one file per table and format in `directory`, named after the table version. A request for
+    an unchanged table is a sendfile of the existing file, a changed table is exported again first
+    and the files of the older versions are removed.
+    """
+
+    def __init__(self, directory, batch_size=10000):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.tables = export_tables()
+        self.locks = {}
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, table, format, version):
+        return os.path.join(self.directory, '{}-{}.{}'.format(table.name, version, format))
+
+    def build(self, table, format):
+        version = table_version(table, self.batch_size)
+        path = self.path(table, format, version)
+        if os.path.exists(path):
+            return path
+        with self.lock:
+            lock = self.locks.setdefault((table.name, format), threading.Lock())
+        with lock:
+            if not os.path.exists(path):
+                write_export(table, format, path, self.batch_size)
+                for old in glob.glob(os.path.join(self.directory, '{}-*.{}'.format(glob.escape(table.name), format))):
+                    if old != path:
+                        # another worker may have removed it already
+                        with contextlib.suppress(FileNotFoundError):
+                            os.remove(old)
+        return path
+
+    def send(self, table, format):
+        path = self.build(table, format)
+        return send_file(path, mimetype=FORMATS[format], as_attachment=True, download_name='{}.{}'.format(table.name, format), conditional=True, etag=True)
+
+def init_export(app):
+    if pa is None:
+        raise RuntimeError('ENABLE_EXPORT needs pyarrow (pipenv install --categories "packages optional")')
+    app.config.setdefault('EXPORT_DIR', '/tmp/exports')
+    app.config.setdefault('EXPORT_BATCH_SIZE', 10000)
+    exporter = Exporter(app.config['EXPORT_DIR'], app.config['EXPORT_BATCH_SIZE'])
+    app.extensions['export'] = exporter
+
+    @app.cli.command('export')
+    def export():
+        """Writes the Parquet and Arrow export of every table that changed since its last export."""
+        for table in exporter.tables.values():
+            for format in FORMATS:
+                print(exporter.build(table, format))
@@ -0,0 +1,149 @@
+import heapq
+from itertools import islice
+from flask import current_app
+from sqlalchemy import select, insert, delete
+from sqlalchemy.orm import object_session
+from models import db, Favorites, Starships, Planets, Films, Characters, Species
+from normalized import serialize_by_ids, chunks
+from shards import shard_router, init_shards
+
+# entity_type -> (key in /user/<id>/favorites, key of the entity in every favorite, model of the entity)
+FAVORITE_TYPES = {
+    'starships': ('favorite_starships', 'starship_data', Starships),
+    'planets': ('favorite_planets', 'planet_data', Planets),
+    'films': ('favorite_films', 'film_data', Films),
+    'characters': ('favorite_characters', 'character_data', Characters),
+    'species': ('favorite_species', 'species_data', Species),
+}
+
+def serialize_favorites(rows):
+    """
+    Same output as calling serialize() on every favorite, but the entities of each type are loaded
+    with one IN query (or from the catalog snapshot) instead of one lazy load per favorite.
+    """
+    rows = list(rows)
+    wanted = {}
+    for row in rows:
+        wanted.setdefault(row.entity_type, {})[row.entity_id] = None
+    found = {}
+    for entity_type, entity_ids in wanted.items():
+        model = FAVORITE_TYPES[entity_type][2]
+        found[entity_type] = {entity['id']: entity for entity in serialize_by_ids(model, list(entity_ids))['data']}
+    return [{"favorite_id": row.id, FAVORITE_TYPES[row.entity_type][1]: found[row.entity_type].get(row.entity_id)} for row in rows]
+
+def favorites_session(user_id):
+    # the session of the database that stores the favorites of the user
+    router = shard_router()
+    return db.session if router is None else router.session(router.shard_of(user_id))
+
+def favorites_sessions():
+    router = shard_router()
+    return [db.session] if router is None else router.sessions()
+
+def user_favorites(user_id):
+    # one range of ix_favorites_user_entity, the index has every column the statement needs
+    statement = select(Favorites.id, Favorites.entity_type, Favorites.entity_id).where(Favorites.user_id == user_id).order_by(Favorites.entity_type, Favorites.entity_id)
+    rows = favorites_session(user_id).execute(statement).all()
+    favorites = {key: [] for key, _, _ in FAVORITE_TYPES.values()}
+    for row, favorite in zip(rows, serialize_favorites(rows)):
+        favorites[FAVORITE_TYPES[row.entity_type][0]].append(favorite)
+    return favorites
+
+def list_favorites(model, entity_id=None, limit=None, offset=0):
+    """
+    Favorites of one type from every shard (scatter-gather). Every shard returns its rows ordered by
+    (entity, user), which is unique across shards, and the sorted results are merged before paginating.
+    """
+    sessions = favorites_sessions()
+    statement = select(model).order_by(model.entity_id, model.user_id)
+    if entity_id is not None:
+        statement = statement.where(model.entity_id == entity_id)
+    if len(sessions) == 1:
+        if limit is not None:
+            statement = statement.limit(limit)
+        return sessions[0].execute(statement.offset(offset)).scalars().all()
+    if limit is not None:
+        statement = statement.limit(offset + limit)
+    results = [session.execute(statement).scalars().all() for session in sessions]
+    rows = heapq.merge(*results, key=lambda row: (row.entity_id, row.user_id))
+    return list(islice(rows, offset, None if limit is None else offset + limit))
+
+def save_favorite(session, favorite, delete=False):
+    """
+    Commits the add (or delete) of one favorite of a user handler. With group commit on, the write goes
+    into the next batch instead: True once it is committed, False if it was only queued.
+    """
+    writer = current_app.extensions.get('group_commit')
+    if writer is None:
+        if delete:
+            session.delete(favorite)
+        else:
+            session.add(favorite)
+        session.commit()
+        return True
+    return writer.submit('remove' if delete else 'add', favorite.user_id, favorite.entity_type, favorite.entity_id)
+
+def delete_favorites(rows):
+    sessions = []
+    for row in rows:
+        session = object_session(row)
+        session.delete(row)
+        if session not in sessions:
+            sessions.append(session)
+    for session in sessions:
+        session.commit()
+
+def favorite_pairs(model, user_ids):
+    # (user_id, entity_id) of the favorites of the users, one statement per shard and chunk of users
+    router = shard_router()
+    by_shard = {}
+    for user_id in user_ids:
+        index = router.shard_of(user_id) if router is not None else None
+        by_shard.setdefault(index, []).append(user_id)
+    pairs = []
+    for index, ids in by_shard.items():
+        session = router.session(index) if router is not None else db.session
+        for chunk in chunks(ids):
+            pairs.extend(session.execute(select(model.user_id, model.entity_id).where(model.user_id.in_(chunk)).order_by(model.id)).all())
+    return pairs
+
+def move_favorites(router, connection, index):
+    # rows of this database that belong to another shard, the ones already copied by an interrupted run are skipped
+    source = Favorites.__table__
+    table = router.metadata.tables[source.name]
+    targets = {}
+    for row in connection.execute(select(source)).mappings():
+        target = router.shard_of(row['user_id'])
+        if target != index:
+            targets.setdefault(target, []).append(dict(row))
+    moved = 0
+    for target, rows in targets.items():
+        with router.engines[target].begin() as target_connection:
+            existing = set()
+            for chunk in chunks({row['user_id'] for row in rows}):
+                existing.update(target_connection.execute(select(table.c.user_id, table.c.entity_type, table.c.entity_id).where(table.c.user_id.in_(chunk))).all())
+            new_rows = [{key: value for key, value in row.items() if key != 'id'} for row in rows if (row['user_id'], row['entity_type'], row['entity_id']) not in existing]
+            if new_rows:
+                target_connection.execute(insert(table), new_rows)
+        for chunk in chunks([row['id'] for row in rows]):
+            connection.execute(delete(source).where(source.c.id.in_(chunk)))
+        moved += len(rows)
+    return moved
+
+def rebalance_favorites(router):
+    """Moves every favorite that is not in the shard of its user (main database included) to that shard."""
+    router.create_all()
+    moved = move_favorites(router, db.session.connection(), None)
+    db.session.commit()
+    for index, engine in enumerate(router.engines):
+        with engine.begin() as connection:
+            moved += move_favorites(router, connection, index)
+    return moved
+
+def init_favorite_shards(app):
+    init_shards(app, [Favorites.__table__])
+
+    @app.cli.command('shard-favorites')
+    def shard_favorites():
+        """Creates the favorites table in every shard and moves each favorite to the shard of its user."""
+        print('Moved {} favorites'.format(rebalance_favorites(app.extensions['shard_router'])))
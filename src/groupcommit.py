@@ -0,0 +1,159 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from sqlalchemy import select
+from favorites import favorites_session
+from models import Favorites
+from utils import APIException
+
+class Write:
+    __slots__ = ('operation', 'user_id', 'entity_type', 'entity_id', 'done', 'error')
+
+    def __init__(self, operation, user_id, entity_type, entity_id):
+        self.operation = operation
+        self.user_id = user_id
+        self.entity_type = entity_type
+        self.entity_id = entity_id
+        self.done = threading.Event()
+        self.error = None
+
+class GroupCommit:
+    """
+    Queues the favorite adds and removes of the worker and writes them in batches, one transaction
+    (one fsync) per batch and database. A batch closes after `max_wait` seconds or `max_size` writes.
+    With ack='commit' the request waits until its batch is committed, for at most `timeout` seconds.
+    With ack='queue' it returns as soon as the write is queued, and a crash loses the writes of the
+    last batch.
+    """
+
+    def __init__(self, app, max_size=100, max_wait=0.005, ack='commit', timeout=10.0):
+        self.app = app
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self.ack = ack
+        self.timeout = timeout
+        self.queue = queue.Queue()
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        # one writer thread per worker, started after the fork
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+        threading.Thread(target=self.run, daemon=True).start()
+        atexit.register(self.drain)
+
+    def submit(self, operation, user_id, entity_type, entity_id):
+        """Queues one write, returns True once it is committed or False if it was only queued."""
+        self.start()
+        write = Write(operation, user_id, entity_type, entity_id)
+        self.queue.put(write)
+        if self.ack == 'queue':
+            return False
+        if not write.done.wait(self.timeout):
+            # the write stays queued and may still be committed
+            raise APIException('Favorite write timed out, try again later', status_code=503)
+        if write.error is not None:
+            raise write.error
+        return True
+
+    def next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            try:
+                self.write(batch)
+            except Exception as error:
+                # the writer thread must survive, the requests of the batch get the error
+                self.app.logger.exception('Group commit of %s favorite writes failed', len(batch))
+                for write in batch:
+                    if not write.done.is_set():
+                        write.error = error
+                        write.done.set()
+
+    def drain(self):
+        # at exit, the writes still queued in async mode
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self.write(batch)
+
+    def write(self, batch):
+        with self.app.app_context():
+            by_session = {}
+            for write in batch:
+                session = favorites_session(write.user_id)
+                by_session.setdefault(id(session), (session, []))[1].append(write)
+            for session, writes in by_session.values():
+                self.commit(session, writes)
+        for write in batch:
+            if write.error is not None and self.ack == 'queue':
+                self.app.logger.error('Queued favorite %s of user %s failed: %s', write.operation, write.user_id, write.error)
+            write.done.set()
+
+    def commit(self, session, writes):
+        try:
+            apply_writes(session, writes)
+            session.commit()
+        except Exception as error:
+            session.rollback()
+            if len(writes) == 1:
+                writes[0].error = error
+                return
+            # one bad write (a user deleted meanwhile...) must not fail the others, they are retried one by one
+            for write in writes:
+                self.commit(session, [write])
+
+def apply_writes(session, writes):
+    """
+    Adds and deletes the favorites of the batch in order. Adding a favorite that exists and removing one
+    that does not are no-ops, so two clicks in the same batch behave as two separate requests.
+    """
+    # a superset of the rows of the batch from the unique index, not every favorite of the users
+    statement = select(Favorites).where(
+        Favorites.user_id.in_({write.user_id for write in writes}),
+        Favorites.entity_type.in_({write.entity_type for write in writes}),
+        Favorites.entity_id.in_({write.entity_id for write in writes}),
+    )
+    existing = {(row.user_id, row.entity_type, row.entity_id): row for row in session.execute(statement).scalars()}
+    for write in writes:
+        key = (write.user_id, write.entity_type, write.entity_id)
+        if write.operation == 'add' and key not in existing:
+            model = Favorites.__mapper__.polymorphic_map[write.entity_type].class_
+            existing[key] = model(user_id=write.user_id, entity_id=write.entity_id)
+            session.add(existing[key])
+        elif write.operation == 'remove' and key in existing:
+            row = existing.pop(key)
+            if row in session.new:
+                session.expunge(row)
+            else:
+                session.delete(row)
+
+def init_group_commit(app):
+    app.config.setdefault('GROUP_COMMIT_MAX_SIZE', 100)
+    app.config.setdefault('GROUP_COMMIT_MAX_WAIT', 0.005)
+    app.config.setdefault('GROUP_COMMIT_ACK', 'commit')
+    app.config.setdefault('GROUP_COMMIT_TIMEOUT', 10.0)
+    if app.config['GROUP_COMMIT_ACK'] not in ('commit', 'queue'):
+        raise RuntimeError('GROUP_COMMIT_ACK must be commit or queue')
+    app.extensions['group_commit'] = GroupCommit(app, app.config['GROUP_COMMIT_MAX_SIZE'], app.config['GROUP_COMMIT_MAX_WAIT'], app.config['GROUP_COMMIT_ACK'], app.config['GROUP_COMMIT_TIMEOUT'])
@@ -0,0 +1,14 @@
+from sqlalchemy import lambda_stmt, select
+from models import db
+
+def find_favorite(session, model, user_id, entity_id):
+    # the favorite of one user and entity: one range of the unique index, the statement is cached per favorite type
+    statement = lambda_stmt(lambda: select(model).where(model.user_id == user_id, model.entity_id == entity_id).limit(1))
+    return session.execute(statement).scalars().first()
+
+def find_link(model, **values):
+    # find_link(Starships_Films, starship_id=1, film_id=2), the first matching row of a link table
+    (left, left_id), (right, right_id) = values.items()
+    left_column, right_column = getattr(model, left), getattr(model, right)
+    statement = lambda_stmt(lambda: select(model).where(left_column == left_id, right_column == right_id).limit(1))
+    return db.session.execute(statement).scalars().first()
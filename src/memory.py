@@ -0,0 +1,253 @@
+import gc
+import hmac
+import json
+import os
+import random
+import resource
+import signal
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from flask import current_app, g, request
+from sqlalchemy import event
+from models import db
+from metrics import register_metrics
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+def current_rss():
+    """Resident set size of this process in bytes, the peak RSS where /proc is not available."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def malloc_trim():
+    # glibc keeps the pages freed by a big request in its arenas, this gives them back to the system
+    try:
+        import ctypes
+        return ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        return 0
+
+def count_loaded(target, context):
+    # in g, the objects loaded by the /batch sub-requests count for the outer request
+    g.memory_loaded = g.get('memory_loaded', 0) + 1
+
+def identity_map_size():
+    # the objects the request still holds, the identity map only keeps weak references to clean objects,
+    # without creating a session for requests that used none
+    size = len(db.session.identity_map) if db.session.registry.has() else 0
+    return size + sum(len(session.identity_map) for session in g.get('shard_sessions', {}).values())
+
+class RouteMemory:
+    __slots__ = ('requests', 'rss_growth_max', 'loaded_max', 'identity_map_max', 'identity_map_last', 'traced', 'traced_peak_max', 'traced_peak_total')
+
+    def __init__(self):
+        self.requests = 0
+        self.rss_growth_max = 0
+        self.loaded_max = 0
+        self.identity_map_max = 0
+        self.identity_map_last = 0
+        self.traced = 0
+        self.traced_peak_max = 0
+        self.traced_peak_total = 0
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+class MemoryMonitor:
+    """
+    Memory accounting of the worker, per route rule: RSS growth, ORM objects loaded and identity map size
+    left by every request, and for a `trace_rate` fraction of them, the peak of Python allocations
+    (tracemalloc) and the sites of the allocations still alive once the request is over. A request
+    that grows the RSS by more than `request_budget` bytes, or leaves it over `max_rss`, is logged
+    and the worker is recycled.
+    """
+
+    def __init__(self, app, trace_rate, trace_frames, top_sites, request_budget, max_rss, directory, flush_interval):
+        self.app = app
+        self.trace_rate = trace_rate
+        self.trace_frames = trace_frames
+        self.top_sites = top_sites
+        self.request_budget = request_budget
+        self.max_rss = max_rss
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.routes = {}
+        self.sites = Counter()
+        self.recycling = False
+        self.flushed_at = 0
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        # tracemalloc traces the whole process, one traced request at a time keeps the peaks apart
+        self.tracing = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def before(self):
+        if self.pid != os.getpid():
+            # a forked worker starts with its own counters
+            self.pid = os.getpid()
+            self.routes, self.sites = {}, Counter()
+        # in the environ of the request, the teardown of a /batch sub-request must not take the state of the outer one
+        request.environ['memory.rss'] = current_rss()
+        # the serial /batch sub-requests go on with the count of the batch
+        request.environ['memory.loaded'] = g.get('memory_loaded', 0)
+        if self.trace_rate and random.random() < self.trace_rate and not tracemalloc.is_tracing() and self.tracing.acquire(blocking=False):
+            request.environ['memory.traced'] = True
+            tracemalloc.start(self.trace_frames)
+
+    def teardown(self, exception=None):
+        if 'memory.rss' not in request.environ:
+            return
+        rule = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        objects = identity_map_size()
+        peak, retained = None, None
+        if request.environ.pop('memory.traced', False):
+            try:
+                peak, retained = self.trace_end()
+            finally:
+                self.tracing.release()
+        rss = current_rss()
+        growth = rss - request.environ.pop('memory.rss')
+        with self.lock:
+            route = self.routes.setdefault(rule, RouteMemory())
+            route.requests += 1
+            route.rss_growth_max = max(route.rss_growth_max, growth)
+            route.loaded_max = max(route.loaded_max, g.get('memory_loaded', 0) - request.environ.pop('memory.loaded'))
+            route.identity_map_max = max(route.identity_map_max, objects)
+            route.identity_map_last = objects
+            if peak is not None:
+                route.traced += 1
+                route.traced_peak_max = max(route.traced_peak_max, peak)
+                route.traced_peak_total += peak
+                self.sites.update(retained)
+        self.guard(rule, rss, growth)
+        if time.monotonic() - self.flushed_at > self.flush_interval:
+            self.flush()
+
+    def trace_end(self):
+        peak = tracemalloc.get_traced_memory()[1]
+        # what the request leaves behind, the identity map only keeps the objects something else still references
+        gc.collect()
+        snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        tracemalloc.stop()
+        key = 'traceback' if self.trace_frames > 1 else 'lineno'
+        retained = Counter()
+        for statistic in snapshot.statistics(key)[:self.top_sites]:
+            frames = ' < '.join('{}:{}'.format(frame.filename, frame.lineno) for frame in statistic.traceback)
+            retained[frames] += statistic.size
+        return peak, retained
+
+    def guard(self, rule, rss, growth):
+        over_budget = self.request_budget and growth > self.request_budget
+        over_max = self.max_rss and rss > self.max_rss
+        if not (over_budget or over_max) or self.recycling:
+            return
+        if over_max and not over_budget:
+            # freed memory that glibc kept is not a reason to recycle
+            gc.collect()
+            malloc_trim()
+            rss = current_rss()
+            if rss <= self.max_rss:
+                return
+        self.app.logger.warning('%s %s grew the RSS of worker %s by %.1f MB to %.1f MB, recycling it',
+                                request.method, rule, os.getpid(), growth / 2**20, rss / 2**20)
+        self.recycle()
+
+    def recycle(self):
+        # gunicorn stops a worker gracefully on SIGTERM: it finishes its requests and the master forks a new one
+        if not request.environ.get('SERVER_SOFTWARE', '').startswith('gunicorn'):
+            return
+        self.recycling = True
+        self.flush()
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    def worker(self):
+        with self.lock:
+            return {
+                'pid': os.getpid(),
+                'rss': current_rss(),
+                'peak_rss': peak_rss(),
+                'recycling': self.recycling,
+                'routes': {rule: route.as_dict() for rule, route in self.routes.items()},
+                'top_sites': [{'site': site, 'size': size} for site, size in self.sites.most_common(self.top_sites)],
+            }
+
+    def flush(self):
+        self.flushed_at = time.monotonic()
+        # write and rename so a reader never sees half a file
+        path = os.path.join(self.directory, '{}.json'.format(os.getpid()))
+        with open(path + '.tmp', 'w') as worker_file:
+            json.dump(self.worker(), worker_file)
+        os.replace(path + '.tmp', path)
+
+    def workers(self):
+        """The last report of every live worker of the machine, this one up to date."""
+        self.flush()
+        workers = []
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                os.kill(int(name[:-len('.json')]), 0)
+            except ProcessLookupError:
+                # a worker that was recycled
+                os.remove(path)
+                continue
+            except (ValueError, PermissionError):
+                continue
+            try:
+                with open(path) as worker_file:
+                    workers.append(json.load(worker_file))
+            except (OSError, ValueError):
+                continue
+        return workers
+
+    def authorized(self):
+        return hmac.compare_digest(request.headers.get('X-Profile-Token', ''), current_app.config['PROFILING_TOKEN'])
+
+    def collect(self):
+        with self.lock:
+            routes = sorted(self.routes.items())
+            return [
+                ('process_resident_memory_bytes', 'gauge', 'Resident set size of the worker.', [({}, current_rss())]),
+                ('memory_rss_growth_max_bytes', 'gauge', 'Largest RSS growth of one request.', [({'route': rule}, route.rss_growth_max) for rule, route in routes]),
+                ('memory_loaded_max_objects', 'gauge', 'Most ORM objects loaded by one request.', [({'route': rule}, route.loaded_max) for rule, route in routes]),
+                ('memory_identity_map_max_objects', 'gauge', 'Largest identity map left by one request.', [({'route': rule}, route.identity_map_max) for rule, route in routes]),
+                ('memory_traced_peak_max_bytes', 'gauge', 'Largest tracemalloc peak of one traced request.', [({'route': rule}, route.traced_peak_max) for rule, route in routes if route.traced]),
+            ]
+
+def init_memory(app):
+    app.config.setdefault('MEMORY_TRACE_RATE', 0.01)
+    app.config.setdefault('MEMORY_TRACE_FRAMES', 1)
+    app.config.setdefault('MEMORY_TOP_SITES', 20)
+    app.config.setdefault('MEMORY_REQUEST_BUDGET_MB', 0)
+    app.config.setdefault('MEMORY_MAX_RSS_MB', 0)
+    app.config.setdefault('MEMORY_DIR', '/tmp/memory')
+    app.config.setdefault('MEMORY_FLUSH_INTERVAL', 10.0)
+    if not app.config.get('PROFILING_TOKEN'):
+        raise RuntimeError('ENABLE_MEMORY_DIAGNOSTICS needs a PROFILING_TOKEN')
+    monitor = MemoryMonitor(
+        app,
+        app.config['MEMORY_TRACE_RATE'],
+        app.config['MEMORY_TRACE_FRAMES'],
+        app.config['MEMORY_TOP_SITES'],
+        int(app.config['MEMORY_REQUEST_BUDGET_MB'] * 2**20),
+        int(app.config['MEMORY_MAX_RSS_MB'] * 2**20),
+        app.config['MEMORY_DIR'],
+        app.config['MEMORY_FLUSH_INTERVAL'],
+    )
+    app.extensions['memory'] = monitor
+    if not event.contains(db.Model, 'load', count_loaded):
+        event.listen(db.Model, 'load', count_loaded, propagate=True)
+    app.before_request(monitor.before)
+    app.teardown_request(monitor.teardown)
+    register_metrics(app, monitor.collect)
@@ -0,0 +1,28 @@
+from flask import current_app
+
+# Prometheus text format without the client library: every collector returns
+# [(name, type, help, [(labels, value)])] and GET /metrics renders them for the worker that answers
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"')) for key, value in sorted(labels.items()))
+    return '{' + ','.join(pairs) + '}'
+
+def render(collectors):
+    lines = []
+    for collect in collectors:
+        for name, kind, description, samples in collect():
+            lines.append('# HELP {} {}'.format(name, description))
+            lines.append('# TYPE {} {}'.format(name, kind))
+            for labels, value in samples:
+                lines.append('{}{} {}'.format(name, format_labels(labels), value))
+    return '\n'.join(lines) + '\n'
+
+def register_metrics(app, collect):
+    collectors = app.extensions.setdefault('metrics', [])
+    if not collectors:
+        @app.route('/metrics', methods=['GET'])
+        def metrics():
+            return current_app.response_class(render(current_app.extensions['metrics']), mimetype='text/plain; version=0.0.4')
+    collectors.append(collect)
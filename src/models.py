@@ -1,7 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import relationship
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     __tablename__ = 'user'
@@ -21,6 +22,34 @@ class User(db.Model):
             "email": self.email,
         }
 
+# FAVORITES --------------------------------------------------------------------------------------------------------------------------------------------------------
+
+class Favorites(db.Model):
+    # one table for the favorites of every type, a user's favorites are one range of the unique index.
+    # Favorite_Starships, Favorite_Planets... below keep the columns and queries of the old per type tables
+    __tablename__ = 'favorites'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_data = db.relationship(User)
+    entity_type = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    __table_args__ = (
+        db.Index('ix_favorites_user_entity', 'user_id', 'entity_type', 'entity_id', unique=True, postgresql_include=['id']),
+        db.Index('ix_favorites_entity', 'entity_type', 'entity_id'),
+    )
+    __mapper_args__ = {'polymorphic_on': entity_type}
+
+    def __repr__(self):
+        return 'The favorite {} ID is {}'.format(self.entity_type, self.id)
+
+    def serialize(self):
+        return {
+            "favorite_id": self.id,
+            "user_id": self.user_id,
+            "entity_type": self.entity_type,
+            "entity_id": self.entity_id
+        }
+
 # STARSHIPS --------------------------------------------------------------------------------------------------------------------------------------------------------
 class Starships(db.Model):
     __tablename__ = 'starships'
@@ -75,13 +104,10 @@ class Starships_Characters(db.Model):
         }
 
 
-class Favorite_Starships(db.Model):
-    __tablename__ = 'favorite_starships'
-    id = db.Column(db.Integer, primary_key=True)
-    starship_id = db.Column(db.Integer, db.ForeignKey('starships.id'))
-    starship_data = db.relationship('Starships')
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    user_data = db.relationship(User)
+class Favorite_Starships(Favorites):
+    __mapper_args__ = {'polymorphic_identity': 'starships'}
+    starship_id = db.synonym('entity_id')
+    starship_data = db.relationship('Starships', primaryjoin='foreign(Favorite_Starships.entity_id) == Starships.id', viewonly=True)
 
     def __repr__(self):
         return 'The favorite starship ID is {}'.format(self.id)
@@ -89,7 +115,7 @@ class Favorite_Starships(db.Model):
     def serialize(self):
         return {
             "favorite_id": self.id,
-            "starship_data": self.starship_relationship.serialize()
+            "starship_data": self.starship_data.serialize()
         }
 
 # PLANETS --------------------------------------------------------------------------------------------------------------------------------------------------------
@@ -132,13 +158,10 @@ class Planets_Films(db.Model):
             "film_data": self.film_data.serialize()
         }
 
-class Favorite_Planets(db.Model):
-    __tablename__ = 'favorite_planets'
-    id = db.Column(db.Integer, primary_key=True)
-    planet_id = db.Column(db.Integer, db.ForeignKey('planets.id'))
-    planet_data = db.relationship('Planets')
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    user_data = db.relationship(User)
+class Favorite_Planets(Favorites):
+    __mapper_args__ = {'polymorphic_identity': 'planets'}
+    planet_id = db.synonym('entity_id')
+    planet_data = db.relationship('Planets', primaryjoin='foreign(Favorite_Planets.entity_id) == Planets.id', viewonly=True)
 
     def __repr__(self):
         return 'The ID of the favorite planet is {}'.format(self.id)
@@ -146,7 +169,7 @@ class Favorite_Planets(db.Model):
     def serialize(self):
         return {
             "favorite_id": self.id,
-            "planet_data": self.planet_relationship.serialize()
+            "planet_data": self.planet_data.serialize()
         }
 
 # FILMS --------------------------------------------------------------------------------------------------------------------------------------------------------
@@ -207,13 +230,10 @@ class Films_Species(db.Model):
         }
 
 
-class Favorite_Films(db.Model):
-    __tablename__ = 'favorite_films'
-    id = db.Column(db.Integer, primary_key=True)
-    film_id = db.Column(db.Integer, db.ForeignKey('films.id'))
-    film_data = db.relationship('Films')
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    user_data = db.relationship(User)
+class Favorite_Films(Favorites):
+    __mapper_args__ = {'polymorphic_identity': 'films'}
+    film_id = db.synonym('entity_id')
+    film_data = db.relationship('Films', primaryjoin='foreign(Favorite_Films.entity_id) == Films.id', viewonly=True)
 
     def __repr__(self):
         return 'The favorite planet ID is {}'.format(self.id)
@@ -221,7 +241,7 @@ class Favorite_Films(db.Model):
     def serialize(self):
         return {
             "favorite_id": self.id,
-            "film_data": self.film_relationship.serialize()
+            "film_data": self.film_data.serialize()
         }
 
 # CHARACTERS --------------------------------------------------------------------------------------------------------------------------------------------------------
@@ -246,13 +266,18 @@ class Characters(db.Model):
             "species_data": self.species_data.serialize_without_planet()
         }
 
-class Favorite_Characters(db.Model):
-    __tablename__ = 'favorite_characters'
-    id = db.Column(db.Integer, primary_key=True)
-    character_id = db.Column(db.Integer, db.ForeignKey('characters.id'))
-    character_data = db.relationship('Characters')
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    User_data = db.relationship(User)
+    def serialize_with_ids(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "planet_id": self.planet_id,
+            "species_id": self.species_id
+        }
+
+class Favorite_Characters(Favorites):
+    __mapper_args__ = {'polymorphic_identity': 'characters'}
+    character_id = db.synonym('entity_id')
+    character_data = db.relationship('Characters', primaryjoin='foreign(Favorite_Characters.entity_id) == Characters.id', viewonly=True)
 
     def __repr__(self):
         return 'The ID of the favorite film is {}'.format(self.id)
@@ -260,7 +285,7 @@ class Favorite_Characters(db.Model):
     def serialize(self):
         return {
             "favorite_id": self.id,
-            "character_data": self.character_id_relationship.serialize()
+            "character_data": self.character_data.serialize()
         }
 
 # SPECIES ---------------------------------------------------------------------------------------------------------------------------------------------------------------
@@ -290,14 +315,18 @@ class Species(db.Model):
             "name": self.name,
             "classification": self.classification,
         }
+    def serialize_with_ids(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "classification": self.classification,
+            "planet_id": self.planet_id
+        }
 
-class Favorite_Species(db.Model):
-    __tablename__ = 'favorite_species'
-    id = db.Column(db.Integer, primary_key=True)
-    species_id = db.Column(db.Integer, db.ForeignKey('species.id'))
-    species_data = db.relationship('Species')
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    user_data = relationship(User)
+class Favorite_Species(Favorites):
+    __mapper_args__ = {'polymorphic_identity': 'species'}
+    species_id = db.synonym('entity_id')
+    species_data = db.relationship('Species', primaryjoin='foreign(Favorite_Species.entity_id) == Species.id', viewonly=True)
 
     def __repr__(self):
         return 'The ID of the favorite species is {}'.format(self.id)
@@ -305,30 +334,53 @@ class Favorite_Species(db.Model):
     def serialize(self):
         return {
             "favorite_id": self.id,
-            "species_data": self.species_id_relationship.serialize()
+            "species_data": self.species_data.serialize()
         }
 
+# CATALOG VERSION ---------------------------------------------------------------------------------------------------------------------------------------------------------
+# single row bumped in the same transaction as any write to the catalog tables, the in-memory snapshots compare against it
 
+class Catalog_Version(db.Model):
+    __tablename__ = 'catalog_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
 
+    def __repr__(self):
+        return 'Catalog version {}'.format(self.version)
 
+# CHANGE LOG ---------------------------------------------------------------------------------------------------------------------------------------------------------
+# ordered outbox with one entry per written row, the id is the cursor the clients use to sync
 
+class Change_Log(db.Model):
+    __tablename__ = 'change_log'
+    # the ids are the cursors of the clients, sqlite must not reuse them after a compaction
+    __table_args__ = {'sqlite_autoincrement': True}
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(50), nullable=False, index=True)
+    entity_id = db.Column(db.Integer, nullable=False)
+    operation = db.Column(db.String(10), nullable=False)
+    user_id = db.Column(db.Integer, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, server_default=db.func.now())
 
+    def __repr__(self):
+        return 'Change {} {} {} {}'.format(self.id, self.operation, self.table_name, self.entity_id)
 
+    def serialize(self):
+        return {
+            "cursor": self.id,
+            "type": self.table_name,
+            "id": self.entity_id,
+            "op": self.operation,
+            "user_id": self.user_id
+        }
 
+# REPLICA HEARTBEAT ---------------------------------------------------------------------------------------------------------------------------------------------------
+# single row written on the primary every few seconds, how old it is on a replica is its replication lag
 
+class Replica_Heartbeat(db.Model):
+    __tablename__ = 'replica_heartbeat'
+    id = db.Column(db.Integer, primary_key=True)
+    beat_at = db.Column(db.Float, nullable=False)
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+    def __repr__(self):
+        return 'Heartbeat {}'.format(self.beat_at)
@@ -0,0 +1,106 @@
+from sqlalchemy.orm import joinedload
+from snapshot import get_catalog
+from models import db, Starships, Planets, Films, Characters, Species, Starships_Films, Starships_Characters, Planets_Films, Films_Characters, Films_Species
+
+# many to many relations of every catalog table: (key in the response, link table, own column, related column, related model)
+LINKS = {
+    Films: [
+        ('related_starships', Starships_Films, 'film_id', 'starship_id', Starships),
+        ('related_planets', Planets_Films, 'film_id', 'planet_id', Planets),
+        ('related_characters', Films_Characters, 'film_id', 'character_id', Characters),
+        ('related_species', Films_Species, 'film_id', 'species_id', Species),
+    ],
+    Starships: [
+        ('related_films', Starships_Films, 'starship_id', 'film_id', Films),
+        ('related_characters', Starships_Characters, 'starship_id', 'character_id', Characters),
+    ],
+    Planets: [
+        ('related_films', Planets_Films, 'planet_id', 'film_id', Films),
+    ],
+    Characters: [
+        ('related_starships', Starships_Characters, 'character_id', 'starship_id', Starships),
+        ('related_films', Films_Characters, 'character_id', 'film_id', Films),
+    ],
+    Species: [
+        ('related_films', Films_Species, 'species_id', 'film_id', Films),
+    ],
+}
+
+# foreign keys stored in the row itself: (column, related model)
+FOREIGN_KEYS = {
+    Characters: [('planet_id', Planets), ('species_id', Species)],
+    Species: [('planet_id', Planets)],
+}
+
+# relations that serialize() reads, loaded in the same query instead of one lazy load per row
+SERIALIZE_OPTIONS = {
+    Characters: [joinedload(Characters.planet_data), joinedload(Characters.species_data)],
+    Species: [joinedload(Species.planet_data)],
+}
+
+# name of the Catalog serializer of every catalog table
+CATALOG_SERIALIZERS = {Films: 'serialize_film', Starships: 'serialize_starship', Planets: 'serialize_planet', Characters: 'serialize_character', Species: 'serialize_species'}
+
+CHUNK_SIZE = 500
+
+def chunks(ids, size=CHUNK_SIZE):
+    ids = list(ids)
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+def serialize_flat(entity):
+    # related entities are referenced by id, never embedded
+    if hasattr(entity, 'serialize_with_ids'):
+        return entity.serialize_with_ids()
+    return entity.serialize()
+
+def load_entities(model, ids):
+    entities = {}
+    for chunk in chunks(ids):
+        for entity in model.query.filter(model.id.in_(chunk)):
+            entities[entity.id] = serialize_flat(entity)
+    return entities
+
+def serialize_normalized(model, rows):
+    """
+    Serializes rows of a catalog table as {"data": [...], "included": {...}}, every related entity
+    appears once in "included" no matter how many rows point to it.
+    """
+    ids = [row.id for row in rows]
+    data = [serialize_flat(row) for row in rows]
+    wanted = {}
+
+    for column, related in FOREIGN_KEYS.get(model, []):
+        wanted.setdefault(related, set()).update(item[column] for item in data if item[column] is not None)
+
+    for key, link, own_column, related_column, related in LINKS.get(model, []):
+        own, other = getattr(link, own_column), getattr(link, related_column)
+        related_ids = {row_id: [] for row_id in ids}
+        for chunk in chunks(ids):
+            for row_id, related_id in db.session.query(own, other).filter(own.in_(chunk)):
+                related_ids[row_id].append(related_id)
+        for item in data:
+            item[key] = related_ids[item['id']]
+            wanted.setdefault(related, set()).update(item[key])
+
+    included = {related.__tablename__: load_entities(related, related_ids) for related, related_ids in wanted.items()}
+    return {"data": data, "included": included}
+
+def serialize_by_ids(model, ids):
+    """
+    Serializes the rows with the given ids in the order they were requested, resolved with one
+    (chunked) IN query, ids that do not exist are listed in "missing".
+    """
+    catalog = get_catalog() if model in CATALOG_SERIALIZERS else None
+    if catalog is not None:
+        serialize = getattr(catalog, CATALOG_SERIALIZERS[model])
+        found = {entity_id: serialize(entity_id) for entity_id in ids}
+    else:
+        found = {}
+        for chunk in chunks(ids):
+            for entity in model.query.options(*SERIALIZE_OPTIONS.get(model, [])).filter(model.id.in_(chunk)):
+                found[entity.id] = entity.serialize()
+    return {
+        "data": [found[entity_id] for entity_id in ids if found.get(entity_id) is not None],
+        "missing": [entity_id for entity_id in ids if found.get(entity_id) is None]
+    }
@@ -0,0 +1,214 @@
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from flask import current_app, request, send_file
+from sqlalchemy import select
+from compression import brotli, zstandard
+from events import on_commit
+from models import db, Starships, Planets, Films, Characters, Species
+from snapshot import CATALOG_TABLES, read_version, track_catalog_version
+
+CATALOG_ROUTES = {'starships': Starships, 'planets': Planets, 'films': Films, 'characters': Characters, 'species': Species}
+PRERENDERED_PATH = re.compile(r'^/(?:starships|planets|films|characters|species)(?:/[1-9][0-9]*)?$')
+# best compression ratio first, like compression.available_encodings
+EXTENSIONS = {'br': '.br', 'zstd': '.zst', 'gzip': '.gz'}
+
+def encode(data):
+    # the highest levels are affordable here, every file is compressed once per catalog version
+    encoded = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        encoded['br'] = brotli.compress(data, quality=11)
+    if zstandard is not None:
+        encoded['zstd'] = zstandard.ZstdCompressor(level=19).compress(data)
+    return encoded
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as output:
+        output.write(data)
+
+class Prerenderer:
+    """
+    Writes the JSON of every catalog list and detail route, plus its compressed versions, into one
+    directory per catalog version. GETs of those routes are then answered with the file (sendfile, or
+    X-Accel-Redirect to a front proxy) and a strong ETag before any view, query or jsonify runs.
+    A route is only served from disk when the directory of the current catalog version is complete,
+    otherwise the request goes to the view and the new version is rendered in the background.
+    """
+
+    def __init__(self, app, directory, check_interval=1.0, accel_prefix='', keep_versions=2):
+        self.app = app
+        self.directory = directory
+        self.check_interval = check_interval
+        self.accel_prefix = accel_prefix
+        self.keep_versions = keep_versions
+        self.version = None
+        self.checked_at = 0
+        self.manifests = {}
+        self.rendering = False
+        self.lock = threading.Lock()
+
+    def mark_stale(self):
+        self.checked_at = 0
+
+    def current_version(self):
+        if time.monotonic() - self.checked_at >= self.check_interval:
+            self.version = read_version()
+            self.checked_at = time.monotonic()
+        return self.version
+
+    def version_directory(self, version):
+        return os.path.join(self.directory, 'v{}'.format(version))
+
+    def manifest(self, version):
+        manifest = self.manifests.get(version)
+        if manifest is None:
+            try:
+                with open(os.path.join(self.version_directory(version), 'manifest.json')) as manifest_file:
+                    manifest = json.load(manifest_file)
+            except OSError:
+                return None
+            self.manifests = {version: manifest}
+        return manifest
+
+    def routes(self):
+        paths = ['/{}'.format(name) for name in CATALOG_ROUTES]
+        for name, model in CATALOG_ROUTES.items():
+            paths.extend('/{}/{}'.format(name, entity_id) for entity_id in db.session.execute(select(model.id).order_by(model.id)).scalars())
+        return paths
+
+    def render(self):
+        """Renders the current catalog version, unless it is already on disk or another worker is rendering."""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, 'render.lock'), 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+            version = read_version()
+            target = self.version_directory(version)
+            if os.path.isdir(target):
+                return version
+            # the views must not answer from caches that are older than the version read above
+            snapshot = self.app.extensions.get('catalog_snapshot')
+            if snapshot is not None:
+                snapshot.mark_stale()
+            flight = self.app.extensions.get('single_flight')
+            if flight is not None:
+                flight.invalidate()
+            partial = '{}.partial'.format(target)
+            shutil.rmtree(partial, ignore_errors=True)
+            previous = self.latest_version()
+            previous_manifest = self.manifest(previous) if previous is not None else None
+            manifest = {}
+            client = self.app.test_client()
+            for path in self.routes():
+                response = client.get(path, environ_base={'prerender.skip': True})
+                if response.status_code != 200:
+                    continue
+                data = response.get_data()
+                relative = path.strip('/') + '.json'
+                entry = {'etag': hashlib.sha256(data).hexdigest()[:32]}
+                unchanged = previous_manifest.get(path) if previous_manifest is not None else None
+                if unchanged is not None and unchanged['etag'] == entry['etag']:
+                    # most routes do not change between versions, their files are hard linked instead of compressed again
+                    entry['encodings'] = unchanged['encodings']
+                    os.makedirs(os.path.dirname(os.path.join(partial, relative)), exist_ok=True)
+                    for extension in ['', *(EXTENSIONS[encoding] for encoding in unchanged['encodings'])]:
+                        os.link(os.path.join(self.version_directory(previous), relative + extension), os.path.join(partial, relative + extension))
+                else:
+                    write_file(os.path.join(partial, relative), data)
+                    encoded = encode(data)
+                    for encoding, body in encoded.items():
+                        write_file(os.path.join(partial, relative + EXTENSIONS[encoding]), body)
+                    entry['encodings'] = sorted(encoded)
+                manifest[path] = entry
+            write_file(os.path.join(partial, 'manifest.json'), json.dumps(manifest).encode('utf-8'))
+            os.rename(partial, target)
+            self.remove_old_versions()
+            return version
+
+    def versions(self):
+        return sorted(int(name[1:]) for name in os.listdir(self.directory) if re.fullmatch(r'v[0-9]+', name))
+
+    def latest_version(self):
+        versions = self.versions()
+        return versions[-1] if versions else None
+
+    def remove_old_versions(self):
+        # the previous version stays for the requests that are still sending it
+        for version in self.versions()[:-self.keep_versions]:
+            shutil.rmtree(self.version_directory(version), ignore_errors=True)
+
+    def render_in_background(self):
+        with self.lock:
+            if self.rendering:
+                return
+            self.rendering = True
+
+        def run():
+            try:
+                with self.app.app_context():
+                    self.render()
+            except Exception:
+                self.app.logger.exception('Rendering the catalog failed')
+            finally:
+                self.rendering = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def serve(self):
+        # the /batch sub-requests answer with the JSON body, not a file
+        if request.method not in ('GET', 'HEAD') or request.query_string or request.environ.get('prerender.skip') or 'batch.parent' in request.environ:
+            return None
+        if not PRERENDERED_PATH.match(request.path):
+            return None
+        version = self.current_version()
+        manifest = self.manifest(version)
+        if manifest is None:
+            self.render_in_background()
+            return None
+        entry = manifest.get(request.path)
+        if entry is None:
+            return None
+        # the first of the best quality, in the order of EXTENSIONS
+        encodings = [encoding for encoding in EXTENSIONS if encoding in entry['encodings'] and request.accept_encodings[encoding]]
+        encoding = max(encodings, key=lambda encoding: request.accept_encodings[encoding], default=None)
+        # every encoding is a different representation, so it gets its own strong ETag
+        etag = entry['etag'] if encoding is None else '{}-{}'.format(entry['etag'], encoding)
+        relative = request.path.strip('/') + '.json' + EXTENSIONS.get(encoding, '')
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        elif self.accel_prefix:
+            response = current_app.response_class(mimetype='application/json')
+            response.headers['X-Accel-Redirect'] = '{}v{}/{}'.format(self.accel_prefix, version, relative)
+        else:
+            response = send_file(os.path.join(self.version_directory(version), relative), mimetype='application/json', conditional=False, etag=False)
+        response.set_etag(etag)
+        response.vary.add('Accept-Encoding')
+        if encoding is not None and response.status_code == 200:
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+def init_prerender(app):
+    app.config.setdefault('PRERENDER_DIR', '/tmp/prerender')
+    app.config.setdefault('PRERENDER_CHECK_INTERVAL', 1.0)
+    app.config.setdefault('PRERENDER_ACCEL_PREFIX', '')
+    prerenderer = Prerenderer(app, app.config['PRERENDER_DIR'], app.config['PRERENDER_CHECK_INTERVAL'], app.config['PRERENDER_ACCEL_PREFIX'])
+    app.extensions['prerender'] = prerenderer
+    track_catalog_version()
+    # the worker that wrote stops serving the old files right away, the others within the check interval
+    on_commit(lambda tables: prerenderer.mark_stale() if tables & CATALOG_TABLES else None)
+    app.before_request(prerenderer.serve)
+
+    @app.cli.command('prerender')
+    def prerender():
+        """Writes the JSON files of the current catalog version."""
+        version = prerenderer.render()
+        print('Another worker is rendering' if version is None else 'Catalog version {} is in {}'.format(version, prerenderer.version_directory(version)))
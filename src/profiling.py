@@ -0,0 +1,292 @@
+import cProfile
+import hmac
+import json
+import marshal
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from flask import current_app, request, jsonify
+
+FORMATS = ('speedscope', 'collapsed', 'pstats')
+TRUNCATED = ('[truncated]',)
+
+frame_names = {}
+
+def frame_name(code):
+    # "Films.serialize (src/models.py:120)", cached per code object because it runs for every sampled frame
+    name = frame_names.get(code)
+    if name is None:
+        path = code.co_filename.split(os.sep)
+        # co_qualname is new in python 3.11
+        qualname = getattr(code, 'co_qualname', code.co_name)
+        name = frame_names[code] = '{} ({}:{})'.format(qualname, '/'.join(path[-2:]), code.co_firstlineno)
+    return name
+
+def frame_stack(frame, limit=128):
+    stack = []
+    while frame is not None and len(stack) < limit:
+        stack.append(frame_name(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+def collapsed(profiles):
+    """Brendan Gregg's folded stacks, one "root;...;leaf microseconds" line per stack, for flamegraph.pl or speedscope."""
+    lines = []
+    for name, stacks in profiles.items():
+        for stack, seconds in stacks.items():
+            lines.append('{} {}'.format(';'.join((name,) + stack), round(seconds * 1e6)))
+    return '\n'.join(lines) + '\n'
+
+def speedscope(profiles, name):
+    """The speedscope file format, one sampled profile per route, https://www.speedscope.app"""
+    frames, indexes, documents = [], {}, []
+    for profile_name, stacks in profiles.items():
+        samples, weights = [], []
+        for stack, seconds in stacks.items():
+            sample = []
+            for frame in stack:
+                if frame not in indexes:
+                    indexes[frame] = len(frames)
+                    frames.append({'name': frame})
+                sample.append(indexes[frame])
+            samples.append(sample)
+            weights.append(seconds)
+        documents.append({'type': 'sampled', 'name': profile_name, 'unit': 'seconds', 'startValue': 0, 'endValue': sum(weights), 'samples': samples, 'weights': weights})
+    return {'$schema': 'https://www.speedscope.app/file-format-schema.json', 'name': name, 'exporter': 'starwars-api', 'shared': {'frames': frames}, 'profiles': documents}
+
+class Sampler:
+    """Samples the stack of one thread every `interval` seconds, each stack weighted by the time since the previous sample."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        last = time.perf_counter()
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is not None:
+                self.stacks[frame_stack(frame)] += now - last
+            last = now
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        return self.stacks
+
+class RouteSampler:
+    """
+    Low-rate sampling of every thread that is serving a request, aggregated per route rule. Each worker
+    writes its totals to `directory` every `flush_interval` seconds, and `merged()` adds up the files
+    of all the workers of the machine.
+    """
+
+    def __init__(self, interval, directory, flush_interval=10.0, max_stacks=5000):
+        self.interval = interval
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.max_stacks = max_stacks
+        self.routes = {}
+        self.stacks = {}
+        self.started_at = time.time()
+        self.pid = None
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+        # one sampling thread per worker, started after the fork
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.stacks = {}
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def enter(self, route):
+        # returns the route the thread was in, a /batch sub-request runs inside the thread of the batch
+        self.start()
+        previous = self.routes.get(threading.get_ident())
+        self.routes[threading.get_ident()] = route
+        return previous
+
+    def leave(self, previous=None):
+        if previous is None:
+            self.routes.pop(threading.get_ident(), None)
+        else:
+            self.routes[threading.get_ident()] = previous
+
+    def sample(self, elapsed):
+        with self.lock:
+            for thread_id, route in list(self.routes.items()):
+                stack = frame_stack(sys._current_frames().get(thread_id))
+                if not stack:
+                    continue
+                stacks = self.stacks.setdefault(route, Counter())
+                if stack not in stacks and len(stacks) >= self.max_stacks:
+                    stack = TRUNCATED
+                stacks[stack] += elapsed
+
+    def run(self):
+        last = flushed = time.perf_counter()
+        while True:
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            self.sample(now - last)
+            last = now
+            if now - flushed >= self.flush_interval:
+                self.flush()
+                flushed = now
+
+    def reset_at(self):
+        try:
+            return os.path.getmtime(os.path.join(self.directory, 'reset'))
+        except FileNotFoundError:
+            return 0
+
+    def flush(self):
+        with self.lock:
+            if self.reset_at() > self.started_at:
+                self.stacks = {}
+                self.started_at = time.time()
+                return
+            routes = {route: {';'.join(stack): seconds for stack, seconds in stacks.items()} for route, stacks in self.stacks.items()}
+        # write and rename so a reader never sees half a file
+        path = os.path.join(self.directory, '{}.json'.format(os.getpid()))
+        with open(path + '.tmp', 'w') as samples_file:
+            json.dump({'started_at': self.started_at, 'routes': routes}, samples_file)
+        os.replace(path + '.tmp', path)
+
+    def merged(self, route=None):
+        self.flush()
+        reset_at = self.reset_at()
+        profiles = {}
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as samples_file:
+                    stored = json.load(samples_file)
+            except (OSError, ValueError):
+                continue
+            if stored['started_at'] < reset_at:
+                continue
+            for rule, stacks in stored['routes'].items():
+                if route is None or rule == route:
+                    profile = profiles.setdefault(rule, Counter())
+                    for stack, seconds in stacks.items():
+                        profile[tuple(stack.split(';'))] += seconds
+        return profiles
+
+    def reset(self):
+        with open(os.path.join(self.directory, 'reset'), 'w'):
+            pass
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+        with self.lock:
+            self.stacks = {}
+            self.started_at = time.time()
+
+class Profiler:
+    """
+    Requests with a valid X-Profile-Token and an X-Profile header run under a profiler and answer
+    with the profile instead of their body: a sampled speedscope or folded stacks file, or the
+    deterministic cProfile stats (pstats).
+    """
+
+    def __init__(self, token, interval, sampler=None):
+        self.token = token
+        self.interval = interval
+        self.sampler = sampler
+
+    def authorized(self):
+        return hmac.compare_digest(request.headers.get('X-Profile-Token', ''), self.token)
+
+    # the state lives in the environ of the request, the /batch sub-requests share the g of the outer one
+    def before(self):
+        if self.sampler is not None and request.url_rule is not None:
+            request.environ['profiling.outer_route'] = self.sampler.enter(request.url_rule.rule)
+            request.environ['profiling.sampled'] = True
+        profile_format = request.headers.get('X-Profile')
+        if profile_format is None:
+            return None
+        if not self.authorized():
+            return jsonify({'msg': 'Invalid profile token'}), 403
+        if profile_format not in FORMATS:
+            return jsonify({'msg': 'X-Profile must be one of {}'.format(', '.join(FORMATS))}), 400
+        request.environ['profiling.format'] = profile_format
+        request.environ['profiling.started_at'] = time.perf_counter()
+        if profile_format == 'pstats':
+            profile = cProfile.Profile()
+            profile.enable()
+        else:
+            profile = Sampler(threading.get_ident(), self.interval).start()
+        request.environ['profiling.profile'] = profile
+        return None
+
+    def after(self, response):
+        if 'profiling.profile' not in request.environ:
+            return response
+        profile, profile_format = request.environ.pop('profiling.profile'), request.environ.pop('profiling.format')
+        elapsed = time.perf_counter() - request.environ.pop('profiling.started_at')
+        name = '{} {}'.format(request.method, request.full_path.rstrip('?'))
+        if profile_format == 'pstats':
+            profile.disable()
+            profile.create_stats()
+            profiled = self.send(marshal.dumps(profile.stats), 'application/octet-stream', 'profile.pstats')
+        else:
+            stacks = profile.stop()
+            if profile_format == 'speedscope':
+                profiled = self.send(json.dumps(speedscope({name: stacks}, name)), 'application/json', 'profile.speedscope.json')
+            else:
+                profiled = self.send(collapsed({request.url_rule.rule: stacks}), 'text/plain', 'profile.folded')
+        profiled.headers['X-Profiled-Status'] = str(response.status_code)
+        profiled.headers['X-Profiled-Duration'] = '{:.6f}'.format(elapsed)
+        return profiled
+
+    def teardown(self, exception=None):
+        if request.environ.pop('profiling.sampled', False):
+            self.sampler.leave(request.environ.pop('profiling.outer_route'))
+        # a view that raised skips after_request, do not leave the profiler running
+        profile = request.environ.pop('profiling.profile', None)
+        if isinstance(profile, Sampler):
+            profile.stop()
+        elif profile is not None:
+            profile.disable()
+
+    def send(self, body, mimetype, filename):
+        response = current_app.response_class(body, mimetype=mimetype)
+        response.headers['Content-Disposition'] = 'attachment; filename={}'.format(filename)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+def init_profiling(app):
+    app.config.setdefault('PROFILING_TOKEN', '')
+    app.config.setdefault('PROFILING_INTERVAL', 0.001)
+    app.config.setdefault('PROFILING_SAMPLE_INTERVAL', 0.05)
+    app.config.setdefault('PROFILING_FLUSH_INTERVAL', 10.0)
+    app.config.setdefault('PROFILING_DIR', '/tmp/profiles')
+    if not app.config['PROFILING_TOKEN']:
+        raise RuntimeError('ENABLE_PROFILING needs a PROFILING_TOKEN')
+    sampler = None
+    if app.config['PROFILING_SAMPLE_INTERVAL'] > 0:
+        sampler = RouteSampler(app.config['PROFILING_SAMPLE_INTERVAL'], app.config['PROFILING_DIR'], app.config['PROFILING_FLUSH_INTERVAL'])
+    profiler = Profiler(app.config['PROFILING_TOKEN'], app.config['PROFILING_INTERVAL'], sampler)
+    app.extensions['profiler'] = profiler
+    app.before_request(profiler.before)
+    app.after_request(profiler.after)
+    app.teardown_request(profiler.teardown)
@@ -0,0 +1,246 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from flask import Response, current_app, has_app_context
+from events import on_row_commit, expand_types
+from models import db, Change_Log
+
+def format_event(name, data, event_id=None):
+    lines = 'id: {}\n'.format(event_id) if event_id is not None else ''
+    return '{}event: {}\ndata: {}\n\n'.format(lines, name, json.dumps(data, default=str, separators=(',', ':')))
+
+class Subscription:
+    """
+    Bounded buffer of one client. A client that does not keep up is not allowed to grow it: it is marked
+    as overflowed and told to reload, the other subscribers are never slowed down by it.
+    """
+
+    __slots__ = ('types', 'user_id', 'size', 'events', 'overflowed', 'condition')
+
+    def __init__(self, types, user_id, size):
+        self.types = expand_types(types)
+        self.user_id = user_id
+        self.size = size
+        self.events = deque()
+        self.overflowed = False
+        self.condition = threading.Condition()
+
+    def matches(self, change):
+        # rows without an owner (the catalog) reach everybody, favorites only their user
+        if self.types and change['type'] not in self.types:
+            return False
+        return self.user_id is None or change.get('user_id') in (None, self.user_id)
+
+    def put(self, changes):
+        # (change, event id) pairs
+        with self.condition:
+            if self.overflowed:
+                return
+            if len(self.events) + len(changes) > self.size:
+                self.overflowed = True
+                self.events.clear()
+            else:
+                self.events.extend(changes)
+            self.condition.notify()
+
+    def get(self, timeout):
+        with self.condition:
+            if not self.events and not self.overflowed:
+                self.condition.wait(timeout)
+            changes = list(self.events)
+            self.events.clear()
+            return changes
+
+class Broker:
+    """Fan-out of the changes of this process to its subscribers."""
+
+    def __init__(self, buffer_size=100, max_subscribers=50):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self.subscribers = set()
+        self.lock = threading.Lock()
+
+    def subscribe(self, types, user_id):
+        with self.lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                return None
+            subscription = Subscription(types, user_id, self.buffer_size)
+            self.subscribers.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def deliver(self, changes, event_id=None):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            wanted = [(change, event_id) for change in changes if subscription.matches(change)]
+            if wanted:
+                subscription.put(wanted)
+
+class LocalBackend:
+    """
+    Delivers the committed changes to the subscribers of the same process. A cross-node backend (redis
+    pub/sub, postgres LISTEN/NOTIFY) implements the same methods: `publish` sends the changes of a
+    commit to every node and each node passes what it receives to `broker.deliver`.
+    """
+
+    collects = True
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def start(self):
+        pass
+
+    def publish(self, changes):
+        self.broker.deliver(changes)
+
+class ChangeLogBackend:
+    """
+    Every worker follows the change log (ENABLE_CHANGE_LOG) and delivers what any worker or node committed,
+    one query per worker every `interval` seconds no matter how many clients are connected. The events
+    carry the settled cursor of the change log so a client resumes with Last-Event-ID without missing
+    anything. The entries of the safety window are read again by the next poll and only delivered once.
+    """
+
+    collects = False
+
+    def __init__(self, app, broker, interval):
+        self.app = app
+        self.broker = broker
+        self.interval = interval
+        self.cursor = None
+        self.seen = set()
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        # started by the first subscriber of every worker, threads of the master do not survive the fork
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def publish(self, changes):
+        pass
+
+    def poll(self):
+        from changelog import read_changes
+        with self.app.app_context():
+            if self.cursor is None:
+                self.cursor = db.session.query(db.func.max(Change_Log.id)).scalar() or 0
+                return
+            result = read_changes(self.cursor, limit=500)
+            changes = [change for change in result['changes'] if change['cursor'] not in self.seen]
+            self.cursor = result['cursor']
+            self.seen = {change['cursor'] for change in result['changes'] if change['cursor'] > self.cursor}
+            if changes:
+                self.broker.deliver(changes, self.cursor)
+
+    def run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception:
+                self.app.logger.exception('Polling the change log for the push channel failed')
+            time.sleep(self.interval)
+
+class PushChannel:
+    def __init__(self, broker, backend, heartbeat=15.0, max_age=300.0):
+        self.broker = broker
+        self.backend = backend
+        self.heartbeat = heartbeat
+        self.max_age = max_age
+
+    def replay(self, since, subscription):
+        # changes the client missed while it was reconnecting, only the change log remembers them
+        from changelog import read_changes
+        result = read_changes(since, list(subscription.types), limit=subscription.size)
+        if result['has_more'] or result['reset']:
+            return None
+        return [(change, result['cursor']) for change in result['changes'] if subscription.matches(change)]
+
+    def open(self, types, user_id, last_event_id=None):
+        """Response streaming the changes as server-sent events, None when this worker is full."""
+        subscription = self.broker.subscribe(types, user_id)
+        if subscription is None:
+            return None
+        self.backend.start()
+        missed = []
+        if last_event_id is not None and isinstance(self.backend, ChangeLogBackend):
+            missed = self.replay(last_event_id, subscription)
+        response = Response(self.stream(subscription, missed), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        # nginx and other proxies must not buffer the stream
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
+    def stream(self, subscription, missed):
+        # runs after the view returned, without app context nor database session
+        try:
+            yield 'retry: 2000\n\n'
+            if missed is None:
+                yield format_event('reset', {})
+                return
+            # the replay and the live changes can overlap, a change log entry is sent once
+            sent = set()
+            for change, event_id in missed:
+                sent.add(change['cursor'])
+                yield format_event('change', change, event_id)
+            closes_at = time.monotonic() + self.max_age
+            while time.monotonic() < closes_at:
+                changes = subscription.get(self.heartbeat)
+                if subscription.overflowed:
+                    yield format_event('reset', {})
+                    return
+                if not changes:
+                    yield ': ping\n\n'
+                    continue
+                for change, event_id in changes:
+                    cursor = change.get('cursor')
+                    if cursor is not None:
+                        if cursor in sent:
+                            continue
+                        sent.add(cursor)
+                    yield format_event('change', change, event_id)
+        finally:
+            self.broker.unsubscribe(subscription)
+
+def publish_changes(changes):
+    if has_app_context():
+        channel = current_app.extensions.get('push')
+        if channel is not None:
+            channel.backend.publish(changes)
+
+def default_max_subscribers():
+    # every stream holds a thread of a sync or gthread worker, one is left for the other requests
+    if os.getenv('GUNICORN_WORKER_CLASS', 'gthread') in ('gevent', 'eventlet'):
+        return 50
+    return int(os.getenv('GUNICORN_THREADS', 4)) - 1
+
+def init_push(app):
+    app.config.setdefault('PUSH_BACKEND', 'local')
+    app.config.setdefault('PUSH_BUFFER_SIZE', 100)
+    if app.config.get('PUSH_MAX_SUBSCRIBERS') is None:
+        app.config['PUSH_MAX_SUBSCRIBERS'] = default_max_subscribers()
+    if app.config['PUSH_MAX_SUBSCRIBERS'] < 1:
+        raise RuntimeError('ENABLE_PUSH needs GUNICORN_THREADS > 1, an async worker class or an explicit PUSH_MAX_SUBSCRIBERS')
+    app.config.setdefault('PUSH_HEARTBEAT', 15.0)
+    app.config.setdefault('PUSH_MAX_AGE', 300.0)
+    app.config.setdefault('PUSH_POLL_INTERVAL', 0.5)
+    broker = Broker(app.config['PUSH_BUFFER_SIZE'], app.config['PUSH_MAX_SUBSCRIBERS'])
+    if app.config['PUSH_BACKEND'] == 'changelog':
+        if not app.config.get('ENABLE_CHANGE_LOG'):
+            raise RuntimeError('PUSH_BACKEND=changelog needs ENABLE_CHANGE_LOG')
+        backend = ChangeLogBackend(app, broker, app.config['PUSH_POLL_INTERVAL'])
+    else:
+        backend = LocalBackend(broker)
+    app.extensions['push'] = PushChannel(broker, backend, app.config['PUSH_HEARTBEAT'], app.config['PUSH_MAX_AGE'])
+    if backend.collects:
+        on_row_commit(publish_changes)
@@ -0,0 +1,230 @@
+from sqlalchemy import select
+from models import db, Favorites, User, Starships, Planets, Films, Characters, Species, Favorite_Starships, Favorite_Planets, Favorite_Films, Favorite_Characters, Favorite_Species, Starships_Films, Starships_Characters, Planets_Films, Films_Characters, Films_Species
+from normalized import chunks
+from favorites import favorite_pairs
+from shards import shard_router
+from utils import APIException
+
+ENTITIES = {
+    'user': User,
+    'films': Films,
+    'starships': Starships,
+    'planets': Planets,
+    'characters': Characters,
+    'species': Species,
+}
+
+# ('link', link table, own column, other column, entity): many to many through a link table
+# ('fk', column in the parent, entity): the parent points to one entity
+# ('reverse', entity, column in the entity): the entities that point to the parent
+RELATIONS = {
+    'user': {
+        'favorite_films': ('link', Favorite_Films, 'user_id', 'film_id', 'films'),
+        'favorite_starships': ('link', Favorite_Starships, 'user_id', 'starship_id', 'starships'),
+        'favorite_planets': ('link', Favorite_Planets, 'user_id', 'planet_id', 'planets'),
+        'favorite_characters': ('link', Favorite_Characters, 'user_id', 'character_id', 'characters'),
+        'favorite_species': ('link', Favorite_Species, 'user_id', 'species_id', 'species'),
+    },
+    'films': {
+        'starships': ('link', Starships_Films, 'film_id', 'starship_id', 'starships'),
+        'planets': ('link', Planets_Films, 'film_id', 'planet_id', 'planets'),
+        'characters': ('link', Films_Characters, 'film_id', 'character_id', 'characters'),
+        'species': ('link', Films_Species, 'film_id', 'species_id', 'species'),
+    },
+    'starships': {
+        'films': ('link', Starships_Films, 'starship_id', 'film_id', 'films'),
+        'characters': ('link', Starships_Characters, 'starship_id', 'character_id', 'characters'),
+    },
+    'planets': {
+        'films': ('link', Planets_Films, 'planet_id', 'film_id', 'films'),
+        'characters': ('reverse', 'characters', 'planet_id'),
+        'species': ('reverse', 'species', 'planet_id'),
+    },
+    'characters': {
+        'planet': ('fk', 'planet_id', 'planets'),
+        'species': ('fk', 'species_id', 'species'),
+        'films': ('link', Films_Characters, 'character_id', 'film_id', 'films'),
+        'starships': ('link', Starships_Characters, 'character_id', 'starship_id', 'starships'),
+    },
+    'species': {
+        'planet': ('fk', 'planet_id', 'planets'),
+        'films': ('link', Films_Species, 'species_id', 'film_id', 'films'),
+        'characters': ('reverse', 'characters', 'species_id'),
+    },
+}
+
+ARGUMENTS = ('fields', 'ids', 'limit', 'offset')
+
+def columns(entity):
+    return ENTITIES[entity].__table__.columns.keys()
+
+def is_int(value):
+    # bool is an int for python, not for the clients
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def target_of(relation):
+    return relation[-1] if relation[0] != 'reverse' else relation[1]
+
+class QueryExecutor:
+    """
+    Resolves a nested selection level by level: every relation of the query is loaded for all the
+    parents of its level at once (DataLoader style), so the number of SQL statements depends on the
+    shape of the query and never on the number of rows.
+    """
+
+    def __init__(self, max_depth=4, max_selections=20, max_rows=10000, max_limit=1000):
+        self.max_depth = max_depth
+        self.max_selections = max_selections
+        self.max_rows = max_rows
+        self.max_limit = max_limit
+        self.statements = 0
+        self.rows = 0
+
+    def check(self, entity, selection, depth=1):
+        # static validation and cost of the query before touching the database
+        if not isinstance(selection, dict):
+            raise APIException('The selection of {} must be an object'.format(entity), status_code=400)
+        if depth > self.max_depth:
+            raise APIException('Queries can not be deeper than {} levels'.format(self.max_depth), status_code=400)
+        nested = [name for name in ('ids', 'limit', 'offset') if name in selection]
+        if depth > 1 and nested:
+            # a nested relation is loaded for all the parents of its level at once, it can not be paginated
+            raise APIException('{} can only be used at the top level, not in {}'.format(', '.join(nested), entity), status_code=400)
+        fields = selection.get('fields', [])
+        if not isinstance(fields, list) or not all(isinstance(field, str) for field in fields):
+            raise APIException('fields of {} must be a list of names'.format(entity), status_code=400)
+        if 'ids' in selection and not (isinstance(selection['ids'], list) and all(is_int(entity_id) for entity_id in selection['ids'])):
+            raise APIException('ids of {} must be a list of integers'.format(entity), status_code=400)
+        if 'limit' in selection and not is_int(selection['limit']):
+            raise APIException('limit of {} must be an integer'.format(entity), status_code=400)
+        if 'offset' in selection and not (is_int(selection['offset']) and selection['offset'] >= 0):
+            raise APIException('offset of {} must be an integer of at least 0'.format(entity), status_code=400)
+        unknown = [field for field in fields if field not in columns(entity)]
+        if unknown:
+            raise APIException('Unknown fields for {}: {}'.format(entity, ', '.join(unknown)), status_code=400)
+        selections = 1
+        for name, sub in selection.items():
+            if name in ARGUMENTS:
+                continue
+            if name not in RELATIONS.get(entity, {}):
+                raise APIException('{} has no relation {}'.format(entity, name), status_code=400)
+            selections += self.check(target_of(RELATIONS[entity][name]), sub, depth + 1)
+        if selections > self.max_selections:
+            raise APIException('Queries can not select more than {} relations'.format(self.max_selections), status_code=400)
+        return selections
+
+    def fetch(self, statement, limit=None):
+        # one row more than the budget is enough to know the query goes over it
+        budget = self.max_rows - self.rows + 1
+        statement = statement.limit(budget if limit is None else min(limit, budget))
+        self.statements += 1
+        result = db.session.execute(statement).mappings().all()
+        self.rows += len(result)
+        if self.rows > self.max_rows:
+            raise APIException('Query too expensive, it would load more than {} rows'.format(self.max_rows), status_code=400)
+        return [dict(row) for row in result]
+
+    def needed_columns(self, entity, selection):
+        # requested fields plus the keys needed to resolve the nested relations
+        model = ENTITIES[entity]
+        names = {'id', *selection.get('fields', columns(entity))}
+        for name in selection:
+            relation = RELATIONS.get(entity, {}).get(name)
+            if relation is not None and relation[0] == 'fk':
+                names.add(relation[1])
+        return [getattr(model, name) for name in columns(entity) if name in names]
+
+    def run(self, entity, selection):
+        self.check(entity, selection)
+        model = ENTITIES[entity]
+        statement = select(*self.needed_columns(entity, selection)).order_by(model.id)
+        if 'ids' in selection:
+            statement = statement.where(model.id.in_(selection['ids']))
+        limit = max(1, min(selection.get('limit', 100), self.max_limit))
+        statement = statement.offset(selection.get('offset', 0))
+        rows = self.fetch(statement, limit)
+        self.resolve(entity, selection, rows)
+        return [self.project(entity, selection, row) for row in rows]
+
+    def resolve(self, entity, selection, rows):
+        parent_ids = list({row['id'] for row in rows})
+        for name, sub in selection.items():
+            if name in ARGUMENTS:
+                continue
+            relation = RELATIONS[entity][name]
+            target = target_of(relation)
+            model = ENTITIES[target]
+            target_columns = self.needed_columns(target, sub)
+            children = []
+            if relation[0] == 'link' and issubclass(relation[1], Favorites) and shard_router() is not None:
+                # the favorites live in the shards, the entities in the main database: no join possible
+                _, link, _, _, _ = relation
+                pairs = favorite_pairs(link, parent_ids)
+                self.statements += len(shard_router())
+                targets = {}
+                for chunk in chunks({entity_id for _, entity_id in pairs}):
+                    for child in self.fetch(select(*target_columns).where(model.id.in_(chunk))):
+                        targets[child['id']] = child
+                by_parent = {}
+                for parent_id, entity_id in pairs:
+                    if entity_id in targets:
+                        child = dict(targets[entity_id])
+                        by_parent.setdefault(parent_id, []).append(child)
+                        children.append(child)
+                for row in rows:
+                    row[name] = by_parent.get(row['id'], [])
+            elif relation[0] == 'link':
+                _, link, own, other, _ = relation
+                own_column = getattr(link, own).label('_parent_id')
+                by_parent = {}
+                for chunk in chunks(parent_ids):
+                    statement = select(own_column, *target_columns).join(model, model.id == getattr(link, other)).where(getattr(link, own).in_(chunk)).order_by(link.id)
+                    for child in self.fetch(statement):
+                        by_parent.setdefault(child.pop('_parent_id'), []).append(child)
+                        children.append(child)
+                for row in rows:
+                    row[name] = by_parent.get(row['id'], [])
+            elif relation[0] == 'reverse':
+                _, _, column = relation
+                by_parent = {}
+                for chunk in chunks(parent_ids):
+                    statement = select(getattr(model, column).label('_parent_id'), *target_columns).where(getattr(model, column).in_(chunk)).order_by(model.id)
+                    for child in self.fetch(statement):
+                        by_parent.setdefault(child.pop('_parent_id'), []).append(child)
+                        children.append(child)
+                for row in rows:
+                    row[name] = by_parent.get(row['id'], [])
+            else:
+                _, column, _ = relation
+                by_id = {}
+                for chunk in chunks({row[column] for row in rows if row.get(column) is not None}):
+                    for child in self.fetch(select(*target_columns).where(model.id.in_(chunk))):
+                        by_id[child['id']] = child
+                        children.append(child)
+                for row in rows:
+                    row[name] = by_id.get(row.get(column))
+            # the whole next level is resolved with one statement per relation
+            self.resolve(target, sub, children)
+
+    def project(self, entity, selection, row):
+        if row is None:
+            return None
+        data = {field: row[field] for field in selection.get('fields', columns(entity))}
+        for name, sub in selection.items():
+            if name in ARGUMENTS:
+                continue
+            target = target_of(RELATIONS[entity][name])
+            value = row[name]
+            data[name] = [self.project(target, sub, child) for child in value] if isinstance(value, list) else self.project(target, sub, value)
+        return data
+
+def execute_query(query, **limits):
+    if not isinstance(query, dict) or len(query) == 0:
+        raise APIException('Specify at least one entity to query', status_code=400)
+    executor = QueryExecutor(**limits)
+    data = {}
+    for entity, selection in query.items():
+        if entity not in ENTITIES:
+            raise APIException('Unknown entity {}'.format(entity), status_code=400)
+        data[entity] = executor.run(entity, selection)
+    return {"data": data, "cost": {"statements": executor.statements, "rows": executor.rows}}
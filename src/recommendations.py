@@ -0,0 +1,224 @@
+import os
+import threading
+import time
+from flask import current_app
+from sqlalchemy import select
+from events import on_row_commit, table_of
+from favorites import favorites_sessions
+from models import Favorites
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+class CoOccurrence:
+    """
+    "Users who favorited this also favorited": the user x entity favorites are a sparse 0/1 matrix X and
+    X.T @ X counts, for every pair of entities, the users that favorited both. Each entity keeps its
+    top K neighbours by cosine (count / sqrt(popularity of both)), so requests only read short lists.
+    Favorites added or removed after the build update the counts and the lists of the entities involved.
+    """
+
+    def __init__(self, top_k=10):
+        self.top_k = top_k
+        self.items = []
+        self.index = {}
+        self.user_items = {}
+        self.popularity = np.zeros(0, dtype=np.int64)
+        self.counts = sparse.lil_matrix((0, 0), dtype=np.int64)
+        self.similar = []
+
+    @classmethod
+    def build(cls, rows, top_k=10):
+        # rows: (user_id, entity_type, entity_id)
+        model = cls(top_k)
+        users, columns = [], []
+        for user_id, entity_type, entity_id in rows:
+            users.append(user_id)
+            columns.append(model.item_index((entity_type, entity_id)))
+            model.user_items.setdefault(user_id, set()).add(columns[-1])
+        user_index = {user_id: row for row, user_id in enumerate(model.user_items)}
+        matrix = sparse.csr_matrix(
+            (np.ones(len(users), dtype=np.int64), ([user_index[user_id] for user_id in users], columns)),
+            shape=(len(user_index), len(model.items)),
+        )
+        counts = (matrix.T @ matrix).tolil()
+        model.popularity = counts.diagonal().astype(np.int64)
+        counts.setdiag(0)
+        model.counts = counts
+        model.similar = [model.top(item) for item in range(len(model.items))]
+        return model
+
+    def item_index(self, item):
+        if item not in self.index:
+            self.index[item] = len(self.items)
+            self.items.append(item)
+        return self.index[item]
+
+    def grow(self):
+        size = len(self.items)
+        if self.counts.shape[0] < size:
+            self.counts.resize((size, size))
+            self.popularity = np.concatenate([self.popularity, np.zeros(size - len(self.popularity), dtype=np.int64)])
+            self.similar.extend([] for _ in range(size - len(self.similar)))
+
+    def top(self, item):
+        # [(neighbour, score, count)] best first, pairs with a count of 0 (after removals) are dropped
+        neighbours = np.array(self.counts.rows[item], dtype=np.int64)
+        counts = np.array(self.counts.data[item], dtype=np.int64)
+        keep = counts > 0
+        neighbours, counts = neighbours[keep], counts[keep]
+        if not len(neighbours):
+            return []
+        scores = counts / np.sqrt(self.popularity[item] * self.popularity[neighbours])
+        if len(scores) > self.top_k:
+            best = np.argpartition(-scores, self.top_k)[:self.top_k]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.lexsort((neighbours[best], -scores[best]))]
+        return [(int(neighbours[i]), float(scores[i]), int(counts[i])) for i in best]
+
+    def change(self, user_id, item, delta):
+        owned = self.user_items.setdefault(user_id, set())
+        index = self.item_index(item)
+        if (index in owned) == (delta > 0):
+            return
+        self.grow()
+        owned.discard(index)
+        others = sorted(owned)
+        for other in others:
+            self.counts[index, other] += delta
+            self.counts[other, index] += delta
+        self.popularity[index] += delta
+        if delta > 0:
+            owned.add(index)
+        # the scores of other pairs with this entity use its old popularity until the next build
+        for changed in [index, *others]:
+            self.similar[changed] = self.top(changed)
+
+    def add(self, user_id, item):
+        self.change(user_id, item, 1)
+
+    def remove(self, user_id, item):
+        self.change(user_id, item, -1)
+
+    def describe(self, neighbours):
+        return [{"type": self.items[item][0], "id": self.items[item][1], "score": round(score, 4), "count": count} for item, score, count in neighbours]
+
+    def for_item(self, item):
+        index = self.index.get(item)
+        return [] if index is None else self.describe(self.similar[index])
+
+    def for_user(self, user_id):
+        # adds up the precomputed lists of the user's favorites, the entities already favorited are left out
+        owned = self.user_items.get(user_id, set())
+        scores, counts = {}, {}
+        for item in owned:
+            for neighbour, score, count in self.similar[item]:
+                if neighbour not in owned:
+                    scores[neighbour] = scores.get(neighbour, 0.0) + score
+                    counts[neighbour] = counts.get(neighbour, 0) + count
+        best = sorted(scores, key=lambda item: (-scores[item], item))[:self.top_k]
+        return self.describe([(item, scores[item], counts[item]) for item in best])
+
+class Recommender:
+    """
+    Owns the model of one worker: built on first use, rebuilt in a background thread every
+    `rebuild_interval` seconds (that is how favorites written by other workers get in), and updated
+    in place with the favorites this worker commits. Changes committed while a rebuild reads the
+    table are applied again to the new model.
+    """
+
+    def __init__(self, app, top_k=10, rebuild_interval=600):
+        self.app = app
+        self.top_k = top_k
+        self.rebuild_interval = rebuild_interval
+        self.model = None
+        self.built_at = 0.0
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()
+        self.rebuilding = False
+        self.pending = []
+        self.pid = None
+
+    def read(self):
+        statement = select(Favorites.user_id, Favorites.entity_type, Favorites.entity_id)
+        rows = []
+        for session in favorites_sessions():
+            rows.extend(session.execute(statement).all())
+        return rows
+
+    def rebuild(self):
+        with self.lock:
+            self.pending = []
+        model = CoOccurrence.build(self.read(), self.top_k)
+        with self.lock:
+            for user_id, item, delta in self.pending:
+                model.change(user_id, item, delta)
+            self.model, self.built_at, self.pending = model, time.time(), []
+            self.rebuilding = False
+
+    def rebuild_in_background(self):
+        def run():
+            try:
+                with self.app.app_context():
+                    self.rebuild()
+            except Exception:
+                self.app.logger.exception('Rebuilding the recommendations failed')
+                with self.lock:
+                    self.rebuilding = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def current(self):
+        # the model of this worker, a forked worker builds its own on its first request
+        if self.pid != os.getpid():
+            with self.build_lock:
+                if self.pid != os.getpid():
+                    with self.lock:
+                        self.rebuilding = True
+                    self.rebuild()
+                    self.pid = os.getpid()
+        elif not self.rebuilding and time.time() - self.built_at > self.rebuild_interval:
+            with self.lock:
+                start, self.rebuilding = not self.rebuilding, True
+            if start:
+                self.rebuild_in_background()
+        return self.model
+
+    def apply(self, changes):
+        with self.lock:
+            for change in changes:
+                if table_of(change['type']) != Favorites.__tablename__ or change['op'] == 'update':
+                    continue
+                item = (change['data']['entity_type'], change['data']['entity_id'])
+                delta = 1 if change['op'] == 'insert' else -1
+                if self.rebuilding:
+                    self.pending.append((change['user_id'], item, delta))
+                if self.model is not None and self.pid == os.getpid():
+                    self.model.change(change['user_id'], item, delta)
+
+    def for_item(self, entity_type, entity_id):
+        model = self.current()
+        with self.lock:
+            return {"data": model.for_item((entity_type, entity_id)), "built_at": self.built_at}
+
+    def for_user(self, user_id):
+        model = self.current()
+        with self.lock:
+            return {"data": model.for_user(user_id), "built_at": self.built_at}
+
+def apply_favorite_changes(changes):
+    recommender = current_app.extensions.get('recommendations')
+    if recommender is not None:
+        recommender.apply(changes)
+
+def init_recommendations(app):
+    if np is None:
+        raise RuntimeError('ENABLE_RECOMMENDATIONS needs numpy and scipy (pipenv install --categories "packages optional")')
+    app.config.setdefault('RECOMMENDATIONS_TOP_K', 10)
+    app.config.setdefault('RECOMMENDATIONS_REBUILD_INTERVAL', 600)
+    app.extensions['recommendations'] = Recommender(app, app.config['RECOMMENDATIONS_TOP_K'], app.config['RECOMMENDATIONS_REBUILD_INTERVAL'])
+    on_row_commit(apply_favorite_changes)
@@ -0,0 +1,138 @@
+import os
+import random
+import threading
+import time
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, select, update, insert
+
+READ_METHODS = ('GET', 'HEAD')
+
+class RoutingSession(Session):
+    """
+    Session of db.session. With replicas configured, the statements of GET requests go to one healthy
+    replica (the same one for the whole request). Writes always go to the primary, and once a session
+    writes, the rest of its reads go to the primary too, so they see what it wrote.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or not has_request_context():
+            return engine
+        router = current_app.extensions.get('replicas')
+        if router is None or engine is not self._db.engines[None]:
+            return engine
+        if self._flushing or getattr(clause, 'is_dml', False) or self.new or self.dirty or self.deleted:
+            self.info['wrote'] = True
+        if self.info.get('wrote') or request.method not in READ_METHODS or router.sticky(request):
+            return engine
+        if 'replica' not in self.info:
+            self.info['replica'] = router.choose()
+        return self.info['replica'] or engine
+
+def forget_replica(session, *args):
+    # a new transaction can pick another replica, the write flag lasts as long as the session
+    session.info.pop('replica', None)
+
+class ReplicaRouter:
+    """
+    Keeps the health of the replicas: every `check_interval` seconds a background thread writes the
+    heartbeat on the primary and reads it back from each replica. A replica that fails or whose
+    heartbeat is older than `max_lag` seconds gets no traffic until it catches up.
+    """
+
+    def __init__(self, app, primary, replicas, max_lag=5.0, check_interval=1.0, sticky_seconds=5.0):
+        self.app = app
+        self.primary = primary
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.sticky_seconds = sticky_seconds
+        self.status = {name: {'healthy': False, 'lag': None, 'error': None} for name in replicas}
+        self.pid = None
+        self.lock = threading.Lock()
+        for name, engine in replicas.items():
+            event.listen(engine, 'handle_error', lambda context, name=name: self.mark_failed(name, context.original_exception))
+
+    def start(self):
+        # one checker per worker, started after the fork
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+        self.check()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def choose(self):
+        self.start()
+        healthy = [name for name, status in self.status.items() if status['healthy']]
+        return self.replicas[random.choice(healthy)] if healthy else None
+
+    def sticky(self, request):
+        # a client that wrote a moment ago reads its own writes from the primary
+        try:
+            return float(request.cookies.get('read_primary_until', 0)) > time.time()
+        except ValueError:
+            return False
+
+    def mark_failed(self, name, error):
+        self.status[name] = {'healthy': False, 'lag': None, 'error': str(error)}
+
+    def beat(self):
+        from models import Replica_Heartbeat
+        table = Replica_Heartbeat.__table__
+        now = time.time()
+        with self.primary.begin() as connection:
+            if connection.execute(update(table).where(table.c.id == 1).values(beat_at=now)).rowcount == 0:
+                connection.execute(insert(table).values(id=1, beat_at=now))
+        return now
+
+    def check(self):
+        from models import Replica_Heartbeat
+        try:
+            now = self.beat()
+        except Exception:
+            self.app.logger.exception('Writing the replica heartbeat failed')
+            return
+        for name, engine in self.replicas.items():
+            try:
+                with engine.connect() as connection:
+                    beat_at = connection.execute(select(Replica_Heartbeat.beat_at).where(Replica_Heartbeat.id == 1)).scalar()
+            except Exception as error:
+                self.mark_failed(name, error)
+                continue
+            lag = now - beat_at if beat_at is not None else None
+            self.status[name] = {'healthy': lag is not None and lag <= self.max_lag, 'lag': lag, 'error': None}
+
+    def run(self):
+        while True:
+            time.sleep(self.check_interval)
+            try:
+                with self.app.app_context():
+                    self.check()
+            except Exception:
+                self.app.logger.exception('Checking the replicas failed')
+
+def replica_binds(urls):
+    return {'replica_{}'.format(index): url.strip() for index, url in enumerate(urls.split(',')) if url.strip()}
+
+def init_replicas(app, db):
+    app.config.setdefault('REPLICA_MAX_LAG', 5.0)
+    app.config.setdefault('REPLICA_CHECK_INTERVAL', 1.0)
+    with app.app_context():
+        engines = db.engines
+        replicas = {name: engines[name] for name in replica_binds(app.config['DATABASE_REPLICA_URLS'])}
+        router = ReplicaRouter(app, engines[None], replicas, app.config['REPLICA_MAX_LAG'], app.config['REPLICA_CHECK_INTERVAL'], app.config['REPLICA_MAX_LAG'])
+    app.extensions['replicas'] = router
+    if not event.contains(db.session, 'after_transaction_end', forget_replica):
+        event.listen(db.session, 'after_transaction_end', forget_replica)
+
+    @app.after_request
+    def stick_to_primary(response):
+        if db.session().info.get('wrote') and request.method not in READ_METHODS:
+            response.set_cookie('read_primary_until', str(time.time() + router.sticky_seconds), max_age=int(router.sticky_seconds) + 1, httponly=True, samesite='Lax')
+        return response
+
+    @app.route('/replicas', methods=['GET'])
+    def replicas_status():
+        return {name: status for name, status in router.status.items()}
@@ -0,0 +1,72 @@
+from flask import current_app, g
+from sqlalchemy import create_engine, MetaData, Table, Column, Index
+from sqlalchemy.orm import Session, sessionmaker
+
+def jump_hash(key, buckets):
+    # jump consistent hash (Lamping & Veach): going from N to N + 1 shards only moves 1 / (N + 1) of the keys
+    bucket, jump = -1, 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) % 2 ** 64
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+def detached_copy(table, metadata):
+    # same columns and indexes without the foreign keys, the referenced tables stay in the main database
+    copy = Table(table.name, metadata, *[Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable) for column in table.columns])
+    for index in table.indexes:
+        Index(index.name, *[copy.c[column.name] for column in index.columns], unique=index.unique, **index.dialect_kwargs)
+    return copy
+
+class ShardSession(Session):
+    # the session events of src/events.py are registered on this class as well as on db.session
+    pass
+
+class ShardRouter:
+    """
+    Maps a user to one of N shard databases, every shard has its own copy of the sharded tables.
+    Sessions are opened on demand and live as long as the app context, like db.session.
+    """
+
+    def __init__(self, urls, tables, engine_options=None):
+        self.engines = [create_engine(url, **(engine_options or {})) for url in urls]
+        self.sessionmakers = [sessionmaker(bind=engine, class_=ShardSession) for engine in self.engines]
+        self.metadata = MetaData()
+        for table in tables:
+            detached_copy(table, self.metadata)
+
+    def __len__(self):
+        return len(self.engines)
+
+    def shard_of(self, user_id):
+        return jump_hash(int(user_id), len(self.engines))
+
+    def session(self, index):
+        sessions = g.setdefault('shard_sessions', {})
+        if index not in sessions:
+            sessions[index] = self.sessionmakers[index]()
+        return sessions[index]
+
+    def sessions(self):
+        return [self.session(index) for index in range(len(self.engines))]
+
+    def create_all(self):
+        for engine in self.engines:
+            self.metadata.create_all(engine)
+
+    def dispose(self):
+        # after the fork, like db.engine.dispose(close=False) in gunicorn.conf.py
+        for engine in self.engines:
+            engine.dispose(close=False)
+
+def shard_router():
+    return current_app.extensions.get('shard_router')
+
+def close_shard_sessions(exception=None):
+    for session in g.pop('shard_sessions', {}).values():
+        session.close()
+
+def init_shards(app, tables):
+    urls = [url.strip() for url in app.config['FAVORITES_SHARDS'].split(',') if url.strip()]
+    app.extensions['shard_router'] = ShardRouter(urls, tables, app.config.get('SQLALCHEMY_ENGINE_OPTIONS'))
+    app.teardown_appcontext(close_shard_sessions)
@@ -0,0 +1,162 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from flask import current_app
+from events import on_commit
+from snapshot import CATALOG_TABLES
+
+class FileBackend:
+    """
+    Cross-process lock and shared result on the local disk, a stand-in for a shared store like redis:
+    only one worker of the machine rebuilds a key, the others wait for the lock and read its result.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key, extension):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + extension)
+
+    @contextmanager
+    def lock(self, key):
+        with open(self.path(key, '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self, key, max_age):
+        try:
+            with open(self.path(key, '.json')) as value_file:
+                stored = json.load(value_file)
+        except (OSError, ValueError):
+            return None
+        if time.time() - stored['stored_at'] > max_age:
+            return None
+        return stored['value']
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def store(self, key, value):
+        # write and rename so a reader never sees half a file
+        path = self.path(key, '.json')
+        with open(path + '.tmp', 'w') as value_file:
+            json.dump({'stored_at': time.time(), 'value': value}, value_file)
+        os.replace(path + '.tmp', path)
+
+class Call:
+    __slots__ = ('done', 'value', 'error', 'generation')
+
+    def __init__(self, generation):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.generation = generation
+
+class SingleFlight:
+    """
+    Runs at most one computation per key at a time in this process, concurrent callers wait and share its result.
+    Results stay fresh for `ttl` seconds, after that and up to `stale_ttl` they are still served while one
+    caller rebuilds them in the background (stale-while-revalidate).
+    """
+
+    def __init__(self, ttl, stale_ttl, backend=None):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.backend = backend
+        self.entries = {}
+        self.calls = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+        if self.backend is not None:
+            self.backend.clear()
+
+    def get(self, key, compute):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and now < entry[1]:
+                return entry[0]
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Call(self.generation)
+        if entry is not None and now < entry[2]:
+            if leader:
+                app = current_app._get_current_object()
+                threading.Thread(target=self.refresh, args=(app, key, compute, call), daemon=True).start()
+            return entry[0]
+        if leader:
+            self.run(key, compute, call)
+        else:
+            call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    def refresh(self, app, key, compute, call):
+        with app.app_context():
+            try:
+                self.run(key, compute, call)
+            except Exception:
+                app.logger.exception('Background refresh of %s failed', key)
+
+    def run(self, key, compute, call):
+        try:
+            call.value = self.compute(key, compute, call.generation)
+            now = time.monotonic()
+            with self.lock:
+                # a write committed while it ran may or may not be in the result, keep it uncached
+                if self.generation == call.generation:
+                    self.entries[key] = (call.value, now + self.ttl, now + self.ttl + self.stale_ttl)
+        except Exception as error:
+            call.error = error
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+            call.done.set()
+
+    def compute(self, key, compute, generation):
+        if self.backend is None:
+            return compute()
+        with self.backend.lock(key):
+            value = self.backend.load(key, self.ttl)
+            if value is None:
+                value = compute()
+                if self.generation == generation:
+                    self.backend.store(key, value)
+            return value
+
+def single_flight(key, compute):
+    flight = current_app.extensions.get('single_flight')
+    if flight is None:
+        return compute()
+    return flight.get(key, compute)
+
+def init_single_flight(app):
+    app.config.setdefault('SINGLE_FLIGHT_TTL', 2.0)
+    app.config.setdefault('SINGLE_FLIGHT_STALE_TTL', 30.0)
+    app.config.setdefault('SINGLE_FLIGHT_BACKEND', None)
+    app.config.setdefault('SINGLE_FLIGHT_DIR', '/tmp/singleflight')
+    backend = FileBackend(app.config['SINGLE_FLIGHT_DIR']) if app.config['SINGLE_FLIGHT_BACKEND'] == 'file' else None
+    flight = SingleFlight(app.config['SINGLE_FLIGHT_TTL'], app.config['SINGLE_FLIGHT_STALE_TTL'], backend)
+    app.extensions['single_flight'] = flight
+    # a worker never serves its own catalog writes stale
+    on_commit(lambda tables: flight.invalidate() if tables & CATALOG_TABLES else None)
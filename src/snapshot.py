@@ -0,0 +1,222 @@
+import threading
+import time
+from collections import namedtuple
+from flask import current_app
+from sqlalchemy import event, select, update
+from events import on_commit
+from models import db, Catalog_Version, Starships, Planets, Films, Characters, Species, Starships_Films, Starships_Characters, Planets_Films, Films_Characters, Films_Species
+
+# immutable, tuple backed records: a few hundred bytes less than an ORM object per row and nothing to hydrate
+FilmRecord = namedtuple('FilmRecord', 'id title episode director')
+StarshipRecord = namedtuple('StarshipRecord', 'id name model')
+PlanetRecord = namedtuple('PlanetRecord', 'id name rotation_period climate')
+SpeciesRecord = namedtuple('SpeciesRecord', 'id name classification planet_id')
+CharacterRecord = namedtuple('CharacterRecord', 'id name planet_id species_id')
+
+CATALOG_MODELS = (Starships, Planets, Films, Characters, Species, Starships_Films, Starships_Characters, Planets_Films, Films_Characters, Films_Species)
+CATALOG_TABLES = {model.__tablename__ for model in CATALOG_MODELS}
+
+# link table, left column, right column, index name left -> right, index name right -> left
+ADJACENCY = (
+    (Starships_Films, 'starship_id', 'film_id', 'starship_films', 'film_starships'),
+    (Starships_Characters, 'starship_id', 'character_id', 'starship_characters', 'character_starships'),
+    (Planets_Films, 'planet_id', 'film_id', 'planet_films', 'film_planets'),
+    (Films_Characters, 'film_id', 'character_id', 'film_characters', 'character_films'),
+    (Films_Species, 'film_id', 'species_id', 'film_species', 'species_films'),
+)
+
+class Catalog:
+    """
+    Read only copy of the catalog tables with id -> record maps and adjacency indexes.
+    A new Catalog is built for every version and swapped in one assignment, it is never mutated.
+    """
+    __slots__ = ('version', 'films', 'starships', 'planets', 'species', 'characters', 'links', '_payloads')
+
+    def __init__(self, version, films, starships, planets, species, characters, links):
+        self.version = version
+        self.films = films
+        self.starships = starships
+        self.planets = planets
+        self.species = species
+        self.characters = characters
+        self.links = links
+        self._payloads = {}
+
+    def related(self, index, entity_id):
+        return self.links[index].get(entity_id, ())
+
+    # same shapes as the serialize() methods of the models
+    def serialize_planet(self, planet_id):
+        planet = self.planets.get(planet_id)
+        return planet._asdict() if planet is not None else None
+
+    def serialize_species(self, species_id, with_planet=True):
+        species = self.species.get(species_id)
+        if species is None:
+            return None
+        data = {"id": species.id, "name": species.name, "classification": species.classification}
+        if with_planet:
+            data["planet_data"] = self.serialize_planet(species.planet_id)
+        return data
+
+    def serialize_character(self, character_id):
+        character = self.characters.get(character_id)
+        if character is None:
+            return None
+        return {
+            "id": character.id,
+            "name": character.name,
+            "planet_data": self.serialize_planet(character.planet_id),
+            "species_data": self.serialize_species(character.species_id, with_planet=False)
+        }
+
+    def serialize_film(self, film_id):
+        film = self.films.get(film_id)
+        return film._asdict() if film is not None else None
+
+    def serialize_starship(self, starship_id):
+        starship = self.starships.get(starship_id)
+        return starship._asdict() if starship is not None else None
+
+    def payload(self, name, build):
+        # the snapshot is immutable so every list payload only has to be built once per version
+        if name not in self._payloads:
+            self._payloads[name] = build()
+        return self._payloads[name]
+
+    def list_starships(self):
+        return self.payload('starships', lambda: [{
+            "starship_data": starship._asdict(),
+            "related_films": [self.serialize_film(i) for i in self.related('starship_films', starship.id)],
+            "related_characters": [self.serialize_character(i) for i in self.related('starship_characters', starship.id)]
+        } for starship in self.starships.values()])
+
+    def list_planets(self):
+        return self.payload('planets', lambda: [{
+            "planet_data": planet._asdict(),
+            "related_films": [self.serialize_film(i) for i in self.related('planet_films', planet.id)]
+        } for planet in self.planets.values()])
+
+    def list_films(self):
+        return self.payload('films', lambda: [{
+            "film_data": film._asdict(),
+            "related_starships": [self.serialize_starship(i) for i in self.related('film_starships', film.id)],
+            "related_planets": [self.serialize_planet(i) for i in self.related('film_planets', film.id)],
+            "related_characters": [self.serialize_character(i) for i in self.related('film_characters', film.id)],
+            "related_species": [self.serialize_species(i) for i in self.related('film_species', film.id)]
+        } for film in self.films.values()])
+
+    def list_characters(self):
+        return self.payload('characters', lambda: [{
+            "character_data": self.serialize_character(character.id),
+            "related_starships": [self.serialize_starship(i) for i in self.related('character_starships', character.id)],
+            "related films": [self.serialize_film(i) for i in self.related('character_films', character.id)]
+        } for character in self.characters.values()])
+
+    def list_species(self):
+        return self.payload('species', lambda: [{
+            "species_data": self.serialize_species(species.id),
+            "related films": [self.serialize_film(i) for i in self.related('species_films', species.id)]
+        } for species in self.species.values()])
+
+def load_catalog(version):
+    def rows(record, model):
+        columns = [getattr(model, name) for name in record._fields]
+        return {row[0]: record(*row) for row in db.session.execute(select(*columns).order_by(model.id))}
+
+    links = {}
+    for link, left, right, left_index, right_index in ADJACENCY:
+        forward, backward = {}, {}
+        for a, b in db.session.execute(select(getattr(link, left), getattr(link, right)).order_by(link.id)):
+            forward.setdefault(a, []).append(b)
+            backward.setdefault(b, []).append(a)
+        links[left_index] = {key: tuple(value) for key, value in forward.items()}
+        links[right_index] = {key: tuple(value) for key, value in backward.items()}
+    characters = rows(CharacterRecord, Characters)
+    species = rows(SpeciesRecord, Species)
+    planet_characters, planet_species = {}, {}
+    for character in characters.values():
+        planet_characters.setdefault(character.planet_id, []).append(character.id)
+    for record in species.values():
+        planet_species.setdefault(record.planet_id, []).append(record.id)
+    links['planet_characters'] = {key: tuple(value) for key, value in planet_characters.items()}
+    links['planet_species'] = {key: tuple(value) for key, value in planet_species.items()}
+
+    return Catalog(version, rows(FilmRecord, Films), rows(StarshipRecord, Starships), rows(PlanetRecord, Planets), species, characters, links)
+
+def read_version():
+    version = db.session.execute(select(Catalog_Version.version).where(Catalog_Version.id == 1)).scalar()
+    return version or 0
+
+class CatalogSnapshot:
+    def __init__(self, check_interval):
+        self.check_interval = check_interval
+        self.catalog = None
+        self.checked_at = 0
+        self.lock = threading.Lock()
+
+    def mark_stale(self):
+        self.checked_at = 0
+
+    def get(self):
+        catalog = self.catalog
+        if catalog is not None and time.monotonic() - self.checked_at < self.check_interval:
+            return catalog
+        with self.lock:
+            if self.catalog is not None and time.monotonic() - self.checked_at < self.check_interval:
+                return self.catalog
+            version = read_version()
+            if self.catalog is None or self.catalog.version != version:
+                self.catalog = load_catalog(version)
+            self.checked_at = time.monotonic()
+            return self.catalog
+
+def get_catalog():
+    snapshot = current_app.extensions.get('catalog_snapshot')
+    if snapshot is None:
+        return None
+    return snapshot.get()
+
+def catalog_exists(model, entity_id):
+    catalog = get_catalog()
+    if catalog is not None and model in (Films, Starships, Planets, Species, Characters):
+        try:
+            entity_id = int(entity_id)
+        except (TypeError, ValueError):
+            return False
+        return entity_id in getattr(catalog, model.__tablename__)
+    return db.session.get(model, entity_id) is not None
+
+def bump_version(session, flush_context, instances):
+    if session.info.get('catalog_version_bumped'):
+        return
+    if not any(isinstance(obj, CATALOG_MODELS) for obj in (*session.new, *session.dirty, *session.deleted)):
+        return
+    result = session.execute(update(Catalog_Version).where(Catalog_Version.id == 1).values(version=Catalog_Version.version + 1))
+    if result.rowcount == 0:
+        # the migration seeds the row, only a database made with db.create_all() gets here
+        session.add(Catalog_Version(id=1, version=1))
+    session.info['catalog_version_bumped'] = True
+
+def reset_version_flag(session):
+    session.info.pop('catalog_version_bumped', None)
+
+def track_catalog_version():
+    # every transaction that writes a catalog table bumps catalog_version once
+    if not event.contains(db.session, 'before_flush', bump_version):
+        event.listen(db.session, 'before_flush', bump_version)
+        event.listen(db.session, 'after_commit', reset_version_flag)
+        event.listen(db.session, 'after_rollback', reset_version_flag)
+
+def init_catalog_snapshot(app):
+    app.config.setdefault('CATALOG_SNAPSHOT_CHECK_INTERVAL', 1.0)
+    snapshot = CatalogSnapshot(app.config['CATALOG_SNAPSHOT_CHECK_INTERVAL'])
+    app.extensions['catalog_snapshot'] = snapshot
+
+    def after_commit(tables):
+        # the worker that wrote sees its own changes right away, the others within the check interval
+        if tables & CATALOG_TABLES:
+            snapshot.mark_stale()
+
+    track_catalog_version()
+    on_commit(after_commit)
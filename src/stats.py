@@ -0,0 +1,107 @@
+import threading
+import time
+from flask import current_app
+from sqlalchemy import select, func
+from events import on_row_commit, table_of
+from favorites import favorites_sessions
+from models import db, Characters, Films_Species, Starships_Films, Favorites
+
+class Aggregate:
+    """
+    COUNT(*) of a table grouped by some of its columns, kept as {group: count}. Committed inserts and
+    deletes move the count of their group, an update can move a row between groups so the next read
+    loads the aggregate again.
+    """
+
+    def __init__(self, model, columns, label):
+        self.model = model
+        self.table = model.__tablename__
+        self.columns = columns
+        self.label = label
+
+    def load(self):
+        group = [getattr(self.model, column) for column in self.columns]
+        statement = select(*group, func.count()).group_by(*group)
+        sessions = favorites_sessions() if self.model is Favorites else [db.session]
+        counts = {}
+        for session in sessions:
+            for *key, count in session.execute(statement).all():
+                counts[tuple(key)] = counts.get(tuple(key), 0) + count
+        return counts
+
+    def apply(self, counts, change):
+        if change['op'] == 'update':
+            return False
+        key = tuple(change['data'][column] for column in self.columns)
+        counts[key] = counts.get(key, 0) + (1 if change['op'] == 'insert' else -1)
+        if counts[key] <= 0:
+            del counts[key]
+        return True
+
+    def columnar(self, counts):
+        # {column: [values], label: [counts]}, groups sorted with NULL last
+        keys = sorted(counts, key=lambda key: tuple((value is None, value or 0) for value in key))
+        result = {column: [key[i] for key in keys] for i, column in enumerate(self.columns)}
+        result[self.label] = [counts[key] for key in keys]
+        return result
+
+AGGREGATES = {
+    'characters_per_planet': Aggregate(Characters, ['planet_id'], 'characters'),
+    'species_per_film': Aggregate(Films_Species, ['film_id'], 'species'),
+    'films_per_starship': Aggregate(Starships_Films, ['starship_id'], 'films'),
+    'favorites_per_entity': Aggregate(Favorites, ['entity_type', 'entity_id'], 'favorites'),
+}
+
+class Stats:
+    """
+    Cache of the aggregates of one worker. Each one is loaded on first use, kept up to date with the
+    rows this worker commits, and loaded again after `max_age` seconds to pick up the writes of the
+    other workers. The columnar payload is built once per change.
+    """
+
+    def __init__(self, max_age=60.0):
+        self.max_age = max_age
+        self.counts = {}
+        self.loaded_at = {}
+        self.payloads = {}
+        self.generations = {name: 0 for name in AGGREGATES}
+        self.lock = threading.Lock()
+
+    def get(self, name):
+        with self.lock:
+            payload = self.payloads.get(name)
+            fresh = name in self.counts and time.monotonic() - self.loaded_at[name] < self.max_age
+            if payload is not None and fresh:
+                return payload
+            if fresh:
+                payload = self.payloads[name] = AGGREGATES[name].columnar(self.counts[name])
+                return payload
+            generation = self.generations[name]
+        counts = AGGREGATES[name].load()
+        payload = AGGREGATES[name].columnar(counts)
+        with self.lock:
+            # a commit applied while the statement ran may or may not be in its result, keep it uncached
+            if self.generations[name] == generation:
+                self.counts[name], self.loaded_at[name], self.payloads[name] = counts, time.monotonic(), payload
+        return payload
+
+    def apply(self, changes):
+        with self.lock:
+            for change in changes:
+                for name, aggregate in AGGREGATES.items():
+                    if aggregate.table != table_of(change['type']):
+                        continue
+                    self.generations[name] += 1
+                    self.payloads.pop(name, None)
+                    if name in self.counts and not aggregate.apply(self.counts[name], change):
+                        del self.counts[name]
+
+def apply_stats_changes(changes):
+    stats = current_app.extensions.get('stats')
+    if stats is not None:
+        stats.apply(changes)
+
+def init_stats(app):
+    app.config.setdefault('STATS_MAX_AGE', 60.0)
+    app.extensions['stats'] = Stats(app.config['STATS_MAX_AGE'])
+    on_row_commit(apply_stats_changes)
@@ -1,5 +1,9 @@
+import os
+import re
 from flask import jsonify, url_for
 
+RULE_PARAMETER = re.compile(r'<(?:(\w+)(?:\([^)]*\))?:)?(\w+)>')
+
 class APIException(Exception):
     status_code = 400
 
@@ -15,21 +19,49 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+def parse_ids(value, limit=1000):
+    # "?ids=3,1,2" -> [3, 1, 2], repeated ids are dropped but the order of the request is kept
+    if value is None:
+        return None
+    try:
+        ids = list(dict.fromkeys(int(item) for item in value.split(',') if item.strip()))
+    except ValueError:
+        raise APIException('ids must be a comma separated list of integers', status_code=400)
+    if len(ids) > limit:
+        raise APIException('A maximum of {} ids can be requested at once'.format(limit), status_code=400)
+    return ids
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
     return len(defaults) >= len(arguments)
 
-def generate_sitemap(app):
-    links = ['/admin/']
+def get_route_index(app):
+    # built once by create_app, when every blueprint and view is registered
+    cached = app.extensions.get('route_index')
+    if cached is None:
+        cached = app.extensions['route_index'] = build_route_index(app)
+    return cached
+
+def build_route_index(app):
+    routes = []
+    links = ['/admin/'] if 'admin' in app.blueprints else []
     for rule in app.url_map.iter_rules():
+        if rule.endpoint == 'static' or rule.rule.startswith('/admin/'):
+            continue
+        routes.append({
+            "rule": rule.rule,
+            "endpoint": rule.endpoint,
+            "methods": sorted(rule.methods - {'HEAD', 'OPTIONS'}),
+            "parameters": [{"name": name, "type": converter or 'default'} for converter, name in RULE_PARAMETER.findall(rule.rule)]
+        })
         # Filter out rules we can't navigate to in a browser
         # and rules that require parameters
         if "GET" in rule.methods and has_no_empty_params(rule):
-            url = url_for(rule.endpoint, **(rule.defaults or {}))
-            if "/admin/" not in url:
-                links.append(url)
+            links.append(url_for(rule.endpoint, **(rule.defaults or {})))
+    return {"routes": routes, "html": render_sitemap(links)}
 
+def render_sitemap(links):
     links_html = "".join(["<li><a href='" + y + "'>" + y + "</a></li>" for y in links])
     return """
         <div style="text-align: center;">
@@ -39,3 +71,12 @@ def generate_sitemap(app):
         <p>Start working on your proyect by following the <a href="https://start.4geeksacademy.com/starters/flask" target="_blank">Quick Start</a></p>
         <p>Remember to specify a real endpoint path like: </p>
         <ul style="text-align: left;">"""+links_html+"</ul></div>"
+
+def generate_sitemap(app):
+    return get_route_index(app)['html']
+
+def env_flag(name, default=False):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
@@ -0,0 +1,65 @@
+import os
+import shutil
+import sys
+
+import pytest
+from sqlalchemy import event
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from models import db
+from seed import bench_app, seed
+
+
+@pytest.fixture(scope='session')
+def seeded_database(tmp_path_factory):
+    # a small synthetic catalog, seeded once and copied for every test
+    path = str(tmp_path_factory.mktemp('seed') / 'seed.db')
+    app = bench_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + path, 'ENABLE_COMPRESSION': False})
+    with app.app_context():
+        seed(films=4, planets=6, species=5, starships=5, characters=40, users=8, favorites=10)
+    return path
+
+
+@pytest.fixture
+def database(seeded_database, tmp_path):
+    path = str(tmp_path / 'test.db')
+    shutil.copy(seeded_database, path)
+    return 'sqlite:///' + path
+
+
+@pytest.fixture
+def make_app(database):
+    def make(**config):
+        defaults = {'SQLALCHEMY_DATABASE_URI': database, 'TESTING': True}
+        defaults.update(config)
+        return bench_app(defaults)
+
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def statements(app):
+    # SQL statements sent by the app while the test runs
+    sent = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        sent.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    yield sent
+    event.remove(engine, 'before_cursor_execute', record)
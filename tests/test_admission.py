@@ -0,0 +1,110 @@
+import threading
+
+import pytest
+
+from admission import ClientLimits, Limiter, Rejected, parse_route_limits
+
+
+def test_limiter_queues_then_sheds():
+    limiter = Limiter(1, queue_size=1, timeout=0.05)
+    limiter.acquire()
+    # the queue has one place: the first waiter times out, a second one at the same time is rejected right away
+    started = threading.Event()
+    errors = []
+
+    def wait():
+        started.set()
+        try:
+            limiter.acquire()
+        except Rejected as rejected:
+            errors.append(rejected.reason)
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    started.wait()
+    while not limiter.waiting:
+        pass
+    with pytest.raises(Rejected) as rejected:
+        limiter.acquire()
+    assert (rejected.value.status, rejected.value.reason) == (503, 'queue_full')
+    waiter.join()
+    assert errors == ['queue_timeout']
+    limiter.release()
+    limiter.acquire()
+    assert (limiter.active, limiter.admitted, limiter.rejected) == (1, 2, {'queue_full': 1, 'queue_timeout': 1})
+
+
+def test_limiter_hands_the_slot_to_a_waiter():
+    limiter = Limiter(1, queue_size=1, timeout=5)
+    limiter.acquire()
+    waiter = threading.Thread(target=limiter.acquire)
+    waiter.start()
+    while not limiter.waiting:
+        pass
+    limiter.release()
+    waiter.join()
+    assert (limiter.active, limiter.waiting, limiter.admitted) == (1, 0, 2)
+
+
+def test_client_limits():
+    clients = ClientLimits(rate=1, burst=10, concurrency=2)
+    clients.acquire('a', 5)
+    clients.acquire('a', 5)
+    with pytest.raises(Rejected) as rejected:
+        clients.acquire('a', 5)
+    assert (rejected.value.status, rejected.value.reason) == (429, 'rate')
+    assert 4 < rejected.value.retry_after <= 5
+    # every client has its own bucket
+    clients.acquire('b', 5)
+    clients = ClientLimits(concurrency=1)
+    clients.acquire('a', 1)
+    with pytest.raises(Rejected):
+        clients.acquire('a', 1)
+    clients.acquire('a', 1, in_flight=False)
+    clients.release('a')
+    clients.acquire('a', 1)
+
+
+def test_parse_route_limits():
+    assert parse_route_limits('') == {}
+    assert parse_route_limits('/films=1, /user/<int:user_id>=4') == {'/films': 1, '/user/<int:user_id>': 4}
+
+
+def test_rate_limit_with_retry_after(make_app):
+    client = make_app(ENABLE_ADMISSION=True, ADMISSION_CLIENT_RATE=0.1, ADMISSION_CLIENT_BURST=6, ADMISSION_EXPENSIVE_COST=5).test_client()
+    assert client.get('/films').status_code == 200
+    response = client.get('/films')
+    assert response.status_code == 429
+    assert response.get_json()['reason'] == 'rate'
+    assert int(response.headers['Retry-After']) >= 1
+    # a cheap request still fits in the bucket, /metrics is never limited
+    assert client.get('/films/1').status_code == 200
+    assert client.get('/films/1').status_code == 429
+    assert client.get('/metrics').status_code == 200
+
+
+def test_clients_behind_trusted_proxies(make_app):
+    client = make_app(ENABLE_ADMISSION=True, ADMISSION_CLIENT_RATE=0.1, ADMISSION_CLIENT_BURST=1, ADMISSION_TRUSTED_PROXIES=1).test_client()
+    assert client.get('/films/1', headers={'X-Forwarded-For': '10.0.0.1'}).status_code == 200
+    assert client.get('/films/1', headers={'X-Forwarded-For': '10.0.0.1'}).status_code == 429
+    assert client.get('/films/1', headers={'X-Forwarded-For': '10.0.0.2'}).status_code == 200
+    # what the client sends left of the proxy's entry does not change who it is
+    assert client.get('/films/1', headers={'X-Forwarded-For': '10.0.0.9, 10.0.0.2'}).status_code == 429
+
+
+def test_expensive_routes_share_their_slots(make_app):
+    app = make_app(ENABLE_ADMISSION=True, ADMISSION_EXPENSIVE_QUEUE=0, ADMISSION_ROUTE_LIMITS='/films/<int:films_id>=1')
+    client, admission = app.test_client(), app.extensions['admission']
+    admission.expensive.acquire()
+    response = client.get('/characters')
+    assert (response.status_code, response.get_json()['reason']) == (503, 'queue_full')
+    assert client.get('/characters/1').status_code == 200
+    admission.expensive.release()
+    assert client.get('/characters').status_code == 200
+    admission.routes['/films/<int:films_id>'].acquire()
+    assert client.get('/films/1').status_code == 503
+    admission.routes['/films/<int:films_id>'].release()
+    assert client.get('/films/1').status_code == 200
+    assert admission.expensive.active == 0
+    metrics = client.get('/metrics').get_data(as_text=True)
+    assert 'admission_rejected_total{limiter="expensive",reason="queue_full"} 1' in metrics
@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+SNIPPET = """
+import sys
+from app import create_app
+app = create_app({config!r})
+print(','.join(name for name in ('flask_admin', 'flask_migrate', 'flask_swagger') if name in sys.modules))
+"""
+
+
+def imported_extensions(config):
+    output = subprocess.run([sys.executable, '-c', SNIPPET.format(config=config)], cwd=os.path.join(ROOT, 'src'), capture_output=True, text=True, check=True)
+    return output.stdout.strip()
+
+
+def test_disabled_subsystems_are_not_imported():
+    assert imported_extensions({'ENABLE_ADMIN': False, 'ENABLE_MIGRATE': False, 'ENABLE_SWAGGER': False}) == ''
+
+
+def test_enabled_subsystems_are_imported():
+    assert imported_extensions({'ENABLE_ADMIN': False, 'ENABLE_MIGRATE': True, 'ENABLE_SWAGGER': True}) == 'flask_migrate,flask_swagger'
+
+
+def test_apps_are_independent(make_app):
+    with_swagger = make_app(ENABLE_SWAGGER=True)
+    without_swagger = make_app()
+    assert with_swagger.test_client().get('/swagger').status_code == 200
+    assert without_swagger.test_client().get('/swagger').status_code == 404
+    assert without_swagger.test_client().get('/user/1').status_code == 200
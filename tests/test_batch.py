@@ -0,0 +1,64 @@
+def batch(client, requests, **options):
+    response = client.post('/batch', json={'requests': requests, **options})
+    assert response.status_code == 200
+    return response.get_json()['responses']
+
+
+def test_responses_in_order(client):
+    responses = batch(client, [{'path': '/films/2'}, {'path': '/user/1'}, {'path': '/nowhere'}, {'path': '/films/1'}])
+    assert [response['status'] for response in responses] == [200, 200, 404, 200]
+    assert responses[0]['body']['id'] == 2
+    assert responses[3]['body']['id'] == 1
+    assert responses[1]['body']['email'] == 'user1@example.com'
+
+
+def test_detail_lookups_are_coalesced(client, statements):
+    responses = batch(client, [{'path': '/characters/{}'.format(i)} for i in range(1, 11)])
+    assert [response['body']['id'] for response in responses] == list(range(1, 11))
+    assert len(statements) == 1
+
+
+def test_writes_run_in_order(client):
+    responses = batch(client, [{'method': 'PUT', 'path': '/films/1', 'body': {'title': 'Renamed'}}, {'path': '/films/1'}], parallel=True)
+    assert responses[1]['body']['title'] == 'Renamed'
+
+
+def test_parallel_reads(client):
+    responses = batch(client, [{'path': '/films'}, {'path': '/planets'}, {'path': '/user/3'}], parallel=True)
+    assert [response['status'] for response in responses] == [200, 200, 200]
+    assert len(responses[0]['body']) == 4
+
+
+def test_invalid_batches(client):
+    assert client.post('/batch', json={'requests': []}).status_code == 400
+    assert client.post('/batch', json={'requests': [{'path': '/batch'}]}).status_code == 400
+    assert client.post('/batch', json={'requests': [{'path': '/films/1'}] * 51}).status_code == 400
+
+
+def test_sub_requests_are_admitted(make_app):
+    # the batch costs 5 tokens, /films 5 more and /films/1 one: the second list is over the burst of 12
+    client = make_app(ENABLE_ADMISSION=True, ADMISSION_CLIENT_RATE=0.001, ADMISSION_CLIENT_BURST=12, ADMISSION_CLIENT_CONCURRENCY=1).test_client()
+    responses = batch(client, [{'path': '/films'}, {'path': '/films/1'}, {'path': '/planets'}, {'path': '/user/1'}])
+    assert [response['status'] for response in responses] == [200, 200, 429, 200]
+    assert responses[2]['body']['reason'] == 'rate'
+
+
+def test_sub_requests_run_in_the_slots_of_the_batch(make_app):
+    # one expensive slot, held by the batch: its sub-requests must not wait for it
+    app = make_app(ENABLE_ADMISSION=True, ADMISSION_EXPENSIVE_CONCURRENCY=1, ADMISSION_EXPENSIVE_QUEUE=0)
+    responses = batch(app.test_client(), [{'path': '/films'}, {'path': '/planets'}, {'path': '/species'}], parallel=True)
+    assert [response['status'] for response in responses] == [200, 200, 200]
+    admission = app.extensions['admission']
+    assert admission.expensive.active == 0
+    assert admission.expensive.rejected == {'queue_full': 0, 'queue_timeout': 0}
+
+
+def test_sub_requests_are_sampled(make_app, tmp_path):
+    app = make_app(ENABLE_PROFILING=True, PROFILING_TOKEN='secret', PROFILING_DIR=str(tmp_path))
+    entered = []
+    sampler = app.extensions['profiler'].sampler
+    enter = sampler.enter
+    sampler.enter = lambda route: entered.append(route) or enter(route)
+    batch(app.test_client(), [{'path': '/films'}, {'path': '/user/1'}])
+    assert entered == ['/batch', '/films', '/user/<int:user_id>']
+    assert sampler.routes == {}
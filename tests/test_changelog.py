@@ -0,0 +1,85 @@
+import sqlite3
+
+import pytest
+
+from changelog import compact_change_log
+from events import on_commit
+from models import db, Change_Log
+
+
+@pytest.fixture
+def client(make_app):
+    return make_app(ENABLE_CHANGE_LOG=True, CHANGE_LOG_SAFETY_WINDOW=0).test_client()
+
+
+def changes(client, **args):
+    response = client.get('/changes', query_string=args)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_disabled_by_default(make_app):
+    assert make_app().test_client().get('/changes').status_code == 404
+
+
+def test_writes_are_recorded_with_their_rows(client):
+    client.put('/films/1', json={'title': 'Renamed'})
+    client.post('/planets', json={'name': 'Hoth', 'rotation_period': '23', 'climate': 'frozen'})
+    body = changes(client, since=0)
+    assert [(change['type'], change['op']) for change in body['changes']] == [('films', 'update'), ('planets', 'insert')]
+    assert body['changes'][0]['data']['title'] == 'Renamed'
+    assert body['changes'][1]['data']['name'] == 'Hoth'
+    assert body['reset'] is False
+    assert changes(client, since=body['cursor'])['changes'] == []
+
+
+def test_filters_and_pages(client):
+    for title in ('One', 'Two', 'Three'):
+        client.put('/films/1', json={'title': title})
+    client.put('/user/1', json={'age': 30})
+    assert [change['type'] for change in changes(client, since=0, types='user')['changes']] == ['user']
+    first = changes(client, since=0, limit=2)
+    assert first['has_more'] is True and len(first['changes']) == 2
+    rest = changes(client, since=first['cursor'])
+    assert [change['type'] for change in rest['changes']] == ['films', 'user']
+
+
+def test_cursor_stays_behind_the_safety_window(make_app):
+    client = make_app(ENABLE_CHANGE_LOG=True, CHANGE_LOG_SAFETY_WINDOW=60).test_client()
+    client.put('/films/1', json={'title': 'Renamed'})
+    body = changes(client, since=0)
+    assert len(body['changes']) == 1
+    # the entry is read again by the next call, a transaction with a lower id may still commit
+    assert body['cursor'] == 0
+    assert len(changes(client, since=body['cursor'])['changes']) == 1
+
+
+def test_compaction(client):
+    for title in ('One', 'Two', 'Three'):
+        client.put('/films/1', json={'title': title})
+    with client.application.app_context():
+        assert compact_change_log(retention_days=30) == (2, 0)
+        assert db.session.query(Change_Log).count() == 1
+    body = changes(client, since=0)
+    assert [change['data']['title'] for change in body['changes']] == ['Three']
+    assert body['reset'] is False
+    with client.application.app_context():
+        assert compact_change_log(retention_days=0)[1] == 1
+    # entries the client never saw are gone, it has to resync
+    body = changes(client, since=0)
+    assert body['changes'] == [] and body['reset'] is True
+
+
+def test_feed_reports_the_writes_of_other_workers(make_app, database):
+    app = make_app(ENABLE_CHANGE_LOG=True, CHANGE_LOG_SAFETY_WINDOW=0, CHANGE_LOG_POLL_INTERVAL=0)
+    feed = app.extensions['change_feed']
+    reported = []
+    on_commit(reported.append)
+    with app.app_context():
+        feed.poll()
+        # another worker: its commit listeners do not run in this process
+        with sqlite3.connect(database[len('sqlite:///'):]) as connection:
+            connection.execute("INSERT INTO change_log (table_name, entity_id, operation, created_at) VALUES ('favorite_films', 1, 'insert', datetime('now', '-1 minute'))")
+        feed.poll()
+        feed.poll()
+    assert reported == [{'favorites'}]
@@ -0,0 +1,41 @@
+import gzip
+import zlib
+
+import pytest
+
+from compression import compress_stream
+
+
+def test_gzip_large_responses(client):
+    response = client.get('/characters', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.get_data()).startswith(b'[{')
+
+
+def test_small_responses_are_not_compressed(client):
+    response = client.get('/user/1', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_json()['id'] == 1
+
+
+def test_client_preference_decides(client):
+    brotli = pytest.importorskip('brotli')
+    response = client.get('/characters', headers={'Accept-Encoding': 'gzip;q=1.0, br;q=0.5'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    response = client.get('/characters', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.get_data()).startswith(b'[{')
+
+
+def test_compact_json(make_app):
+    assert b'": ' not in make_app().test_client().get('/user/1').get_data()
+    assert b'": ' in make_app(JSON_COMPACT=False).test_client().get('/user/1').get_data()
+
+
+def test_stream_flushes_every_event():
+    chunks = compress_stream(iter(['data: 1\n\n', 'data: 2\n\n']), 'gzip', 6, 0)
+    first = next(chunks)
+    # the first event can be decoded before the stream is finished
+    assert zlib.decompressobj(31).decompress(first) == b'data: 1\n\n'
+    assert gzip.decompress(first + b''.join(chunks)) == b'data: 1\n\ndata: 2\n\n'
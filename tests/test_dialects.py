@@ -0,0 +1,30 @@
+from dialects import ROUTES, capture, explain, flag_slow
+from models import db
+
+
+def test_sqlite_plans_are_flagged(app):
+    with app.app_context(), db.engine.connect() as connection:
+        plan, flags = explain(connection, 'SELECT * FROM characters WHERE name LIKE ?', ('%1',))
+        assert plan and flags == ['full scan in a filtered query: ' + plan[0]]
+        plan, flags = explain(connection, 'SELECT * FROM characters ORDER BY planet_id, species_id', ())
+        assert any(flag.startswith('sort without an index') for flag in flags)
+        assert explain(connection, 'SELECT * FROM characters WHERE id = ?', (1,))[1] == []
+
+
+def test_capture_counts_the_statements_of_a_route(app):
+    result = capture(app, 'GET /films')
+    assert result['queries'] >= 1
+    assert all(statement['sql'].startswith('SELECT') and statement['plan'] for statement in result['statements'])
+    assert len({statement['sql'] for statement in result['statements']}) == len(result['statements'])
+
+
+def test_routes_much_slower_than_the_best_backend():
+    def results(p50):
+        return {route: {'p50_ms': p50, 'flags': []} for route in ROUTES}
+
+    matrix = {'sqlite-file': results(1.0), 'postgresql': results(3.0), 'mysql': results(1.5)}
+    matrix['mysql']['GET /films']['p50_ms'] = None
+    flag_slow(matrix)
+    assert matrix['postgresql']['GET /films']['flags'] == ['p50 3.0x the one on sqlite-file']
+    assert matrix['mysql']['GET /characters']['flags'] == []
+    assert matrix['sqlite-file']['GET /films']['flags'] == []
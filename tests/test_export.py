@@ -0,0 +1,62 @@
+import io
+import os
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+
+import pyarrow.parquet as pq
+
+from models import db, Characters
+
+
+@pytest.fixture
+def app(make_app, tmp_path):
+    return make_app(ENABLE_EXPORT=True, EXPORT_DIR=str(tmp_path / 'exports'), EXPORT_BATCH_SIZE=7)
+
+
+def test_parquet_has_every_row(app):
+    response = app.test_client().get('/export/characters.parquet')
+    assert response.status_code == 200
+    table = pq.read_table(io.BytesIO(response.get_data()))
+    with app.app_context():
+        rows = db.session.query(Characters.id, Characters.name, Characters.planet_id).order_by(Characters.id).all()
+    assert table.column('id').to_pylist() == [row.id for row in rows]
+    assert table.column('name').to_pylist() == [row.name for row in rows]
+    assert table.schema.field('planet_id').type == pa.int64()
+
+
+def test_arrow_format(app):
+    response = app.test_client().get('/export/films.arrow')
+    table = pa.ipc.open_file(pa.BufferReader(response.get_data())).read_all()
+    assert table.column('title').to_pylist() == ['Film 1', 'Film 2', 'Film 3', 'Film 4']
+
+
+def test_only_public_tables(app):
+    client = app.test_client()
+    assert client.get('/export/favorites.parquet').status_code == 200
+    for table in ('change_log', 'catalog_version', 'replica_heartbeat', 'nothing'):
+        assert client.get('/export/{}.parquet'.format(table)).status_code == 404
+
+
+def test_files_follow_the_content(app, tmp_path):
+    client = app.test_client()
+    first = client.get('/export/films.parquet')
+    assert client.get('/export/films.parquet', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+    # an update keeps the ids and the row count
+    client.put('/films/1', json={'title': 'Renamed'})
+    second = client.get('/export/films.parquet', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert pq.read_table(io.BytesIO(second.get_data())).column('title').to_pylist()[0] == 'Renamed'
+    # the file of the old version is gone
+    assert len([name for name in os.listdir(str(tmp_path / 'exports')) if name.startswith('films-')]) == 1
+
+
+def test_versions_from_the_change_log(make_app, tmp_path):
+    client = make_app(ENABLE_EXPORT=True, EXPORT_DIR=str(tmp_path / 'exports'), ENABLE_CHANGE_LOG=True).test_client()
+    client.get('/export/films.arrow')
+    assert os.listdir(str(tmp_path / 'exports')) == ['films-c0.arrow']
+    client.put('/films/1', json={'title': 'Renamed'})
+    client.get('/export/films.arrow')
+    [name] = os.listdir(str(tmp_path / 'exports'))
+    assert name.startswith('films-c') and name != 'films-c0.arrow'
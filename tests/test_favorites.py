@@ -0,0 +1,52 @@
+from models import db, Favorites
+
+
+def new_user(client):
+    client.post('/user', json={'name': 'new', 'age': 30, 'email': 'new@example.com'})
+    return client.get('/user').get_json()[-1]['id']
+
+
+def test_favorites_of_every_type_share_one_table(app):
+    client = app.test_client()
+    user_id = new_user(client)
+    assert client.post('/user/{}/favorite_films'.format(user_id), json={'film_id': 2}).status_code == 200
+    assert client.post('/user/{}/favorite_planets'.format(user_id), json={'planet_id': 2}).status_code == 200
+    assert 'already' in client.post('/user/{}/favorite_films'.format(user_id), json={'film_id': 2}).get_json()['msg']
+    with app.app_context():
+        rows = db.session.query(Favorites.entity_type, Favorites.entity_id).filter_by(user_id=user_id).order_by(Favorites.entity_type).all()
+    assert rows == [('films', 2), ('planets', 2)]
+    favorites = client.get('/user/{}/favorites'.format(user_id)).get_json()
+    assert [favorite['film_data']['id'] for favorite in favorites['favorite_films']] == [2]
+    assert [favorite['planet_data']['id'] for favorite in favorites['favorite_planets']] == [2]
+    assert favorites['favorite_species'] == []
+
+
+def test_remove_a_favorite(client):
+    user_id = new_user(client)
+    client.post('/user/{}/favorite_films'.format(user_id), json={'film_id': 1})
+    assert client.get('/user/{}/favorite_films/1'.format(user_id)).get_json()['film_data']['id'] == 1
+    assert client.delete('/user/{}/favorite_films/1'.format(user_id)).status_code == 200
+    assert client.get('/user/{}/favorite_films/1'.format(user_id)).status_code == 400
+
+
+def test_invalid_favorites(client):
+    assert client.post('/user/1/favorite_films', json={'film_id': 999}).status_code == 400
+    assert client.post('/user/999/favorite_films', json={'film_id': 1}).status_code == 400
+
+
+def test_lists_are_paginated_in_entity_order(client):
+    everything = client.get('/favorite_characters').get_json()
+    page = client.get('/favorite_characters?limit=3&offset=2').get_json()
+    assert page == everything[2:5]
+    ids = [favorite['character_data']['id'] for favorite in everything]
+    assert ids == sorted(ids)
+
+
+def test_changes_keep_the_type_of_the_favorite(make_app):
+    client = make_app(ENABLE_CHANGE_LOG=True, CHANGE_LOG_SAFETY_WINDOW=0).test_client()
+    user_id = new_user(client)
+    client.post('/user/{}/favorite_films'.format(user_id), json={'film_id': 3})
+    changes = client.get('/changes?types=favorite_films').get_json()['changes']
+    assert [(change['type'], change['data']['entity_id']) for change in changes] == [('favorite_films', 3)]
+    assert client.get('/changes?types=favorites').get_json()['changes'] == changes
+    assert client.get('/changes?types=favorite_planets').get_json()['changes'] == []
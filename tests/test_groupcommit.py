@@ -0,0 +1,64 @@
+import time
+
+from favorites import favorites_session
+from groupcommit import Write, apply_writes
+from models import Favorites
+
+
+def new_user(client):
+    client.post('/user', json={'name': 'new', 'age': 30, 'email': 'new@example.com'})
+    return client.get('/user').get_json()[-1]['id']
+
+
+def favorites_of(app, user_id):
+    with app.app_context():
+        return favorites_session(user_id).query(Favorites.entity_type, Favorites.entity_id).filter_by(user_id=user_id).order_by(Favorites.entity_type, Favorites.entity_id).all()
+
+
+def test_acknowledged_once_committed(make_app):
+    app = make_app(ENABLE_GROUP_COMMIT=True)
+    client = app.test_client()
+    user_id = new_user(client)
+    assert client.post('/user/{}/favorite_films'.format(user_id), json={'film_id': 1}).status_code == 200
+    assert client.post('/user/{}/favorite_planets'.format(user_id), json={'planet_id': 2}).status_code == 200
+    assert favorites_of(app, user_id) == [('films', 1), ('planets', 2)]
+    assert client.delete('/user/{}/favorite_films/1'.format(user_id)).status_code == 200
+    assert favorites_of(app, user_id) == [('planets', 2)]
+
+
+def test_writes_of_one_batch_apply_in_order(make_app):
+    app = make_app(ENABLE_GROUP_COMMIT=True)
+    user_id = new_user(app.test_client())
+    with app.app_context():
+        session = favorites_session(user_id)
+        apply_writes(session, [
+            Write('add', user_id, 'films', 1),
+            Write('add', user_id, 'films', 1),
+            Write('add', user_id, 'films', 2),
+            Write('remove', user_id, 'films', 2),
+            Write('remove', user_id, 'films', 3),
+        ])
+        session.commit()
+    assert favorites_of(app, user_id) == [('films', 1)]
+
+
+def test_queued_writes(make_app):
+    app = make_app(ENABLE_GROUP_COMMIT=True, GROUP_COMMIT_ACK='queue')
+    client = app.test_client()
+    user_id = new_user(client)
+    assert client.post('/user/{}/favorite_films'.format(user_id), json={'film_id': 3}).status_code == 202
+    deadline = time.monotonic() + 5
+    while not favorites_of(app, user_id) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert favorites_of(app, user_id) == [('films', 3)]
+
+
+def test_slow_batches_time_out(make_app):
+    app = make_app(ENABLE_GROUP_COMMIT=True, GROUP_COMMIT_MAX_WAIT=0.5, GROUP_COMMIT_TIMEOUT=0.05)
+    client = app.test_client()
+    user_id = new_user(client)
+    response = client.post('/user/{}/favorite_films'.format(user_id), json={'film_id': 4})
+    assert response.status_code == 503
+    # the write stays queued and is committed with its batch
+    time.sleep(0.7)
+    assert favorites_of(app, user_id) == [('films', 4)]
@@ -0,0 +1,32 @@
+import os
+import runpy
+
+from conftest import ROOT
+
+CONFIG = os.path.join(ROOT, 'gunicorn.conf.py')
+
+
+def load_config(monkeypatch, **environ):
+    for name, value in environ.items():
+        monkeypatch.setenv(name, value)
+    return runpy.run_path(CONFIG)
+
+
+def test_production_defaults(monkeypatch):
+    for name in ('WEB_CONCURRENCY', 'GUNICORN_PRELOAD', 'GUNICORN_MAX_REQUESTS', 'GUNICORN_WORKER_CLASS'):
+        monkeypatch.delenv(name, raising=False)
+    config = load_config(monkeypatch, PORT='8000')
+    assert config['bind'] == '0.0.0.0:8000'
+    assert config['workers'] == os.cpu_count() * 2 + 1
+    assert config['worker_class'] == 'gthread'
+    assert config['preload_app'] is True
+    assert config['max_requests'] == 1000
+    assert config['max_requests_jitter'] == 100
+
+
+def test_environment_overrides(monkeypatch):
+    config = load_config(monkeypatch, WEB_CONCURRENCY='3', GUNICORN_THREADS='8', GUNICORN_PRELOAD='false', GUNICORN_MAX_REQUESTS='0')
+    assert config['workers'] == 3
+    assert config['threads'] == 8
+    assert config['preload_app'] is False
+    assert config['max_requests'] == 0
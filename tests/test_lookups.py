@@ -0,0 +1,38 @@
+import logging
+
+from lookups import find_favorite, find_link
+from models import db, Favorite_Films, Favorite_Planets, Starships_Films
+
+
+def test_cached_statements_keep_their_parameters(app):
+    with app.app_context():
+        favorites = db.session.query(Favorite_Films.id, Favorite_Films.user_id, Favorite_Films.entity_id).all()
+        assert len(favorites) > 1
+        # one cached statement, a new user and entity on every call
+        for favorite_id, user_id, entity_id in favorites:
+            assert find_favorite(db.session, Favorite_Films, user_id, entity_id).id == favorite_id
+        owned = {(user_id, entity_id) for _, user_id, entity_id in favorites}
+        missing = next((user_id, film_id) for user_id in range(1, 9) for film_id in range(1, 5) if (user_id, film_id) not in owned)
+        assert find_favorite(db.session, Favorite_Films, *missing) is None
+
+
+def test_favorite_types_do_not_share_results(app):
+    # same ids, another type: the cached statement must not return the row of the first type
+    with app.app_context():
+        film = db.session.query(Favorite_Films).first()
+        planet = find_favorite(db.session, Favorite_Planets, film.user_id, film.entity_id)
+        assert planet is None or planet.entity_type == 'planets'
+
+
+def test_find_link(app):
+    with app.app_context():
+        link = db.session.query(Starships_Films).first()
+        assert find_link(Starships_Films, starship_id=link.starship_id, film_id=link.film_id).id == link.id
+        assert find_link(Starships_Films, starship_id=link.starship_id, film_id=999) is None
+
+
+def test_prepare_threshold_needs_psycopg3(make_app, caplog):
+    with caplog.at_level(logging.WARNING):
+        app = make_app(DATABASE_PREPARE_THRESHOLD='5')
+    assert 'DATABASE_PREPARE_THRESHOLD is ignored' in caplog.text
+    assert 'prepare_threshold' not in app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}).get('connect_args', {})
@@ -0,0 +1,17 @@
+def test_requested_order_and_missing_ids(client):
+    body = client.get('/films?ids=3,1,99,3').get_json()
+    assert [film['id'] for film in body['data']] == [3, 1]
+    assert body['missing'] == [99]
+
+
+def test_one_statement_per_lookup(client, statements):
+    body = client.get('/characters?ids=' + ','.join(str(i) for i in range(1, 31))).get_json()
+    assert len(body['data']) == 30
+    # the planet and the species of every character come with the same statement
+    assert body['data'][0]['planet_data'] is not None and body['data'][0]['species_data'] is not None
+    assert len(statements) == 1
+
+
+def test_invalid_ids(client):
+    assert client.get('/planets?ids=1,a').status_code == 400
+    assert client.get('/planets?ids=' + ','.join(str(i) for i in range(1, 1002))).status_code == 400
@@ -0,0 +1,68 @@
+import json
+import logging
+import os
+
+import pytest
+
+TOKEN = {'X-Profile-Token': 'secret'}
+
+
+@pytest.fixture
+def app(make_app, tmp_path):
+    return make_app(ENABLE_MEMORY_DIAGNOSTICS=True, PROFILING_TOKEN='secret', MEMORY_DIR=str(tmp_path / 'memory'), MEMORY_TRACE_RATE=0)
+
+
+def test_needs_a_token(make_app):
+    with pytest.raises(RuntimeError):
+        make_app(ENABLE_MEMORY_DIAGNOSTICS=True)
+
+
+def test_routes_of_the_worker(app):
+    client = app.test_client()
+    assert client.get('/memory').status_code == 403
+    client.get('/films/1')
+    client.get('/films/2')
+    client.get('/user/1/favorites')
+    [worker] = client.get('/memory', headers=TOKEN).get_json()['workers']
+    assert worker['pid'] == os.getpid() and worker['rss'] > 0
+    films = worker['routes']['/films/<int:films_id>']
+    assert films['requests'] == 2
+    assert films['loaded_max'] == 1
+    assert films['traced'] == 0
+    assert 'memory_loaded_max_objects{route="/films/<int:films_id>"} 1' in client.get('/metrics').get_data(as_text=True)
+
+
+def test_batch_sub_requests_count_for_the_batch(app):
+    client = app.test_client()
+    client.post('/batch', json={'requests': [{'path': '/films'}, {'path': '/characters'}]})
+    routes = client.get('/memory', headers=TOKEN).get_json()['workers'][0]['routes']
+    assert routes['/films']['requests'] == routes['/characters']['requests'] == 1
+    assert routes['/films']['loaded_max'] >= 4
+    assert routes['/batch']['loaded_max'] == routes['/films']['loaded_max'] + routes['/characters']['loaded_max']
+
+
+def test_traced_requests(make_app, tmp_path):
+    client = make_app(ENABLE_MEMORY_DIAGNOSTICS=True, PROFILING_TOKEN='secret', MEMORY_DIR=str(tmp_path), MEMORY_TRACE_RATE=1).test_client()
+    client.get('/characters')
+    worker = client.get('/memory', headers=TOKEN).get_json()['workers'][0]
+    characters = worker['routes']['/characters']
+    assert characters['traced'] == 1
+    assert characters['traced_peak_max'] > 0 and characters['traced_peak_total'] == characters['traced_peak_max']
+    assert worker['top_sites']
+
+
+def test_over_the_max_rss(make_app, tmp_path, caplog):
+    app = make_app(ENABLE_MEMORY_DIAGNOSTICS=True, PROFILING_TOKEN='secret', MEMORY_DIR=str(tmp_path), MEMORY_TRACE_RATE=0, MEMORY_MAX_RSS_MB=1)
+    with caplog.at_level(logging.WARNING):
+        app.test_client().get('/films/1')
+    assert 'recycling it' in caplog.text
+    # only a gunicorn worker is recycled
+    assert not app.extensions['memory'].recycling
+
+
+def test_reports_of_dead_workers_are_dropped(app, tmp_path):
+    path = tmp_path / 'memory' / '999999999.json'
+    path.write_text(json.dumps({'pid': 999999999, 'routes': {}}))
+    workers = app.test_client().get('/memory', headers=TOKEN).get_json()['workers']
+    assert [worker['pid'] for worker in workers] == [os.getpid()]
+    assert not path.exists()
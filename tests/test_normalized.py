@@ -0,0 +1,23 @@
+def test_same_relations_as_the_nested_list(client):
+    nested = client.get('/films').get_json()
+    normalized = client.get('/films?format=normalized').get_json()
+    assert [film['id'] for film in normalized['data']] == [film['film_data']['id'] for film in nested]
+    for film, item in zip(normalized['data'], nested):
+        assert sorted(film['related_characters']) == sorted(character['id'] for character in item['related_characters'])
+        assert sorted(film['related_planets']) == sorted(planet['id'] for planet in item['related_planets'])
+
+
+def test_related_entities_are_included_once(client):
+    normalized = client.get('/films?format=normalized').get_json()
+    characters = normalized['included']['characters']
+    referenced = {str(character_id) for film in normalized['data'] for character_id in film['related_characters']}
+    assert set(characters) == referenced
+    character = next(iter(characters.values()))
+    # the included entities reference their own relations by id
+    assert isinstance(character['planet_id'], int)
+
+
+def test_characters_point_to_included_planets(client):
+    normalized = client.get('/characters?format=normalized').get_json()
+    planets = normalized['included']['planets']
+    assert all(str(character['planet_id']) in planets for character in normalized['data'])
@@ -0,0 +1,54 @@
+import gzip
+import json
+
+import pytest
+
+
+@pytest.fixture
+def app(make_app, tmp_path):
+    app = make_app(ENABLE_PRERENDER=True, PRERENDER_DIR=str(tmp_path / 'prerender'), PRERENDER_CHECK_INTERVAL=0)
+    result = app.test_cli_runner().invoke(args=['prerender'])
+    assert result.exit_code == 0, result.output
+    return app
+
+
+def test_files_match_the_views(app, make_app):
+    client, views = app.test_client(), make_app().test_client()
+    for path in ('/films', '/characters', '/planets/2'):
+        response = client.get(path)
+        assert response.headers['ETag']
+        assert json.loads(response.get_data()) == views.get(path).get_json(), path
+
+
+def test_precompressed_files_and_etags(app):
+    client = app.test_client()
+    response = client.get('/characters', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.get_data())) == json.loads(client.get('/characters').get_data())
+    # every encoding is its own representation
+    assert response.headers['ETag'] != client.get('/characters').headers['ETag']
+    assert client.get('/characters', headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_front_proxy_sends_the_file(make_app, app, tmp_path):
+    proxied = make_app(ENABLE_PRERENDER=True, PRERENDER_DIR=str(tmp_path / 'prerender'), PRERENDER_ACCEL_PREFIX='/prerendered/')
+    response = proxied.test_client().get('/films/1')
+    assert response.headers['X-Accel-Redirect'].startswith('/prerendered/v')
+    assert response.headers['X-Accel-Redirect'].endswith('/films/1.json')
+    assert response.get_data() == b''
+
+
+def test_catalog_writes_are_never_served_stale(app):
+    client = app.test_client()
+    etag = client.get('/films/1').headers['ETag']
+    client.put('/films/1', json={'title': 'Renamed'})
+    response = client.get('/films/1')
+    assert response.get_json()['title'] == 'Renamed'
+    assert response.headers.get('ETag') != etag
+
+
+def test_batch_sub_requests_get_the_json(app):
+    response = app.test_client().post('/batch', json={'requests': [{'path': '/films'}, {'path': '/films/2'}]})
+    [films, film] = response.get_json()['responses']
+    assert films['status'] == 200 and len(films['body']) == 4
+    assert film['body']['title'] == 'Film 2'
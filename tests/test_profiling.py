@@ -0,0 +1,94 @@
+import json
+import marshal
+import os
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+from profiling import TRUNCATED, RouteSampler, collapsed, speedscope
+
+TOKEN = {'X-Profile-Token': 'secret'}
+
+
+@pytest.fixture
+def app(make_app, tmp_path):
+    return make_app(ENABLE_PROFILING=True, PROFILING_TOKEN='secret', PROFILING_DIR=str(tmp_path / 'profiles'), PROFILING_INTERVAL=0.0005)
+
+
+def test_needs_a_token(make_app):
+    with pytest.raises(RuntimeError):
+        make_app(ENABLE_PROFILING=True)
+
+
+def test_profile_of_one_request(app):
+    client = app.test_client()
+    assert client.get('/characters', headers={'X-Profile': 'speedscope'}).status_code == 403
+    assert client.get('/characters', headers={'X-Profile': 'svg', **TOKEN}).status_code == 400
+    response = client.get('/characters', headers={'X-Profile': 'speedscope', **TOKEN})
+    assert response.headers['Content-Disposition'] == 'attachment; filename=profile.speedscope.json'
+    assert response.headers['X-Profiled-Status'] == '200'
+    document = response.get_json()
+    assert document['profiles'][0]['name'] == 'GET /characters'
+    assert all(index < len(document['shared']['frames']) for sample in document['profiles'][0]['samples'] for index in sample)
+    response = client.get('/characters', headers={'X-Profile': 'pstats', **TOKEN})
+    stats = marshal.loads(response.get_data())
+    assert any(name == 'handle_allcharacters' for (_, _, name) in stats)
+    # without the header the request is not profiled
+    assert isinstance(client.get('/characters').get_json(), list)
+
+
+def test_profile_of_a_failed_request(app):
+    response = app.test_client().post('/user/999/favorite_films', json={'film_id': 1}, headers={'X-Profile': 'collapsed', **TOKEN})
+    assert response.status_code == 200 and response.mimetype == 'text/plain'
+    assert response.headers['X-Profiled-Status'] == '400'
+
+
+def test_formats():
+    stacks = {('a (x.py:1)', 'b (x.py:2)'): 0.5, ('a (x.py:1)',): 0.25}
+    assert collapsed({'/films': stacks}) == '/films;a (x.py:1);b (x.py:2) 500000\n/films;a (x.py:1) 250000\n'
+    document = speedscope({'/films': stacks}, 'samples')
+    assert [frame['name'] for frame in document['shared']['frames']] == ['a (x.py:1)', 'b (x.py:2)']
+    assert document['profiles'][0]['samples'] == [[0, 1], [0]]
+    assert document['profiles'][0]['endValue'] == 0.75
+
+
+def test_sampler_merges_the_workers(tmp_path):
+    sampler = RouteSampler(60, str(tmp_path), max_stacks=2)
+    waiting = threading.Event()
+    thread = threading.Thread(target=waiting.wait)
+    thread.start()
+    sampler.routes[thread.ident] = '/films'
+    sampler.sample(0.5)
+    sampler.sample(0.5)
+    waiting.set()
+    thread.join()
+    # another worker of the machine
+    with open(os.path.join(str(tmp_path), '1.json'), 'w') as samples_file:
+        json.dump({'started_at': time.time(), 'routes': {'/films': {'x (x.py:1)': 2.0}, '/user': {'y (y.py:1)': 1.0}}}, samples_file)
+    profiles = sampler.merged('/films')
+    assert list(profiles) == ['/films']
+    assert profiles['/films'][('x (x.py:1)',)] == 2.0
+    assert sum(profiles['/films'].values()) == 3.0
+    sampler.reset()
+    assert sampler.merged() == {}
+
+
+def test_sampler_caps_the_stacks_of_a_route(tmp_path):
+    sampler = RouteSampler(60, str(tmp_path), max_stacks=1)
+    sampler.stacks['/films'] = Counter({('x (x.py:1)',): 1.0})
+    sampler.routes[threading.get_ident()] = '/films'
+    sampler.sample(0.5)
+    assert sampler.stacks['/films'][TRUNCATED] == 0.5
+
+
+def test_samples_endpoint(app):
+    client = app.test_client()
+    assert client.get('/profile/samples').status_code == 403
+    client.get('/films')
+    response = client.get('/profile/samples?format=collapsed', headers=TOKEN)
+    assert response.headers['Content-Disposition'] == 'attachment; filename=samples.folded'
+    assert client.delete('/profile/samples', headers=TOKEN).status_code == 200
+    assert client.get('/profile/samples', headers=TOKEN).get_json()['profiles'] == []
+    assert app.extensions['profiler'].sampler.routes == {}
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from push import Broker, Subscription
+
+
+def events(response):
+    # (event name, data) of the stream, the stream closes after PUSH_MAX_AGE
+    parsed = []
+    for block in response.get_data(as_text=True).split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n') if ': ' in line and not line.startswith(':'))
+        if 'event' in fields:
+            parsed.append((fields['event'], json.loads(fields['data'])))
+    return parsed
+
+
+def test_slow_clients_overflow_alone():
+    subscription = Subscription(['films'], None, size=2)
+    subscription.put([({'type': 'films'}, None)] * 2)
+    assert not subscription.overflowed
+    subscription.put([({'type': 'films'}, None)])
+    assert subscription.overflowed
+    assert subscription.get(0) == []
+
+
+def test_subscriptions_filter_types_and_users():
+    broker = Broker(buffer_size=10, max_subscribers=2)
+    films = broker.subscribe(['films'], None)
+    favorites = broker.subscribe(['favorites'], 1)
+    assert broker.subscribe([], None) is None
+    broker.deliver([{'type': 'films', 'user_id': None}, {'type': 'favorite_films', 'user_id': 1}, {'type': 'favorite_films', 'user_id': 2}])
+    assert [change['type'] for change, _ in films.get(0)] == ['films']
+    assert [change['user_id'] for change, _ in favorites.get(0)] == [1]
+
+
+def test_stream_delivers_the_commits(make_app):
+    client = make_app(ENABLE_PUSH=True, PUSH_MAX_SUBSCRIBERS=2, PUSH_HEARTBEAT=0.05, PUSH_MAX_AGE=0.3).test_client()
+    response = client.get('/stream?types=films')
+    assert response.mimetype == 'text/event-stream'
+    client.put('/films/1', json={'title': 'Renamed'})
+    client.put('/user/1', json={'age': 30})
+    received = events(response)
+    assert [(name, change['type'], change['id']) for name, change in received] == [('change', 'films', 1)]
+    assert received[0][1]['data']['title'] == 'Renamed'
+
+
+def test_streams_are_bounded_per_worker(make_app, monkeypatch):
+    client = make_app(ENABLE_PUSH=True, PUSH_MAX_SUBSCRIBERS=1, PUSH_HEARTBEAT=0.05, PUSH_MAX_AGE=0.1).test_client()
+    first = client.get('/stream')
+    assert client.get('/stream').status_code == 503
+    first.get_data()
+    assert client.get('/stream').status_code == 200
+    monkeypatch.setenv('GUNICORN_THREADS', '1')
+    with pytest.raises(RuntimeError):
+        make_app(ENABLE_PUSH=True)
+
+
+def test_reconnecting_client_gets_what_it_missed(make_app):
+    config = {'ENABLE_CHANGE_LOG': True, 'CHANGE_LOG_SAFETY_WINDOW': 0, 'PUSH_BACKEND': 'changelog', 'PUSH_POLL_INTERVAL': 3600}
+    client = make_app(ENABLE_PUSH=True, PUSH_MAX_SUBSCRIBERS=2, PUSH_HEARTBEAT=0.05, PUSH_MAX_AGE=0.1, **config).test_client()
+    client.put('/films/1', json={'title': 'Renamed'})
+    response = client.get('/stream?types=films', headers={'Last-Event-ID': '0'})
+    received = events(response)
+    assert [(name, change['type']) for name, change in received] == [('change', 'films')]
+    assert 'id: {}'.format(received[0][1]['cursor']) in response.get_data(as_text=True)
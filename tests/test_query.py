@@ -0,0 +1,57 @@
+from models import db, Films_Characters
+
+
+def query(client, body):
+    return client.post('/query', json=body)
+
+
+def test_nested_selection(app):
+    client = app.test_client()
+    body = query(client, {'films': {'ids': [1, 2], 'fields': ['id', 'title'], 'characters': {'fields': ['name'], 'planet': {'fields': ['name']}}}}).get_json()
+    films = body['data']['films']
+    assert [film['id'] for film in films] == [1, 2]
+    assert set(films[0]) == {'id', 'title', 'characters'}
+    with app.app_context():
+        expected = db.session.query(Films_Characters).filter_by(film_id=1).count()
+    assert len(films[0]['characters']) == expected
+    assert set(films[0]['characters'][0]) == {'name', 'planet'}
+    assert films[0]['characters'][0]['planet']['name'].startswith('Planet ')
+
+
+def test_statements_do_not_depend_on_the_rows(client):
+    few = query(client, {'films': {'ids': [1], 'characters': {'planet': {}}}}).get_json()
+    many = query(client, {'films': {'characters': {'planet': {}}}}).get_json()
+    assert few['cost']['statements'] == many['cost']['statements'] == 3
+    assert many['cost']['rows'] > few['cost']['rows']
+
+
+def test_top_level_pagination(client):
+    films = query(client, {'films': {'fields': ['id'], 'limit': 2, 'offset': 1}}).get_json()['data']['films']
+    assert films == [{'id': 2}, {'id': 3}]
+
+
+def test_nested_pagination_is_rejected(client):
+    for argument in ({'limit': 2}, {'offset': 1}, {'ids': [1]}):
+        response = query(client, {'films': {'characters': argument}})
+        assert response.status_code == 400, argument
+        assert 'top level' in response.get_json()['message']
+
+
+def test_invalid_queries(client):
+    assert query(client, {'vehicles': {}}).status_code == 400
+    assert query(client, {'films': {'fields': ['budget']}}).status_code == 400
+    assert query(client, {'films': {'pilots': {}}}).status_code == 400
+    assert query(client, {'films': {'limit': True}}).status_code == 400
+    assert query(client, {'films': {'characters': {'films': {'characters': {'films': {}}}}}}).status_code == 400
+
+
+def test_row_cap(app, client, statements):
+    app.config['QUERY_MAX_ROWS'] = 10
+    assert query(client, {'films': {}}).status_code == 200
+    response = query(client, {'characters': {'limit': 100}})
+    assert response.status_code == 400
+    assert 'more than 10 rows' in response.get_json()['message']
+    response = query(client, {'films': {'characters': {}}})
+    assert response.status_code == 400
+    # the cap is enforced by the database, no statement can bring back more than the rows left plus one
+    assert statements and all('LIMIT' in statement for statement in statements)
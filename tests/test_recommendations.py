@@ -0,0 +1,58 @@
+import math
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('scipy')
+
+from recommendations import CoOccurrence
+
+ROWS = [
+    (1, 'films', 1), (1, 'films', 2), (1, 'planets', 1),
+    (2, 'films', 1), (2, 'films', 2),
+    (3, 'films', 1), (3, 'planets', 1), (3, 'films', 3),
+]
+
+
+def test_cosine_of_the_co_occurrences():
+    model = CoOccurrence.build(ROWS)
+    # films 1 is favorited by 3 users, films 2 by 2 of them, planets 1 by 2 of them and films 3 by one
+    similar = {(entry['type'], entry['id']): entry for entry in model.for_item(('films', 1))}
+    assert similar[('films', 2)]['count'] == 2
+    assert similar[('films', 2)]['score'] == round(2 / math.sqrt(3 * 2), 4)
+    assert similar[('films', 3)]['score'] == round(1 / math.sqrt(3 * 1), 4)
+    assert model.for_item(('species', 1)) == []
+
+
+def test_user_recommendations_leave_out_their_favorites():
+    model = CoOccurrence.build(ROWS)
+    recommended = [(entry['type'], entry['id']) for entry in model.for_user(2)]
+    assert recommended[0] == ('planets', 1)
+    assert ('films', 1) not in recommended and ('films', 2) not in recommended
+
+
+def test_incremental_changes_match_a_rebuild():
+    model = CoOccurrence.build(ROWS[:-1])
+    model.add(3, ('films', 3))
+    model.add(4, ('species', 1))
+    model.add(4, ('films', 2))
+    model.remove(1, ('planets', 1))
+    rebuilt = CoOccurrence.build([row for row in ROWS if row != (1, 'planets', 1)] + [(4, 'species', 1), (4, 'films', 2)])
+    for item in rebuilt.items:
+        counts = {(entry['type'], entry['id']): entry['count'] for entry in model.for_item(item)}
+        assert counts == {(entry['type'], entry['id']): entry['count'] for entry in rebuilt.for_item(item)}, item
+
+
+def test_endpoints_follow_the_commits(make_app):
+    client = make_app(ENABLE_RECOMMENDATIONS=True, RECOMMENDATIONS_TOP_K=1000).test_client()
+    assert client.get('/recommendations/vehicles/1').status_code == 400
+    client.post('/user', json={'name': 'new', 'age': 30, 'email': 'new@example.com'})
+    user_id = client.get('/user').get_json()[-1]['id']
+    # the model is built by the first request, the favorites added afterwards update it in place
+    assert client.get('/user/{}/recommendations'.format(user_id)).get_json()['data'] == []
+    client.post('/user/{}/favorite_films'.format(user_id), json={'film_id': 1})
+    client.post('/user/{}/favorite_species'.format(user_id), json={'species_id': 1})
+    recommended = client.get('/recommendations/species/1').get_json()['data']
+    assert {'type': 'films', 'id': 1} in [{'type': entry['type'], 'id': entry['id']} for entry in recommended]
+    recommended = client.get('/user/{}/recommendations'.format(user_id)).get_json()['data']
+    assert recommended and all((entry['type'], entry['id']) not in (('films', 1), ('species', 1)) for entry in recommended)
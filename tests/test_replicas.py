@@ -0,0 +1,39 @@
+import shutil
+import sqlite3
+import time
+
+import pytest
+
+
+@pytest.fixture
+def replica(database, tmp_path):
+    # a replica that knows another title for film 1 and had its last heartbeat just now
+    path = str(tmp_path / 'replica.db')
+    shutil.copy(database[len('sqlite:///'):], path)
+    with sqlite3.connect(path) as connection:
+        connection.execute("UPDATE films SET title = 'From the replica' WHERE id = 1")
+        connection.execute('INSERT INTO replica_heartbeat (id, beat_at) VALUES (1, ?)', (time.time(),))
+    return 'sqlite:///' + path
+
+
+def test_reads_go_to_the_replica(make_app, replica):
+    client = make_app(DATABASE_REPLICA_URLS=replica, REPLICA_MAX_LAG=3600).test_client()
+    assert client.get('/films/1').get_json()['title'] == 'From the replica'
+    assert client.get('/replicas').get_json()['replica_0']['healthy'] is True
+
+
+def test_writers_read_their_writes(make_app, replica):
+    app = make_app(DATABASE_REPLICA_URLS=replica, REPLICA_MAX_LAG=3600)
+    writer = app.test_client()
+    response = writer.put('/films/2', json={'title': 'Renamed'})
+    assert 'read_primary_until' in response.headers['Set-Cookie']
+    # the cookie sends the reads of the writer to the primary, the others still use the replica
+    assert writer.get('/films/1').get_json()['title'] == 'Film 1'
+    assert app.test_client().get('/films/1').get_json()['title'] == 'From the replica'
+
+
+def test_lagging_replicas_get_no_traffic(make_app, replica):
+    client = make_app(DATABASE_REPLICA_URLS=replica, REPLICA_MAX_LAG=0).test_client()
+    assert client.get('/films/1').get_json()['title'] == 'Film 1'
+    status = client.get('/replicas').get_json()['replica_0']
+    assert status['healthy'] is False and status['lag'] > 0
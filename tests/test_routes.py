@@ -0,0 +1,19 @@
+def test_route_index(client):
+    routes = {route['rule']: route for route in client.get('/routes').get_json()}
+    assert routes['/films/<int:films_id>']['methods'] == ['GET', 'PUT']
+    assert routes['/films/<int:films_id>']['parameters'] == [{'name': 'films_id', 'type': 'int'}]
+    assert routes['/batch']['methods'] == ['POST']
+    assert not any(rule.startswith('/admin/') for rule in routes)
+
+
+def test_sitemap_is_built_once(app):
+    client = app.test_client()
+    first = client.get('/').get_data(as_text=True)
+    assert "<a href='/films'>" in first
+    app.extensions['route_index']['html'] = 'cached'
+    assert client.get('/').get_data(as_text=True) == 'cached'
+
+
+def test_admin_link_only_when_enabled(make_app):
+    assert "href='/admin/'" not in make_app().test_client().get('/').get_data(as_text=True)
+    assert "href='/admin/'" in make_app(ENABLE_ADMIN=True).test_client().get('/').get_data(as_text=True)
@@ -0,0 +1,71 @@
+import sqlite3
+
+import pytest
+
+from shards import jump_hash
+
+
+def test_jump_hash_moves_few_keys():
+    keys = range(10000)
+    three = [jump_hash(key, 3) for key in keys]
+    four = [jump_hash(key, 4) for key in keys]
+    assert set(three) == {0, 1, 2}
+    moved = [key for key in keys if three[key] != four[key]]
+    # only to the new shard, about a quarter of the keys
+    assert all(four[key] == 3 for key in moved)
+    assert 2000 < len(moved) < 3000
+
+
+def without_ids(favorites):
+    # the rows get new ids in their shard
+    return [{key: value for key, value in favorite.items() if key != 'favorite_id'} for favorite in favorites]
+
+
+def favorites_of(client, user_id):
+    return {key: without_ids(value) for key, value in client.get('/user/{}/favorites'.format(user_id)).get_json().items()}
+
+
+@pytest.fixture
+def shards(tmp_path):
+    return [str(tmp_path / 'shard{}.db'.format(index)) for index in range(2)]
+
+
+@pytest.fixture
+def sharded(make_app, shards):
+    def make(**config):
+        return make_app(FAVORITES_SHARDS=','.join('sqlite:///' + path for path in shards), **config)
+    return make
+
+
+def test_favorites_move_to_the_shard_of_their_user(make_app, sharded, shards, database):
+    before = make_app().test_client()
+    expected = {user_id: favorites_of(before, user_id) for user_id in range(1, 9)}
+    all_films = without_ids(before.get('/favorite_films').get_json())
+    app = sharded()
+    result = app.test_cli_runner().invoke(args=['shard-favorites'])
+    assert result.exit_code == 0 and 'Moved' in result.output
+    with sqlite3.connect(database[len('sqlite:///'):]) as connection:
+        assert connection.execute('SELECT count(*) FROM favorites').fetchone() == (0,)
+    router = app.extensions['shard_router']
+    for index, path in enumerate(shards):
+        with sqlite3.connect(path) as connection:
+            users = {user_id for user_id, in connection.execute('SELECT DISTINCT user_id FROM favorites')}
+        assert users and all(router.shard_of(user_id) == index for user_id in users)
+    client = app.test_client()
+    for user_id, favorites in expected.items():
+        assert favorites_of(client, user_id) == favorites
+    # scatter-gather, merged in the same order as a single database
+    assert without_ids(client.get('/favorite_films').get_json()) == all_films
+    assert without_ids(client.get('/favorite_films?limit=3&offset=2').get_json()) == all_films[2:5]
+
+
+def test_shard_writes_reach_the_change_log(sharded):
+    app = sharded(ENABLE_CHANGE_LOG=True, CHANGE_LOG_SAFETY_WINDOW=0)
+    app.test_cli_runner().invoke(args=['shard-favorites'])
+    client = app.test_client()
+    client.post('/user', json={'name': 'new', 'age': 30, 'email': 'new@example.com'})
+    user_id = client.get('/user').get_json()[-1]['id']
+    assert client.post('/user/{}/favorite_films'.format(user_id), json={'film_id': 1}).status_code == 200
+    changes = client.get('/changes?types=favorite_films').get_json()['changes']
+    assert [(change['user_id'], change['data']['entity_id']) for change in changes] == [(user_id, 1)]
+    assert client.get('/user/{}/favorites'.format(user_id)).get_json()['favorite_films'][0]['film_data']['id'] == 1
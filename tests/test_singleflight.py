@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight, FileBackend
+
+
+def test_concurrent_callers_share_one_computation():
+    flight = SingleFlight(ttl=60, stale_ttl=0)
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return 'value'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.get('films', compute))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ['value'] * 5
+    assert len(calls) == 1
+    assert flight.get('films', lambda: 'other') == 'value'
+
+
+def test_errors_reach_every_caller():
+    flight = SingleFlight(ttl=60, stale_ttl=0)
+
+    def compute():
+        raise ValueError('broken')
+
+    with pytest.raises(ValueError):
+        flight.get('films', compute)
+    # a failure is not cached
+    assert flight.get('films', lambda: 'value') == 'value'
+
+
+def test_result_built_across_an_invalidation_is_not_cached():
+    flight = SingleFlight(ttl=60, stale_ttl=0)
+
+    def compute():
+        flight.invalidate()
+        return 'old'
+
+    assert flight.get('films', compute) == 'old'
+    assert flight.get('films', lambda: 'new') == 'new'
+
+
+def test_stale_result_while_refreshing(app):
+    flight = SingleFlight(ttl=0.05, stale_ttl=60)
+    assert flight.get('films', lambda: 'old') == 'old'
+    time.sleep(0.1)
+    refreshed = threading.Event()
+
+    def compute():
+        refreshed.set()
+        return 'new'
+
+    with app.app_context():
+        assert flight.get('films', compute) == 'old'
+    assert refreshed.wait(5)
+    for _ in range(50):
+        if flight.get('films', lambda: 'again') == 'new':
+            break
+        time.sleep(0.01)
+    assert flight.get('films', lambda: 'again') == 'new'
+
+
+def test_file_backend_is_shared_between_workers(tmp_path):
+    first = SingleFlight(ttl=60, stale_ttl=0, backend=FileBackend(str(tmp_path)))
+    second = SingleFlight(ttl=60, stale_ttl=0, backend=FileBackend(str(tmp_path)))
+    assert first.get('films', lambda: ['value']) == ['value']
+    assert second.get('films', lambda: ['other']) == ['value']
+    # the writer drops the shared copy too
+    first.invalidate()
+    third = SingleFlight(ttl=60, stale_ttl=0, backend=FileBackend(str(tmp_path)))
+    assert third.get('films', lambda: ['new']) == ['new']
+
+
+def test_catalog_writes_invalidate_the_lists(make_app):
+    client = make_app(ENABLE_SINGLE_FLIGHT=True, SINGLE_FLIGHT_TTL=60).test_client()
+    assert client.get('/films').get_json()[0]['film_data']['title'] == 'Film 1'
+    client.put('/films/1', json={'title': 'Renamed'})
+    assert client.get('/films').get_json()[0]['film_data']['title'] == 'Renamed'
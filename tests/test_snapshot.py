@@ -0,0 +1,29 @@
+import sqlite3
+
+
+def test_same_payloads_as_the_database(make_app):
+    from_database = make_app().test_client()
+    from_snapshot = make_app(ENABLE_CATALOG_SNAPSHOT=True).test_client()
+    for path in ('/films', '/planets', '/starships', '/characters/3', '/species/2', '/films?ids=2,1,99'):
+        assert from_snapshot.get(path).get_json() == from_database.get(path).get_json(), path
+
+
+def test_writer_sees_its_own_changes(make_app):
+    client = make_app(ENABLE_CATALOG_SNAPSHOT=True, CATALOG_SNAPSHOT_CHECK_INTERVAL=3600).test_client()
+    assert client.get('/films/1').get_json()['title'] == 'Film 1'
+    client.put('/films/1', json={'title': 'Renamed'})
+    assert client.get('/films/1').get_json()['title'] == 'Renamed'
+    assert client.get('/films').get_json()[0]['film_data']['title'] == 'Renamed'
+
+
+def test_other_workers_follow_the_catalog_version(make_app, database):
+    reader = make_app(ENABLE_CATALOG_SNAPSHOT=True, CATALOG_SNAPSHOT_CHECK_INTERVAL=0).test_client()
+    stale = make_app(ENABLE_CATALOG_SNAPSHOT=True, CATALOG_SNAPSHOT_CHECK_INTERVAL=3600).test_client()
+    assert reader.get('/films/1').get_json()['title'] == stale.get('/films/1').get_json()['title'] == 'Film 1'
+    # another process: no commit listener of this one runs
+    with sqlite3.connect(database[len('sqlite:///'):]) as connection:
+        connection.execute("UPDATE films SET title = 'Renamed' WHERE id = 1")
+        connection.execute('INSERT INTO catalog_version (id, version) VALUES (1, 1) ON CONFLICT (id) DO UPDATE SET version = version + 1')
+    assert reader.get('/films/1').get_json()['title'] == 'Renamed'
+    # until its next check a worker keeps serving the snapshot it has
+    assert stale.get('/films/1').get_json()['title'] == 'Film 1'
@@ -0,0 +1,52 @@
+import sqlite3
+
+import pytest
+
+from models import db, Characters
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app(ENABLE_STATS=True, STATS_MAX_AGE=3600)
+
+
+def as_dict(columns, keys, label):
+    return dict(zip(zip(*(columns[key] for key in keys)), columns[label]))
+
+
+def test_aggregates_match_the_tables(app):
+    client = app.test_client()
+    stats = client.get('/stats').get_json()
+    assert set(stats) == {'characters_per_planet', 'species_per_film', 'films_per_starship', 'favorites_per_entity'}
+    with app.app_context():
+        expected = dict(db.session.query(Characters.planet_id, db.func.count()).group_by(Characters.planet_id).all())
+    assert as_dict(stats['characters_per_planet'], ['planet_id'], 'characters') == {(key,): value for key, value in expected.items()}
+    assert stats['characters_per_planet']['planet_id'] == sorted(expected)
+    assert client.get('/stats?names=nothing').status_code == 400
+
+
+def test_disabled_by_default(make_app):
+    assert make_app().test_client().get('/stats').status_code == 404
+
+
+def test_commits_move_the_counts(app):
+    client = app.test_client()
+    before = as_dict(client.get('/stats?names=favorites_per_entity').get_json()['favorites_per_entity'], ['entity_type', 'entity_id'], 'favorites')
+    client.post('/user', json={'name': 'new', 'age': 30, 'email': 'new@example.com'})
+    user_id = client.get('/user').get_json()[-1]['id']
+    client.post('/user/{}/favorite_films'.format(user_id), json={'film_id': 2})
+    after = as_dict(client.get('/stats?names=favorites_per_entity').get_json()['favorites_per_entity'], ['entity_type', 'entity_id'], 'favorites')
+    assert after[('films', 2)] == before.get(('films', 2), 0) + 1
+    client.delete('/user/{}/favorite_films/2'.format(user_id))
+    after = as_dict(client.get('/stats?names=favorites_per_entity').get_json()['favorites_per_entity'], ['entity_type', 'entity_id'], 'favorites')
+    assert after == before
+
+
+def test_writes_of_other_workers_wait_for_the_max_age(app, database):
+    client = app.test_client()
+    before = client.get('/stats?names=species_per_film').get_json()
+    with sqlite3.connect(database[len('sqlite:///'):]) as connection:
+        connection.execute('DELETE FROM films_species')
+    assert client.get('/stats?names=species_per_film').get_json() == before
+    app.extensions['stats'].max_age = 0
+    assert client.get('/stats?names=species_per_film').get_json()['species_per_film'] == {'film_id': [], 'species': []}